@@ -18,14 +18,57 @@ def create_app():
     # Init extensions
     db.init_app(app)
     login_manager.init_app(app)
+    from app.services import ratelimit_storage  # noqa: F401  registers sqlite://
     limiter.init_app(app)
 
-    # User loader
-    from app.models.users import Users
+    # Per-table change counters (used by caches / request coalescing)
+    from app.services import data_version
+    data_version.init_app(db)
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        return Users.query.get(int(user_id))
+    # Small-integer codes for department / status / category / unit strings
+    from app.services import lookups
+    lookups.init_app(db)
+
+    # Monthly created/hired counts, maintained on write
+    from app.services import rollups
+    rollups.init_app(db)
+
+    # Append-only stock movement ledger
+    from app.services import stock_ledger
+    stock_ledger.init_app(db)
+
+    # Moving weighted-average valuation, updated per ledger movement
+    from app.services import stock_valuation
+    stock_valuation.init_app(db)
+
+    # Low-stock alert set, maintained on write
+    from app.services import stock_alerts
+    stock_alerts.init_app(db)
+
+    # City / region parsed from customer addresses on write
+    from app.services import geo
+    geo.init_app(db)
+
+    # Archive tables for inactive customers / former employees
+    from app.services import archive
+    archive.init_app(db)
+
+    # Monthly payroll runs
+    from app.services import payroll
+    payroll.init_app(db)
+
+    # Fuzzy name search (chatbot tools + list page search boxes)
+    from app.services import search_index
+    search_index.init_app(app, db)
+
+    # Optional columnar analytics snapshots (ANALYTICS_ENGINE=columnar)
+    from app.services import columnar
+    columnar.init_app(app, db)
+
+    # User loader: served from a TTL cache, invalidated when a user changes
+    from app.services import user_cache
+    user_cache.init_app(db)
+    login_manager.user_loader(user_cache.load_user)
 
     # Register blueprints
     from app.routes.main_routes import main_bp
@@ -36,6 +79,7 @@ def create_app():
     from app.routes.customers_routes import customers_bp
     from app.routes.inventory_routes import inventory_bp
     from app.routes.chatbot_routes import chatbot_bp
+    from app.routes.payroll_routes import payroll_bp
 
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
@@ -45,5 +89,10 @@ def create_app():
     app.register_blueprint(customers_bp)
     app.register_blueprint(inventory_bp)
     app.register_blueprint(chatbot_bp)
+    app.register_blueprint(payroll_bp)
+
+    # CLI: flask erp ...
+    from app.commands import erp_cli
+    app.cli.add_command(erp_cli)
 
     return app
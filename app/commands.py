@@ -0,0 +1,271 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+from app import db
+
+erp_cli = AppGroup("erp", help="ERP maintenance commands.")
+
+
+@erp_cli.command("sync-schema")
+def sync_schema():
+    """Create missing tables, columns and indexes on an existing database.
+
+    New columns must be nullable or carry a server default.
+    """
+    db.create_all()
+
+    inspector = inspect(db.engine)
+    added, created = [], []
+    for table in db.metadata.sorted_tables:
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                if not column.nullable and column.server_default is None:
+                    raise click.ClickException(
+                        f"{table.name}.{column.name} is NOT NULL; add it with a migration"
+                    )
+                spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {spec}")
+                added.append(f"{table.name}.{column.name}")
+
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                created.append(index.name)
+
+    click.echo(f"Added columns: {', '.join(added) or 'none'}")
+    click.echo(f"Created indexes: {', '.join(created) or 'none'}")
+
+
+@erp_cli.command("backfill-rollups")
+def backfill_rollups():
+    """Stamp rows that predate created_at/updated_at and rebuild monthly rollups."""
+    from app.models.employees import Employees
+    from app.models.customers import Customers
+    from app.models.vendors import Vendors
+    from app.models.inventory import Inventory
+    from app.models.mixins import utcnow
+    from app.services import data_version, rollups
+
+    now = utcnow()
+    models = (Employees, Customers, Vendors, Inventory)
+    for model in models:
+        # Employees were created when they joined; for the rest the true
+        # creation time is unknown, so they land in the current month
+        created = model.joining_date if model is Employees else now
+        stamped = (
+            db.session.query(model)
+            .filter(model.created_at.is_(None))
+            .update({model.created_at: created, model.updated_at: now}, synchronize_session=False)
+        )
+        click.echo(f"{model.__tablename__}: stamped {stamped} rows")
+
+    for metric in rollups.metric_names():
+        click.echo(f"{metric}: {rollups.rebuild(db.session, metric)} months")
+
+    data_version.mark_changed(db.session, *(m.__tablename__ for m in models))
+    db.session.commit()
+
+
+@erp_cli.command("backfill-customer-geo")
+@click.option("--all", "reparse_all", is_flag=True, help="Re-parse every customer, not just unparsed ones.")
+@click.option("--batch-size", default=1000, show_default=True)
+def backfill_customer_geo(reparse_all, batch_size):
+    """Parse city / region from existing customer addresses, in batches."""
+    from sqlalchemy import bindparam
+    from app.models.customers import Customers
+    from app.services import data_version, geo
+
+    table = Customers.__table__
+    update = (
+        table.update()
+        .where(table.c.id == bindparam("row_id"))
+        .values(city=bindparam("new_city"), region=bindparam("new_region"))
+    )
+    last_id, done = 0, 0
+    while True:
+        query = db.session.query(Customers.id, Customers.address).filter(Customers.id > last_id)
+        if not reparse_all:
+            query = query.filter(Customers.city.is_(None), Customers.address.isnot(None))
+        rows = query.order_by(Customers.id).limit(batch_size).all()
+        if not rows:
+            break
+        params = []
+        for row_id, address in rows:
+            city, region = geo.parse_city(address)
+            params.append({"row_id": row_id, "new_city": city, "new_region": region})
+        db.session.execute(update, params)
+        data_version.mark_changed(db.session, table.name)
+        db.session.commit()
+        last_id, done = rows[-1].id, done + len(rows)
+        click.echo(f"... {done} customers")
+
+    click.echo(f"Parsed {done} customers")
+
+
+@erp_cli.command("open-stock-ledger")
+def open_stock_ledger():
+    """Record opening stock movements for items that predate the ledger."""
+    from app.services import data_version, stock_ledger
+
+    opened = stock_ledger.open_ledger(db.session)
+    data_version.mark_changed(db.session, "inventory")
+    db.session.commit()
+    click.echo(f"Opened {opened} items")
+
+
+@erp_cli.command("rebuild-stock-alerts")
+def rebuild_stock_alerts():
+    """Recompute the low-stock alert set from the catalogue."""
+    from app.services import data_version, stock_alerts
+
+    size = stock_alerts.rebuild(db.session)
+    data_version.mark_changed(db.session, "inventory")
+    db.session.commit()
+    click.echo(f"{size} items at or below their reorder level")
+
+
+@erp_cli.command("rebuild-stock-valuation")
+def rebuild_stock_valuation():
+    """Replay the stock ledger into the weighted-average valuation tables."""
+    from app.services import data_version, stock_valuation
+
+    items = stock_valuation.rebuild(db.session)
+    data_version.mark_changed(db.session, "inventory")
+    db.session.commit()
+    quantity, value = stock_valuation.totals(db.session)
+    click.echo(f"Valued {items} items: {quantity} units, {value:,.2f}")
+
+
+@erp_cli.command("snapshot-stock")
+@click.option("--as-of", help="ISO date/datetime (UTC); default: today 00:00.")
+def snapshot_stock(as_of):
+    """Snapshot every item's stock (run daily, e.g. from cron, shortly after midnight UTC)."""
+    from datetime import datetime, time
+    from app.models.mixins import utcnow
+    from app.services import stock_ledger
+
+    instant = datetime.fromisoformat(as_of) if as_of else datetime.combine(utcnow().date(), time.min)
+    rows = stock_ledger.take_snapshot(db.session, instant)
+    db.session.commit()
+    click.echo(f"Snapshot {instant.isoformat()}: {rows} items")
+
+
+@erp_cli.command("run-payroll")
+@click.option("--period", help="Month as YYYY-MM; default: the current month (UTC).")
+@click.option("--replace", is_flag=True, help="Recompute a period that already has a run.")
+def run_payroll(period, replace):
+    """Compute and store a monthly payroll run for all active employees."""
+    from flask import current_app
+    from app.models.mixins import utcnow
+    from app.services import payroll
+
+    period = period or utcnow().strftime("%Y-%m")
+    try:
+        run = payroll.run_payroll(
+            db.session, period,
+            salary_basis=current_app.config.get("PAYROLL_SALARY_BASIS", "annual"),
+            replace=replace,
+        )
+    except ValueError:
+        raise click.BadParameter("expected YYYY-MM", param_hint="--period")
+    except payroll.PayrollExists:
+        raise click.ClickException(f"{period} already has a run; use --replace to recompute it")
+    db.session.commit()
+    click.echo(
+        f"Payroll {period}: {run.employee_count} employees, gross {run.gross:,.2f}, "
+        f"net {run.net:,.2f} ({run.duration_ms} ms)"
+    )
+
+
+@erp_cli.command("migrate-lookups")
+def migrate_lookups():
+    """Move department / status / category / unit strings to lookup codes.
+
+    Adds each ``<column>_id`` code column, fills it from the old VARCHAR
+    (values differing only in case or spacing share a code), then drops
+    the old column and its indexes. Safe to re-run: migrated tables are
+    skipped. On migrated databases the code columns stay nullable and,
+    on SQLite, carry no foreign key; new databases get both from the models.
+    """
+    from sqlalchemy import MetaData, Table, text
+    from app.models.employees import Employees
+    from app.models.customers import Customers
+    from app.models.vendors import Vendors
+    from app.models.inventory import Inventory
+    from app.services import data_version, lookups
+
+    db.create_all()
+    conn = db.session.connection()
+    migrated = []
+    for model, attr in (
+        (Employees, "department"), (Employees, "status"), (Customers, "status"),
+        (Vendors, "category"), (Inventory, "unit"),
+    ):
+        table = model.__tablename__
+        column = getattr(model, attr).property.columns[0]
+        existing = {c["name"] for c in inspect(conn).get_columns(table)}
+        if attr not in existing:
+            continue
+        if column.name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column.name} SMALLINT")
+
+        kind = column.type.kind
+        values = conn.execute(text(f"SELECT DISTINCT {attr} FROM {table} WHERE {attr} IS NOT NULL")).scalars()
+        params = [{"code": lookups.ensure(conn, kind, v), "value": v} for v in values]
+        if params:
+            conn.execute(text(f"UPDATE {table} SET {column.name} = :code WHERE {attr} = :value"), params)
+
+        for index in Table(table, MetaData(), autoload_with=conn).indexes:
+            if attr in index.columns:
+                index.drop(conn)
+        conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {attr}")
+        migrated.append(f"{table}.{attr} ({len(params)} values)")
+
+    created = []
+    for model in (Employees, Customers, Vendors, Inventory):
+        existing = {ix["name"] for ix in inspect(conn).get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+
+    data_version.mark_changed(db.session, *(m.__tablename__ for m in (Employees, Customers, Vendors, Inventory)))
+    db.session.commit()
+    click.echo(f"Migrated: {', '.join(migrated) or 'nothing to do'}")
+    click.echo(f"Created indexes: {', '.join(created) or 'none'}")
+
+
+@erp_cli.command("archive-inactive")
+@click.option("--days", type=int, help="Untouched for this many days; default: ARCHIVE_AFTER_DAYS.")
+@click.option("--batch-size", default=500, show_default=True)
+def archive_inactive(days, batch_size):
+    """Move inactive customers and former employees to the archive tables."""
+    from datetime import timedelta
+    from flask import current_app
+    from app.models.customers import Customers
+    from app.models.employees import Employees
+    from app.models.mixins import utcnow
+    from app.services import archive
+
+    days = current_app.config.get("ARCHIVE_AFTER_DAYS", 180) if days is None else days
+    cutoff = utcnow() - timedelta(days=days)
+    for model in (Customers, Employees):
+        try:
+            archive.stale_ids(db.session, model, cutoff, 1)
+        except archive.UnknownStatus as exc:
+            click.echo(f"skipped {exc}")
+            continue
+        moved = 0
+        while True:
+            ids = archive.stale_ids(db.session, model, cutoff, batch_size)
+            if not ids:
+                break
+            for obj in db.session.query(model).filter(model.id.in_(ids)):
+                archive.archive(db.session, obj, archive.INACTIVE)
+            db.session.commit()
+            moved += len(ids)
+        click.echo(f"{model.__tablename__}: archived {moved} rows")
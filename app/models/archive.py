@@ -0,0 +1,36 @@
+from app import db
+from app.models.lookups import lookup_column
+
+# Cold copies of Customers / Employees rows (app/services/archive.py): same
+# ids and columns, minus version_id, plus when and why the row moved.
+
+
+class CustomersArchive(db.Model):
+    __tablename__ = 'customers_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    customer_name = db.Column(db.String(100))
+    phone = db.Column(db.String(20))
+    address = db.Column(db.String(800))
+    city = db.Column(db.String(100))
+    region = db.Column(db.String(100))
+    status = lookup_column('customer_status', 'status_id')
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, index=True)
+    archive_reason = db.Column(db.String(20), nullable=False)     # 'deleted' | 'inactive'
+
+
+class EmployeesArchive(db.Model):
+    __tablename__ = 'employees_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    employee_name = db.Column(db.String(100), nullable=False)
+    department = lookup_column('department', 'department_id', nullable=False)
+    joining_date = db.Column(db.Date, nullable=False)
+    salary = db.Column(db.Integer, nullable=False)
+    status = lookup_column('employee_status', 'status_id', nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, index=True)
+    archive_reason = db.Column(db.String(20), nullable=False)
@@ -1,10 +1,17 @@
 from app import db
+from app.models.mixins import TimestampMixin, VersionedMixin
+from app.models.lookups import lookup_column
 
-class Customers(db.Model):
+class Customers(TimestampMixin, VersionedMixin, db.Model):
     __tablename__ = 'customers'
+    # Never reuse the id of an archived row (app/services/archive.py)
+    __table_args__ = {'sqlite_autoincrement': True}
 
     id = db.Column(db.Integer, primary_key=True)
     customer_name = db.Column(db.String(100))
     phone = db.Column(db.String(20))
     address = db.Column(db.String(800))
-    status = db.Column(db.String(50))
+    # Parsed from address on write (app/services/geo.py)
+    city = db.Column(db.String(100), index=True)
+    region = db.Column(db.String(100), index=True)
+    status = lookup_column('customer_status', 'status_id', index=True)
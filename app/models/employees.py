@@ -1,12 +1,21 @@
 from app import db
+from app.models.mixins import TimestampMixin, VersionedMixin
+from app.models.lookups import lookup_column
 from datetime import date
 
-class Employees(db.Model):
+class Employees(TimestampMixin, VersionedMixin, db.Model):
     __tablename__ = 'employees'
+    __table_args__ = (
+        db.Index('ix_employees_department_id_status_id', 'department_id', 'status_id'),
+        db.Index('ix_employees_status_id', 'status_id'),
+        # Never reuse the id of an archived row (app/services/archive.py)
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     employee_name = db.Column(db.String(100), nullable=False)
-    department = db.Column(db.String(100), nullable=False)
+    # Lookup codes (app/services/lookups.py), read and written as strings
+    department = lookup_column('department', 'department_id', nullable=False)
     joining_date = db.Column(db.Date, nullable=False, default=lambda: date.today())
     salary = db.Column(db.Integer, nullable=False)
-    status = db.Column(db.String(20), nullable=False)
+    status = lookup_column('employee_status', 'status_id', nullable=False)
@@ -1,10 +1,15 @@
 from app import db
+from app.models.mixins import TimestampMixin, VersionedMixin
+from app.models.lookups import lookup_column
 
-class Inventory(db.Model):
+class Inventory(TimestampMixin, VersionedMixin, db.Model):
     __tablename__ = 'inventory'
 
     id = db.Column(db.Integer, primary_key=True)
     item_name = db.Column(db.String(100))
-    quantity = db.Column(db.Integer)
-    price = db.Column(db.Integer)
-    unit = db.Column(db.String(20))
+    # active_history: the stock ledger needs the old value of every change
+    quantity = db.column_property(db.Column(db.Integer, index=True), active_history=True)
+    price = db.column_property(db.Column(db.Integer), active_history=True)
+    unit = lookup_column('unit', 'unit_id', index=True)
+    # NULL: use DEFAULT_REORDER_LEVEL (app/services/stock_alerts.py)
+    reorder_level = db.column_property(db.Column(db.Integer), active_history=True)
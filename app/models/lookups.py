@@ -0,0 +1,43 @@
+from sqlalchemy.types import TypeDecorator
+from app import db
+from app.services import lookups
+
+# 2 bytes on MySQL; SQLite only auto-numbers INTEGER primary keys
+LookupId = db.SmallInteger().with_variant(db.Integer(), 'sqlite')
+
+
+class Lookups(db.Model):
+    """Codes for low-cardinality strings (see app/services/lookups.py)."""
+    __tablename__ = 'lookups'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'key', name='uq_lookups_kind_key'),
+    )
+
+    id = db.Column(LookupId, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    key = db.Column(db.String(100), nullable=False)     # normalised: trimmed, lower-case
+    name = db.Column(db.String(100), nullable=False)    # as first written
+
+
+class Lookup(TypeDecorator):
+    """A string attribute stored as a lookups.id code."""
+    impl = db.SmallInteger
+    cache_ok = True
+
+    def __init__(self, kind):
+        super().__init__()
+        self.kind = kind
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else lookups.code(self.kind, value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else lookups.name(value)
+
+    def coerce_compared_value(self, op, value):
+        return self
+
+
+def lookup_column(kind, name, **kwargs):
+    """``status = lookup_column('employee_status', 'status_id', nullable=False)``"""
+    return db.Column(name, Lookup(kind), db.ForeignKey('lookups.id'), **kwargs)
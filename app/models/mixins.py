@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+from sqlalchemy.orm import declared_attr
+from app import db
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TimestampMixin:
+    # Nullable so `flask erp sync-schema` can add them to existing tables;
+    # `flask erp backfill-rollups` fills in old rows.
+    created_at = db.Column(db.DateTime, default=utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow)
+
+
+class VersionedMixin:
+    """Optimistic locking: every ORM UPDATE checks and bumps ``version_id``,
+    raising StaleDataError if someone else changed the row first."""
+    version_id = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    @declared_attr
+    def __mapper_args__(cls):
+        return {'version_id_col': cls.version_id}
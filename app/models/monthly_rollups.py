@@ -0,0 +1,10 @@
+from app import db
+
+
+class MonthlyRollups(db.Model):
+    """Row counts per metric and calendar month ("YYYY-MM"), maintained on write."""
+    __tablename__ = 'monthly_rollups'
+
+    metric = db.Column(db.String(32), primary_key=True)
+    period = db.Column(db.String(7), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
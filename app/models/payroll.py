@@ -0,0 +1,59 @@
+from app import db
+from app.models.mixins import utcnow
+
+# Money columns: two decimals, read back as float
+Money = db.Numeric(14, 2, asdecimal=False)
+
+
+class PayrollRuns(db.Model):
+    """One computed payroll per month, with its grand totals."""
+    __tablename__ = 'payroll_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(7), nullable=False, unique=True)     # "YYYY-MM"
+    salary_basis = db.Column(db.String(10), nullable=False)           # 'annual' | 'monthly'
+    employee_count = db.Column(db.Integer, nullable=False, default=0)
+    gross = db.Column(Money, nullable=False, default=0)
+    provident_fund = db.Column(Money, nullable=False, default=0)
+    professional_tax = db.Column(Money, nullable=False, default=0)
+    income_tax = db.Column(Money, nullable=False, default=0)
+    deductions = db.Column(Money, nullable=False, default=0)
+    net = db.Column(Money, nullable=False, default=0)
+    duration_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
+class PayrollLines(db.Model):
+    """One employee's pay in a run (name and department as of the run)."""
+    __tablename__ = 'payroll_lines'
+    __table_args__ = (
+        db.Index('ix_payroll_lines_run_department', 'run_id', 'department'),
+    )
+
+    run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id', ondelete='CASCADE'), primary_key=True)
+    # No FK: payslips outlive deleted employees
+    employee_id = db.Column(db.Integer, primary_key=True)
+    employee_name = db.Column(db.String(100), nullable=False)
+    department = db.Column(db.String(100), nullable=False)
+    days_paid = db.Column(db.Integer, nullable=False)
+    gross = db.Column(Money, nullable=False)
+    provident_fund = db.Column(Money, nullable=False)
+    professional_tax = db.Column(Money, nullable=False)
+    income_tax = db.Column(Money, nullable=False)
+    deductions = db.Column(Money, nullable=False)
+    net = db.Column(Money, nullable=False)
+
+
+class PayrollDepartmentTotals(db.Model):
+    """Per-department sums of a run, stored so reports never re-aggregate lines."""
+    __tablename__ = 'payroll_department_totals'
+
+    run_id = db.Column(db.Integer, db.ForeignKey('payroll_runs.id', ondelete='CASCADE'), primary_key=True)
+    department = db.Column(db.String(100), primary_key=True)
+    employee_count = db.Column(db.Integer, nullable=False)
+    gross = db.Column(Money, nullable=False)
+    provident_fund = db.Column(Money, nullable=False)
+    professional_tax = db.Column(Money, nullable=False)
+    income_tax = db.Column(Money, nullable=False)
+    deductions = db.Column(Money, nullable=False)
+    net = db.Column(Money, nullable=False)
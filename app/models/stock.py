@@ -0,0 +1,80 @@
+from app import db
+from app.models.mixins import utcnow
+
+
+class StockMovements(db.Model):
+    """Append-only stock ledger: one row per change in an item's quantity or price."""
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_item_created', 'item_id', 'created_at'),
+    )
+
+    KINDS = ('opening', 'receipt', 'issue', 'adjustment', 'revaluation')
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No FK: movements outlive deleted items
+    item_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    quantity_delta = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Integer)
+    note = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+
+
+class StockSnapshots(db.Model):
+    """Per-item quantity and price as of a snapshot instant (all items share ``as_of``)."""
+    __tablename__ = 'stock_snapshots'
+
+    as_of = db.Column(db.DateTime, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Integer)
+
+
+class StockAlerts(db.Model):
+    """Items currently at or below their reorder level (maintained on write)."""
+    __tablename__ = 'stock_alerts'
+
+    item_id = db.Column(db.Integer, primary_key=True)
+    level = db.Column(db.String(10), nullable=False, index=True)   # 'low' | 'out'
+    quantity = db.Column(db.Integer, nullable=False)
+    reorder_level = db.Column(db.Integer, nullable=False)
+    raised_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+
+class StockAlertEvents(db.Model):
+    """Append-only feed of alert transitions (raised / escalated / eased / cleared)."""
+    __tablename__ = 'stock_alert_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, nullable=False, index=True)
+    event = db.Column(db.String(10), nullable=False)
+    level = db.Column(db.String(10))
+    quantity = db.Column(db.Integer, nullable=False)
+    reorder_level = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
+class StockValuations(db.Model):
+    """Per-item moving weighted-average cost: ``value / quantity`` is the
+    average unit cost (maintained on every ledger movement)."""
+    __tablename__ = 'stock_valuations'
+
+    item_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    value = db.Column(db.Numeric(18, 4, asdecimal=False), nullable=False, default=0, index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
+class StockValuationTotals(db.Model):
+    """Running totals of stock_valuations in stripes: row ``id`` covers the
+    items with ``item_id % STRIPES == id`` (app/services/stock_valuation.py)."""
+    __tablename__ = 'stock_valuation_totals'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    value = db.Column(db.Numeric(18, 4, asdecimal=False), nullable=False, default=0)
+    # When the stripe was created or last rebuilt; NULL: not valued yet
+    rebuilt_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow)
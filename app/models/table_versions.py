@@ -0,0 +1,10 @@
+from app import db
+
+
+class TableVersions(db.Model):
+    """One row per data table, bumped in the same transaction as any write to it."""
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
@@ -1,10 +1,12 @@
 from app import db
+from app.models.mixins import TimestampMixin, VersionedMixin
+from app.models.lookups import lookup_column
 
-class Vendors(db.Model):
+class Vendors(TimestampMixin, VersionedMixin, db.Model):
     __tablename__ = 'vendors'
 
     id = db.Column(db.Integer, primary_key=True)
     vendor_name = db.Column(db.String(100))
     contact_person = db.Column(db.String(100))
     phone = db.Column(db.String(20))
-    category = db.Column(db.String(100))
+    category = lookup_column('vendor_category', 'category_id', index=True)
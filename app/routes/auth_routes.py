@@ -1,8 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_user, login_required, logout_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.models.users import Users
 from app import db, limiter
+from app.services.passwords import hash_password, verify_password, needs_rehash, HashingBusy
 
 # Flask-WTF
 from flask_wtf import FlaskForm
@@ -45,9 +45,17 @@ def login():
     if form.validate_on_submit():
         user = Users.query.filter_by(username=form.username.data).first()
 
-        if user and check_password_hash(user.password, form.password.data):
-            login_user(user)
-            return redirect(url_for('auth.protected'))
+        try:
+            if user and verify_password(user.password, form.password.data):
+                # Upgrade hashes made with an older method/cost
+                if needs_rehash(user.password):
+                    user.password = hash_password(form.password.data)
+                    db.session.commit()
+                login_user(user)
+                return redirect(url_for('auth.protected'))
+        except HashingBusy:
+            flash("Server is busy. Please try again in a moment.")
+            return render_template('login.html', form=form), 503
 
         flash("Invalid username or password")
         return redirect(url_for('auth.login'))
@@ -61,7 +69,11 @@ def register():
     form = RegisterForm()
 
     if form.validate_on_submit():
-        hashed_pw = generate_password_hash(form.password.data)
+        try:
+            hashed_pw = hash_password(form.password.data)
+        except HashingBusy:
+            flash("Server is busy. Please try again in a moment.")
+            return render_template('register.html', form=form), 503
         new_user = Users(
             username=form.username.data,
             email=form.email.data.lower(),
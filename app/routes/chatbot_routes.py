@@ -1,14 +1,27 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, session, g, current_app, abort
+from flask_login import login_required, current_user
 from app import limiter, db
-from openai import OpenAI
-from sqlalchemy import func, desc
+from openai import OpenAI, APIConnectionError, APITimeoutError, APIStatusError
+from sqlalchemy import func, desc, asc
 from app.models.inventory import Inventory
 from app.models.employees import Employees
 from app.models.vendors import Vendors
 from app.models.customers import Customers
+from app.services.singleflight import SingleFlight
+from app.services.data_version import get_version
+from app.services.conversation import ConversationStore
+from app.services.metrics import MetricsRegistry, RequestTrace, NullTrace
+from app.services.circuit_breaker import CircuitBreaker
+from app.services import search_index, columnar, lookups
+from app.services.search_index import like_pattern, LIKE_ESCAPE
 from decimal import Decimal
+from datetime import date, datetime
 import os
 import json
+import base64
+import re
+import threading
+import time
 
 chatbot_bp = Blueprint("chatbot", __name__)
 
@@ -51,6 +64,22 @@ def is_followup_query(q: str) -> bool:
     return any(key in q for key in FOLLOWUP_KEYWORDS)
 
 
+# Per-session multi-turn history (bounded; older turns are summarized)
+conversations = ConversationStore(
+    max_sessions=1000,
+    idle_ttl=3600,
+    token_budget=1500,
+    summary_max_chars=1200,
+    max_tool_refs=20,
+)
+
+
+def current_conversation():
+    conv = conversations.get_or_create(session.get("chat_id"))
+    session["chat_id"] = conv.id
+    return conv
+
+
 # ============================================================
 #                        TOOL DEFINITIONS
 # ============================================================
@@ -87,8 +116,33 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "get_all_inventory_items",
-            "description": "List ALL inventory items with qty, price, value.",
-            "parameters": {"type": "object", "properties": {}, "required": []},
+            "description": (
+                "List inventory items with qty, price, value. "
+                "Paginated: returns a summary, one page of rows and next_cursor."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name_contains": {"type": "string"},
+                    "unit": {"type": "string"},
+                    "min_quantity": {"type": "integer"},
+                    "max_quantity": {"type": "integer"},
+                    "sort_by": {
+                        "type": "string",
+                        "enum": ["item_name", "quantity", "price", "value"],
+                    },
+                    "order": {"type": "string", "enum": ["asc", "desc"]},
+                    "limit": {
+                        "type": "integer",
+                        "description": "Rows per page (capped server-side).",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from a previous page.",
+                    },
+                },
+                "required": [],
+            },
         },
     },
     {
@@ -113,8 +167,32 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "get_all_employees_basic",
-            "description": "Return employee list (name, department, status).",
-            "parameters": {"type": "object", "properties": {}, "required": []},
+            "description": (
+                "Return employee list (name, department, status). "
+                "Paginated: returns a summary, one page of rows and next_cursor."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name_contains": {"type": "string"},
+                    "department": {"type": "string"},
+                    "status": {"type": "string"},
+                    "sort_by": {
+                        "type": "string",
+                        "enum": ["name", "department", "joining_date"],
+                    },
+                    "order": {"type": "string", "enum": ["asc", "desc"]},
+                    "limit": {
+                        "type": "integer",
+                        "description": "Rows per page (capped server-side).",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from a previous page.",
+                    },
+                },
+                "required": [],
+            },
         },
     },
     {
@@ -133,7 +211,7 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "find_employee_by_name",
-            "description": "Search employees by name.",
+            "description": "Fuzzy search employees by name (ranked, typo tolerant).",
             "parameters": {
                 "type": "object",
                 "properties": {"name": {"type": "string"}},
@@ -237,15 +315,38 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "get_all_vendors_basic",
-            "description": "Return vendor list (name, contact, phone, category).",
-            "parameters": {"type": "object", "properties": {}, "required": []},
+            "description": (
+                "Return vendor list (name, contact, phone, category). "
+                "Paginated: returns a summary, one page of rows and next_cursor."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name_contains": {"type": "string"},
+                    "category": {"type": "string"},
+                    "sort_by": {
+                        "type": "string",
+                        "enum": ["name", "category"],
+                    },
+                    "order": {"type": "string", "enum": ["asc", "desc"]},
+                    "limit": {
+                        "type": "integer",
+                        "description": "Rows per page (capped server-side).",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from a previous page.",
+                    },
+                },
+                "required": [],
+            },
         },
     },
     {
         "type": "function",
         "function": {
             "name": "find_vendor_by_name",
-            "description": "Search vendors by name.",
+            "description": "Fuzzy search vendors by name (ranked, typo tolerant).",
             "parameters": {
                 "type": "object",
                 "properties": {"name": {"type": "string"}},
@@ -275,15 +376,39 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "get_all_customers_basic",
-            "description": "Return customer list (name, phone, address, status).",
-            "parameters": {"type": "object", "properties": {}, "required": []},
+            "description": (
+                "Return customer list (name, phone, address, status). "
+                "Paginated: returns a summary, one page of rows and next_cursor."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name_contains": {"type": "string"},
+                    "status": {"type": "string"},
+                    "address_contains": {"type": "string"},
+                    "sort_by": {
+                        "type": "string",
+                        "enum": ["name", "status"],
+                    },
+                    "order": {"type": "string", "enum": ["asc", "desc"]},
+                    "limit": {
+                        "type": "integer",
+                        "description": "Rows per page (capped server-side).",
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from a previous page.",
+                    },
+                },
+                "required": [],
+            },
         },
     },
     {
         "type": "function",
         "function": {
             "name": "find_customer_by_name",
-            "description": "Search customers by name.",
+            "description": "Fuzzy search customers by name (ranked, typo tolerant).",
             "parameters": {
                 "type": "object",
                 "properties": {"name": {"type": "string"}},
@@ -299,66 +424,325 @@ TOOLS = [
             "parameters": {"type": "object", "properties": {}, "required": []},
         },
     },
+
+    # ===== Conversation Tools =====
+    {
+        "type": "function",
+        "function": {
+            "name": "recall_tool_result",
+            "description": (
+                "Fetch the full result of an earlier tool call by its ref "
+                "(e.g. 'r3' from a '[tool results: r3=...]' note)."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {"ref": {"type": "string"}},
+                "required": ["ref"],
+            },
+        },
+    },
 ]
 
+# ============================================================
+#           TOOL SUBSET SELECTION (SMALLER PROMPTS)
+# ============================================================
+
+TOOL_GROUPS = {
+    "inventory": [
+        "get_inventory_totals",
+        "get_top_inventory_items",
+        "get_all_inventory_items",
+        "calculate_total_value_for_last_items",
+    ],
+    "employee": [
+        "get_employee_count",
+        "get_all_employees_basic",
+        "get_employees_by_department",
+        "find_employee_by_name",
+        "get_employee_summary",
+    ],
+    "salary": [
+        "get_highest_salary",
+        "get_lowest_salary",
+        "get_top_n_salaries",
+        "get_salary_summary",
+        "get_salary_distribution",
+        "get_avg_salary_by_department",
+        "get_highest_salary_per_department",
+        "get_lowest_salary_per_department",
+    ],
+    "vendor": [
+        "get_vendor_count",
+        "get_all_vendors_basic",
+        "find_vendor_by_name",
+        "get_vendor_summary",
+    ],
+    "customer": [
+        "get_customer_count",
+        "get_all_customers_basic",
+        "find_customer_by_name",
+        "get_customer_summary",
+    ],
+    "conversation": ["recall_tool_result"],
+}
+
+# Word prefixes that point a query at a tool group
+TOOL_GROUP_KEYWORDS = {
+    "inventory": [
+        "inventor", "stock", "item", "product", "sku", "quantit", "qty",
+        "price", "value", "worth", "unit", "warehouse", "goods",
+    ],
+    "employee": [
+        "employee", "staff", "worker", "people", "headcount", "team",
+        "department", "dept", "hire", "hiring", "join", "newest", "oldest",
+    ],
+    "salary": [
+        "salar", "pay", "paid", "earn", "wage", "compensation", "income",
+        "median", "quartile", "percentile",
+    ],
+    "vendor": ["vendor", "supplier", "suppl", "contact person", "category"],
+    "customer": ["customer", "client", "buyer", "address", "city"],
+}
+
+TOOL_GROUP_PATTERNS = {
+    group: re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")")
+    for group, keywords in TOOL_GROUP_KEYWORDS.items()
+}
+
+def classify_tool_groups(user_query: str):
+    q = (user_query or "").lower()
+    groups = {g for g, pattern in TOOL_GROUP_PATTERNS.items() if pattern.search(q)}
+    # Salary answers name employees; per-department questions need both
+    if "salary" in groups:
+        groups.add("employee")
+    return groups
+
+
+def select_tools(user_query: str):
+    """Return only the tool schemas relevant to the query (all if unsure)."""
+    groups = classify_tool_groups(user_query)
+    if not groups:
+        return TOOLS
+    groups.add("conversation")
+    names = {n for g in groups for n in TOOL_GROUPS[g]}
+    return [t for t in TOOLS if t["function"]["name"] in names]
+
+
+# ============================================================
+#            LIST PAGINATION (ROW / TOKEN BUDGET)
+# ============================================================
+
+LIST_PAGE_MAX_ROWS = 50
+LIST_PAGE_DEFAULT_ROWS = 20
+LIST_TOKEN_BUDGET = 1500        # rough tokens of row JSON per page
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor) -> int:
+    if not cursor:
+        return 0
+    try:
+        tag, value = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        offset = int(value)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if tag != "o" or offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def estimate_tokens(row) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(to_json(row)) // 4 + 1
+
+
+def paginate_rows(query, pk, serialize, sort_columns, sort_by, order, limit, cursor, summary):
+    """
+    Return one budgeted page of ``query``.
+
+    Rows are added until ``limit`` rows or ``LIST_TOKEN_BUDGET`` tokens are
+    reached; ``next_cursor`` continues from there.
+    """
+    try:
+        offset = decode_cursor(cursor)
+    except ValueError as exc:
+        return {"error": str(exc)}
+
+    try:
+        limit = int(limit or LIST_PAGE_DEFAULT_ROWS)
+    except (TypeError, ValueError):
+        limit = LIST_PAGE_DEFAULT_ROWS
+    limit = max(1, min(limit, LIST_PAGE_MAX_ROWS))
+
+    if sort_by not in sort_columns:
+        sort_by = next(iter(sort_columns))
+    direction = desc if order == "desc" else asc
+    sort_col = sort_columns[sort_by]
+    # Tie-break on the primary key so pages are stable
+    query = query.order_by(direction(sort_col), asc(pk))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.offset(offset).limit(limit + 1).all()
+    has_more = len(rows) > limit
+
+    items = []
+    used = 0
+    for r in rows[:limit]:
+        item = serialize(r)
+        cost = estimate_tokens(item)
+        if items and used + cost > LIST_TOKEN_BUDGET:
+            has_more = True
+            break
+        items.append(item)
+        used += cost
+
+    return {
+        "summary": summary,
+        "offset": offset,
+        "returned": len(items),
+        "items": items,
+        "next_cursor": encode_cursor(offset + len(items)) if has_more else None,
+        "sort_by": sort_by,
+        "order": "desc" if order == "desc" else "asc",
+    }
+
+
+def fuzzy_lookup(index_name, name, columns, pk, limit=20):
+    """Ranked fuzzy matches from the trigram index as ``[(row, score)]``."""
+    hits = search_index.search(index_name, name or "", db.session, limit=limit)
+    if not hits:
+        return []
+    rows = db.session.query(pk, *columns).filter(pk.in_([i for i, _ in hits])).all()
+    by_id = {r[0]: r for r in rows}
+    return [(by_id[i], score) for i, score in hits if i in by_id]
+
+
 # ============================================================
 #                     INVENTORY TOOL LOGIC
 # ============================================================
 
 def tool_get_inventory_totals():
-    total_items = Inventory.query.count()
-    total_qty = db.session.query(func.sum(Inventory.quantity)).scalar() or 0
-    total_val = (
-        db.session.query(func.sum(Inventory.price * Inventory.quantity)).scalar() or 0
-    )
+    totals = columnar.run("inventory", db.session, lambda inv: {
+        "total_items": inv.count(),
+        "total_quantity": int(inv.stats("quantity")["sum"]),
+        "total_value": inv.stats(columnar.stock_values(inv))["sum"],
+    })
+    if totals is not None:
+        return totals
+
+    total_items, total_qty, total_val = db.session.query(
+        func.count(Inventory.id),
+        func.sum(Inventory.quantity),
+        func.sum(Inventory.price * Inventory.quantity),
+    ).one()
 
     return {
         "total_items": int(total_items),
-        "total_quantity": int(total_qty),
-        "total_value": float(total_val),
+        "total_quantity": int(total_qty or 0),
+        "total_value": float(total_val or 0),
     }
 
 
+def _top_inventory_columnar(inv, metric, limit):
+    values = columnar.stock_values(inv) if metric == "value" else metric
+    return columnar.top_labelled(inv, db.session, values, limit)
+
+
 def tool_get_top_inventory_items(metric: str, limit: int):
     limit = int(limit)
 
+    if metric in ("quantity", "price", "value"):
+        rows = columnar.run(
+            "inventory", db.session, lambda inv: _top_inventory_columnar(inv, metric, limit)
+        )
+        if rows is not None:
+            agent_memory["pending_value_calc_items"] = [name for name, _ in rows]
+            cast = int if metric == "quantity" else float
+            return [{"item": name, metric: cast(value)} for name, value in rows]
+
     if metric == "quantity":
-        rows = Inventory.query.order_by(desc(Inventory.quantity)).limit(limit).all()
-        agent_memory["pending_value_calc_items"] = [r.item_name for r in rows]
-        return [{"item": r.item_name, "quantity": int(r.quantity)} for r in rows]
+        rows = (
+            db.session.query(Inventory.item_name, Inventory.quantity)
+            .order_by(desc(Inventory.quantity), Inventory.id)
+            .limit(limit)
+            .all()
+        )
+        agent_memory["pending_value_calc_items"] = [name for name, _ in rows]
+        return [{"item": name, "quantity": int(qty)} for name, qty in rows]
 
     if metric == "price":
-        rows = Inventory.query.order_by(desc(Inventory.price)).limit(limit).all()
-        agent_memory["pending_value_calc_items"] = [r.item_name for r in rows]
-        return [{"item": r.item_name, "price": float(r.price)} for r in rows]
+        rows = (
+            db.session.query(Inventory.item_name, Inventory.price)
+            .order_by(desc(Inventory.price), Inventory.id)
+            .limit(limit)
+            .all()
+        )
+        agent_memory["pending_value_calc_items"] = [name for name, _ in rows]
+        return [{"item": name, "price": float(price)} for name, price in rows]
 
     if metric == "value":
         rows = (
             db.session.query(
-                Inventory,
+                Inventory.item_name,
                 (Inventory.price * Inventory.quantity).label("value"),
             )
-            .order_by(desc("value"))
+            .order_by(desc("value"), Inventory.id)
             .limit(limit)
             .all()
         )
-        agent_memory["pending_value_calc_items"] = [inv.item_name for inv, _ in rows]
-        return [{"item": inv.item_name, "value": float(value)} for inv, value in rows]
+        agent_memory["pending_value_calc_items"] = [name for name, _ in rows]
+        return [{"item": name, "value": float(value)} for name, value in rows]
 
     return {"error": "Invalid metric"}
 
 
-def tool_get_all_inventory_items():
-    rows = Inventory.query.all()
-    return [
-        {
+def tool_get_all_inventory_items(
+    name_contains=None, unit=None, min_quantity=None, max_quantity=None,
+    sort_by="item_name", order="asc", limit=None, cursor=None,
+):
+    query = db.session.query(
+        Inventory.id, Inventory.item_name, Inventory.quantity, Inventory.price
+    )
+    if name_contains:
+        query = query.filter(func.lower(Inventory.item_name).like(like_pattern(name_contains), escape=LIKE_ESCAPE))
+    if unit:
+        query = query.filter(Inventory.unit == unit)
+    if min_quantity is not None:
+        query = query.filter(Inventory.quantity >= int(min_quantity))
+    if max_quantity is not None:
+        query = query.filter(Inventory.quantity <= int(max_quantity))
+
+    matched, total_qty, total_val = query.with_entities(
+        func.count(Inventory.id),
+        func.sum(Inventory.quantity),
+        func.sum(Inventory.price * Inventory.quantity),
+    ).one()
+
+    return paginate_rows(
+        query,
+        Inventory.id,
+        lambda r: {
             "item": r.item_name,
             "quantity": int(r.quantity),
             "price": float(r.price),
             "value": float(r.price * r.quantity),
-        }
-        for r in rows
-    ]
+        },
+        {
+            "item_name": Inventory.item_name,
+            "quantity": Inventory.quantity,
+            "price": Inventory.price,
+            "value": Inventory.price * Inventory.quantity,
+        },
+        sort_by, order, limit, cursor,
+        summary={
+            "matched_items": int(matched or 0),
+            "total_quantity": int(total_qty or 0),
+            "total_value": float(total_val or 0),
+        },
+    )
 
 
 def tool_calculate_total_value_for_last_items():
@@ -369,8 +753,19 @@ def tool_calculate_total_value_for_last_items():
     breakdown = []
     total = 0
 
+    # One IN query instead of one lookup per item; first match per name wins
+    rows = (
+        db.session.query(Inventory.item_name, Inventory.quantity, Inventory.price)
+        .filter(Inventory.item_name.in_(items))
+        .order_by(Inventory.id)
+        .all()
+    )
+    by_name = {}
+    for row in rows:
+        by_name.setdefault(row.item_name, row)
+
     for name in items:
-        rec = Inventory.query.filter_by(item_name=name).first()
+        rec = by_name.get(name)
         if rec:
             val = rec.price * rec.quantity
             breakdown.append(
@@ -396,24 +791,61 @@ def tool_get_employee_count():
     return {"total_employees": Employees.query.count()}
 
 
-def tool_get_all_employees_basic():
-    rows = Employees.query.order_by(Employees.employee_name).all()
-    return [
-        {
+def tool_get_all_employees_basic(
+    name_contains=None, department=None, status=None,
+    sort_by="name", order="asc", limit=None, cursor=None,
+):
+    query = db.session.query(
+        Employees.id,
+        Employees.employee_name,
+        Employees.department,
+        Employees.status,
+        Employees.joining_date,
+    )
+    if name_contains:
+        query = query.filter(func.lower(Employees.employee_name).like(like_pattern(name_contains), escape=LIKE_ESCAPE))
+    if department:
+        query = query.filter(Employees.department == department)
+    if status:
+        query = query.filter(Employees.status == status)
+
+    status_rows = (
+        query.with_entities(Employees.status, func.count(Employees.id))
+        .group_by(Employees.status)
+        .all()
+    )
+
+    return paginate_rows(
+        query,
+        Employees.id,
+        lambda e: {
             "name": e.employee_name,
             "department": e.department,
             "status": e.status,
             "joining_date": e.joining_date.isoformat(),
-        }
-        for e in rows
-    ]
+        },
+        {
+            "name": Employees.employee_name,
+            "department": lookups.sort_key(Employees.department),
+            "joining_date": Employees.joining_date,
+        },
+        sort_by, order, limit, cursor,
+        summary={
+            "matched_employees": sum(int(c) for _, c in status_rows),
+            "by_status": {s: int(c) for s, c in status_rows},
+        },
+    )
 
 
 def tool_get_employees_by_department(department: str):
     rows = (
-        Employees.query.filter(
-            func.lower(Employees.department) == func.lower(department)
+        db.session.query(
+            Employees.employee_name,
+            Employees.department,
+            Employees.status,
+            Employees.joining_date,
         )
+        .filter(Employees.department == department)
         .order_by(Employees.employee_name)
         .all()
     )
@@ -430,10 +862,18 @@ def tool_get_employees_by_department(department: str):
 
 
 def tool_find_employee_by_name(name: str):
-    pattern = f"%{name}%"
-    rows = Employees.query.filter(
-        func.lower(Employees.employee_name).like(func.lower(pattern))
-    ).all()
+    matches = fuzzy_lookup(
+        "employees",
+        name,
+        (
+            Employees.employee_name,
+            Employees.department,
+            Employees.status,
+            Employees.salary,
+            Employees.joining_date,
+        ),
+        Employees.id,
+    )
 
     return [
         {
@@ -442,14 +882,35 @@ def tool_find_employee_by_name(name: str):
             "status": e.status,
             "salary": float(e.salary),
             "joining_date": e.joining_date.isoformat(),
+            "match_score": score,
         }
-        for e in rows
+        for e, score in matches
     ]
 
 
+def _employee_summary_columnar(emp):
+    newest, oldest = emp.labels(db.session, [
+        *emp.top_n("joining_date", 1), *emp.top_n("joining_date", 1, largest=False)
+    ]) or (None, None)
+    active = emp.count(emp.where(casefold=True, status="active"))
+    return {
+        "total_employees": emp.count(),
+        "active": active,
+        "inactive": emp.count() - active,
+        "departments": [{"department": d, "count": c} for d, c in emp.group_count("department")],
+        "average_salary": emp.stats("salary")["mean"] or 0.0,
+        "newest": newest,
+        "oldest": oldest,
+    }
+
+
 def tool_get_employee_summary():
+    summary = columnar.run("employees", db.session, _employee_summary_columnar)
+    if summary is not None:
+        return summary
+
     total = Employees.query.count()
-    active = Employees.query.filter(func.lower(Employees.status) == "active").count()
+    active = Employees.query.filter(Employees.status == "active").count()
     inactive = total - active
 
     dept_rows = (
@@ -459,8 +920,18 @@ def tool_get_employee_summary():
     )
 
     avg_salary = db.session.query(func.avg(Employees.salary)).scalar() or 0
-    newest = Employees.query.order_by(desc(Employees.joining_date)).first()
-    oldest = Employees.query.order_by(Employees.joining_date).first()
+    newest = (
+        db.session.query(Employees.employee_name)
+        .order_by(desc(Employees.joining_date))
+        .limit(1)
+        .scalar()
+    )
+    oldest = (
+        db.session.query(Employees.employee_name)
+        .order_by(Employees.joining_date)
+        .limit(1)
+        .scalar()
+    )
 
     return {
         "total_employees": int(total),
@@ -468,8 +939,8 @@ def tool_get_employee_summary():
         "inactive": int(inactive),
         "departments": [{"department": d, "count": int(c)} for d, c in dept_rows],
         "average_salary": float(avg_salary),
-        "newest": newest.employee_name if newest else None,
-        "oldest": oldest.employee_name if oldest else None,
+        "newest": newest,
+        "oldest": oldest,
     }
 
 
@@ -477,8 +948,33 @@ def tool_get_employee_summary():
 #                     SALARY ANALYTICS TOOLS
 # ============================================================
 
+SALARY_COLS = (Employees.employee_name, Employees.department, Employees.salary)
+
+
+def _salary_rows(emp, positions):
+    """Columnar rows in the shape (and number format) of the SQL salary tools."""
+    names = emp.labels(db.session, positions)
+    return [
+        {"name": name, "department": row["department"], "salary": float(row["salary"])}
+        for name, row in zip(names, (emp.row(p, "department", "salary") for p in positions))
+    ]
+
+
+def _salary_extreme(largest):
+    rows = columnar.run(
+        "employees", db.session,
+        lambda emp: _salary_rows(emp, emp.top_n("salary", 1, largest=largest)),
+    )
+    if rows is None:
+        return None
+    return rows[0] if rows else {"error": "No employees found"}
+
+
 def tool_get_highest_salary():
-    emp = Employees.query.order_by(desc(Employees.salary)).limit(1).first()
+    found = _salary_extreme(largest=True)
+    if found is not None:
+        return found
+    emp = db.session.query(*SALARY_COLS).order_by(desc(Employees.salary)).first()
     if not emp:
         return {"error": "No employees found"}
     return {
@@ -489,7 +985,10 @@ def tool_get_highest_salary():
 
 
 def tool_get_lowest_salary():
-    emp = Employees.query.order_by(Employees.salary).limit(1).first()
+    found = _salary_extreme(largest=False)
+    if found is not None:
+        return found
+    emp = db.session.query(*SALARY_COLS).order_by(Employees.salary).first()
     if not emp:
         return {"error": "No employees found"}
     return {
@@ -501,7 +1000,16 @@ def tool_get_lowest_salary():
 
 def tool_get_top_n_salaries(limit: int):
     limit = int(limit)
-    rows = Employees.query.order_by(desc(Employees.salary)).limit(limit).all()
+    rows = columnar.run("employees", db.session, lambda emp: _salary_rows(emp, emp.top_n("salary", limit)))
+    if rows is not None:
+        return rows
+
+    rows = (
+        db.session.query(*SALARY_COLS)
+        .order_by(desc(Employees.salary), Employees.id)
+        .limit(limit)
+        .all()
+    )
     return [
         {
             "name": e.employee_name,
@@ -512,12 +1020,31 @@ def tool_get_top_n_salaries(limit: int):
     ]
 
 
+def _salary_summary_columnar(emp):
+    if not len(emp):
+        return {"error": "No employees found"}
+    highest, lowest = _salary_rows(emp, [
+        *emp.top_n("salary", 1), *emp.top_n("salary", 1, largest=False)
+    ])
+    return {
+        "highest": highest,
+        "lowest": lowest,
+        "average": emp.stats("salary")["mean"],
+        "median": emp.percentiles("salary", [0.5])[0],
+    }
+
+
 def tool_get_salary_summary():
-    salaries = [e.salary for e in Employees.query.all()]
-    if not salaries:
+    summary = columnar.run("employees", db.session, _salary_summary_columnar)
+    if summary is not None:
+        return summary
+
+    salaries_sorted = db.session.scalars(
+        db.select(Employees.salary).order_by(Employees.salary)
+    ).all()
+    if not salaries_sorted:
         return {"error": "No employees found"}
 
-    salaries_sorted = sorted(salaries)
     n = len(salaries_sorted)
     mid = n // 2
     if n % 2 == 0:
@@ -525,12 +1052,12 @@ def tool_get_salary_summary():
     else:
         median = salaries_sorted[mid]
 
-    highest = max(salaries_sorted)
-    lowest = min(salaries_sorted)
-    avg = sum(salaries_sorted) / len(salaries_sorted)
+    highest = salaries_sorted[-1]
+    lowest = salaries_sorted[0]
+    avg = sum(salaries_sorted) / n
 
-    highest_emp = Employees.query.order_by(desc(Employees.salary)).first()
-    lowest_emp = Employees.query.order_by(Employees.salary).first()
+    highest_emp = db.session.query(*SALARY_COLS).order_by(desc(Employees.salary)).first()
+    lowest_emp = db.session.query(*SALARY_COLS).order_by(Employees.salary).first()
 
     return {
         "highest": {
@@ -548,12 +1075,30 @@ def tool_get_salary_summary():
     }
 
 
-def tool_get_salary_distribution():
-    rows = Employees.query.all()
-    if not rows:
+def _salary_distribution_columnar(emp):
+    if not len(emp):
         return {"error": "No employees found"}
+    low, p25, median, p75, high = emp.percentiles("salary", [0, 0.25, 0.5, 0.75, 1])
+    return {
+        "min": low,
+        "max": high,
+        "median": median,
+        "p25": p25,
+        "p75": p75,
+        "average": emp.stats("salary")["mean"],
+    }
+
 
-    salaries = sorted([e.salary for e in rows])
+def tool_get_salary_distribution():
+    distribution = columnar.run("employees", db.session, _salary_distribution_columnar)
+    if distribution is not None:
+        return distribution
+
+    salaries = db.session.scalars(
+        db.select(Employees.salary).order_by(Employees.salary)
+    ).all()
+    if not salaries:
+        return {"error": "No employees found"}
 
     def percentile(p):
         k = (len(salaries) - 1) * p
@@ -562,8 +1107,8 @@ def tool_get_salary_distribution():
         return salaries[f] + (salaries[c] - salaries[f]) * (k - f)
 
     return {
-        "min": float(min(salaries)),
-        "max": float(max(salaries)),
+        "min": float(salaries[0]),
+        "max": float(salaries[-1]),
         "median": float(percentile(0.5)),
         "p25": float(percentile(0.25)),
         "p75": float(percentile(0.75)),
@@ -572,6 +1117,13 @@ def tool_get_salary_distribution():
 
 
 def tool_get_avg_salary_by_department():
+    groups = columnar.run("employees", db.session, lambda emp: emp.group_stats("department", "salary"))
+    if groups is not None:
+        return [
+            {"department": d, "average": s["mean"], "min": s["min"], "max": s["max"]}
+            for d, s in groups
+        ]
+
     rows = (
         db.session.query(
             Employees.department,
@@ -594,48 +1146,66 @@ def tool_get_avg_salary_by_department():
     ]
 
 
-def tool_get_highest_salary_per_department():
-    depts = db.session.query(Employees.department).distinct().all()
-    result = []
+def _salary_extreme_per_department_columnar(largest):
+    def extremes(emp):
+        found = sorted(emp.extreme_per_group("department", "salary", largest=largest))
+        rows = _salary_rows(emp, [p for _, p in found])
+        return [{"department": r["department"], "name": r["name"], "salary": r["salary"]} for r in rows]
+    return columnar.run("employees", db.session, extremes)
+
 
-    for (dept,) in depts:
-        emp = (
-            Employees.query.filter_by(department=dept)
-            .order_by(desc(Employees.salary))
-            .first()
+def salary_extreme_per_department(agg):
+    # One grouped subquery + join instead of one query per department
+    extreme = (
+        db.session.query(
+            Employees.department.label("department"),
+            agg(Employees.salary).label("salary"),
         )
-        if emp:
-            result.append(
-                {
-                    "department": dept,
-                    "name": emp.employee_name,
-                    "salary": float(emp.salary),
-                }
-            )
+        .group_by(Employees.department)
+        .subquery()
+    )
+    rows = (
+        db.session.query(*SALARY_COLS)
+        .join(
+            extreme,
+            (Employees.department == extreme.c.department)
+            & (Employees.salary == extreme.c.salary),
+        )
+        .order_by(Employees.department, Employees.id)
+        .all()
+    )
 
+    result = []
+    seen = set()
+    for name, dept, salary in rows:
+        if dept in seen:
+            continue
+        seen.add(dept)
+        result.append(
+            {
+                "department": dept,
+                "name": name,
+                "salary": float(salary),
+            }
+        )
+
+    # Grouped on lookup codes; present departments by name
+    result.sort(key=lambda r: r["department"])
     return result
 
 
-def tool_get_lowest_salary_per_department():
-    depts = db.session.query(Employees.department).distinct().all()
-    result = []
+def tool_get_highest_salary_per_department():
+    rows = _salary_extreme_per_department_columnar(largest=True)
+    if rows is not None:
+        return rows
+    return salary_extreme_per_department(func.max)
 
-    for (dept,) in depts:
-        emp = (
-            Employees.query.filter_by(department=dept)
-            .order_by(Employees.salary)
-            .first()
-        )
-        if emp:
-            result.append(
-                {
-                    "department": dept,
-                    "name": emp.employee_name,
-                    "salary": float(emp.salary),
-                }
-            )
 
-    return result
+def tool_get_lowest_salary_per_department():
+    rows = _salary_extreme_per_department_columnar(largest=False)
+    if rows is not None:
+        return rows
+    return salary_extreme_per_department(func.min)
 
 
 # ============================================================
@@ -646,24 +1216,56 @@ def tool_get_vendor_count():
     return {"total_vendors": Vendors.query.count()}
 
 
-def tool_get_all_vendors_basic():
-    rows = Vendors.query.order_by(Vendors.vendor_name).all()
-    return [
-        {
+def tool_get_all_vendors_basic(
+    name_contains=None, category=None,
+    sort_by="name", order="asc", limit=None, cursor=None,
+):
+    query = db.session.query(
+        Vendors.id,
+        Vendors.vendor_name,
+        Vendors.contact_person,
+        Vendors.phone,
+        Vendors.category,
+    )
+    if name_contains:
+        query = query.filter(func.lower(Vendors.vendor_name).like(like_pattern(name_contains), escape=LIKE_ESCAPE))
+    if category:
+        query = query.filter(Vendors.category == category)
+
+    category_rows = (
+        query.with_entities(Vendors.category, func.count(Vendors.id))
+        .group_by(Vendors.category)
+        .all()
+    )
+
+    return paginate_rows(
+        query,
+        Vendors.id,
+        lambda v: {
             "name": v.vendor_name,
             "contact_person": v.contact_person,
             "phone": v.phone,
             "category": v.category,
-        }
-        for v in rows
-    ]
+        },
+        {
+            "name": Vendors.vendor_name,
+            "category": lookups.sort_key(Vendors.category),
+        },
+        sort_by, order, limit, cursor,
+        summary={
+            "matched_vendors": sum(int(n) for _, n in category_rows),
+            "categories": len(category_rows),
+        },
+    )
 
 
 def tool_find_vendor_by_name(name: str):
-    pattern = f"%{name}%"
-    rows = Vendors.query.filter(
-        func.lower(Vendors.vendor_name).like(func.lower(pattern))
-    ).all()
+    matches = fuzzy_lookup(
+        "vendors",
+        name,
+        (Vendors.vendor_name, Vendors.contact_person, Vendors.phone, Vendors.category),
+        Vendors.id,
+    )
 
     return [
         {
@@ -671,12 +1273,20 @@ def tool_find_vendor_by_name(name: str):
             "contact_person": v.contact_person,
             "phone": v.phone,
             "category": v.category,
+            "match_score": score,
         }
-        for v in rows
+        for v, score in matches
     ]
 
 
 def tool_get_vendor_summary():
+    categories = columnar.run("vendors", db.session, lambda ven: ven.group_count("category"))
+    if categories is not None:
+        return {
+            "total_vendors": sum(n for _, n in categories),
+            "categories": [{"category": c, "count": n} for c, n in categories],
+        }
+
     total = Vendors.query.count()
 
     category_rows = (
@@ -699,24 +1309,58 @@ def tool_get_customer_count():
     return {"total_customers": Customers.query.count()}
 
 
-def tool_get_all_customers_basic():
-    rows = Customers.query.order_by(Customers.customer_name).all()
-    return [
-        {
+def tool_get_all_customers_basic(
+    name_contains=None, status=None, address_contains=None,
+    sort_by="name", order="asc", limit=None, cursor=None,
+):
+    query = db.session.query(
+        Customers.id,
+        Customers.customer_name,
+        Customers.phone,
+        Customers.address,
+        Customers.status,
+    )
+    if name_contains:
+        query = query.filter(func.lower(Customers.customer_name).like(like_pattern(name_contains), escape=LIKE_ESCAPE))
+    if status:
+        query = query.filter(Customers.status == status)
+    if address_contains:
+        query = query.filter(func.lower(Customers.address).like(like_pattern(address_contains), escape=LIKE_ESCAPE))
+
+    status_rows = (
+        query.with_entities(Customers.status, func.count(Customers.id))
+        .group_by(Customers.status)
+        .all()
+    )
+
+    return paginate_rows(
+        query,
+        Customers.id,
+        lambda c: {
             "name": c.customer_name,
             "phone": c.phone,
             "address": c.address,
             "status": c.status,
-        }
-        for c in rows
-    ]
+        },
+        {
+            "name": Customers.customer_name,
+            "status": lookups.sort_key(Customers.status),
+        },
+        sort_by, order, limit, cursor,
+        summary={
+            "matched_customers": sum(int(c) for _, c in status_rows),
+            "by_status": {s: int(c) for s, c in status_rows},
+        },
+    )
 
 
 def tool_find_customer_by_name(name: str):
-    pattern = f"%{name}%"
-    rows = Customers.query.filter(
-        func.lower(Customers.customer_name).like(func.lower(pattern))
-    ).all()
+    matches = fuzzy_lookup(
+        "customers",
+        name,
+        (Customers.customer_name, Customers.phone, Customers.address, Customers.status),
+        Customers.id,
+    )
 
     return [
         {
@@ -724,14 +1368,15 @@ def tool_find_customer_by_name(name: str):
             "phone": c.phone,
             "address": c.address,
             "status": c.status,
+            "match_score": score,
         }
-        for c in rows
+        for c, score in matches
     ]
 
 
 def tool_get_customer_summary():
     total = Customers.query.count()
-    active = Customers.query.filter(func.lower(Customers.status) == "active").count()
+    active = Customers.query.filter(Customers.status == "active").count()
     inactive = total - active
 
     return {
@@ -745,14 +1390,23 @@ def tool_get_customer_summary():
 #                 TOOL DISPATCHER (EXECUTES TOOLS)
 # ============================================================
 
-def execute_tool(name, args):
+def execute_tool(name, args, conversation=None):
     # Inventory
     if name == "get_inventory_totals":
         return tool_get_inventory_totals()
     if name == "get_top_inventory_items":
         return tool_get_top_inventory_items(args.get("metric"), args.get("limit"))
     if name == "get_all_inventory_items":
-        return tool_get_all_inventory_items()
+        return tool_get_all_inventory_items(
+            name_contains=args.get("name_contains"),
+            unit=args.get("unit"),
+            min_quantity=args.get("min_quantity"),
+            max_quantity=args.get("max_quantity"),
+            sort_by=args.get("sort_by"),
+            order=args.get("order"),
+            limit=args.get("limit"),
+            cursor=args.get("cursor"),
+        )
     if name == "calculate_total_value_for_last_items":
         return tool_calculate_total_value_for_last_items()
 
@@ -760,7 +1414,15 @@ def execute_tool(name, args):
     if name == "get_employee_count":
         return tool_get_employee_count()
     if name == "get_all_employees_basic":
-        return tool_get_all_employees_basic()
+        return tool_get_all_employees_basic(
+            name_contains=args.get("name_contains"),
+            department=args.get("department"),
+            status=args.get("status"),
+            sort_by=args.get("sort_by"),
+            order=args.get("order"),
+            limit=args.get("limit"),
+            cursor=args.get("cursor"),
+        )
     if name == "get_employees_by_department":
         return tool_get_employees_by_department(args.get("department"))
     if name == "find_employee_by_name":
@@ -788,7 +1450,14 @@ def execute_tool(name, args):
     if name == "get_vendor_count":
         return tool_get_vendor_count()
     if name == "get_all_vendors_basic":
-        return tool_get_all_vendors_basic()
+        return tool_get_all_vendors_basic(
+            name_contains=args.get("name_contains"),
+            category=args.get("category"),
+            sort_by=args.get("sort_by"),
+            order=args.get("order"),
+            limit=args.get("limit"),
+            cursor=args.get("cursor"),
+        )
     if name == "find_vendor_by_name":
         return tool_find_vendor_by_name(args.get("name"))
     if name == "get_vendor_summary":
@@ -798,20 +1467,166 @@ def execute_tool(name, args):
     if name == "get_customer_count":
         return tool_get_customer_count()
     if name == "get_all_customers_basic":
-        return tool_get_all_customers_basic()
+        return tool_get_all_customers_basic(
+            name_contains=args.get("name_contains"),
+            status=args.get("status"),
+            address_contains=args.get("address_contains"),
+            sort_by=args.get("sort_by"),
+            order=args.get("order"),
+            limit=args.get("limit"),
+            cursor=args.get("cursor"),
+        )
     if name == "find_customer_by_name":
         return tool_find_customer_by_name(args.get("name"))
     if name == "get_customer_summary":
         return tool_get_customer_summary()
 
+    # Conversation
+    if name == "recall_tool_result":
+        if conversation is None:
+            return {"error": "No conversation history available."}
+        return conversation.recall(args.get("ref"))
+
     return {"error": f"Unknown tool '{name}'"}
 
 
+# ============================================================
+#            INSTRUMENTATION (LATENCY / TOKENS / COST)
+# ============================================================
+
+chatbot_metrics = MetricsRegistry()
+
+# USD per 1M tokens: (prompt, completion)
+MODEL_PRICES = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+}
+
+
+def current_trace():
+    return g.get("chat_trace") or NullTrace()
+
+
+def result_row_count(result) -> int:
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get("items"), list):
+        return len(result["items"])
+    return 1
+
+
+# ============================================================
+#          UPSTREAM PROTECTION (TIMEOUTS / CIRCUIT BREAKER)
+# ============================================================
+
+class UpstreamUnavailable(Exception):
+    """The LLM can't be used for this request; answer locally instead."""
+
+
+llm_breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+
+_clients = {}
+_clients_lock = threading.Lock()
+_llm_slots = None
+
+
+def get_client() -> OpenAI:
+    """One pooled OpenAI client per (key, base_url), with explicit timeouts."""
+    cfg = current_app.config
+    key = (os.getenv("OPENAI_API_KEY"), cfg.get("OPENAI_BASE_URL"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=key[0],
+                base_url=key[1],
+                timeout=cfg["CHATBOT_LLM_TIMEOUT"],
+                max_retries=cfg["CHATBOT_LLM_MAX_RETRIES"],
+            )
+            _clients[key] = client
+        return client
+
+
+def llm_slots():
+    # Bulkhead: caps worker threads that can be parked on the upstream
+    global _llm_slots
+    with _clients_lock:
+        if _llm_slots is None:
+            _llm_slots = threading.BoundedSemaphore(
+                current_app.config["CHATBOT_MAX_CONCURRENT_LLM"]
+            )
+        return _llm_slots
+
+
+def is_upstream_failure(exc) -> bool:
+    if isinstance(exc, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def create_completion(client: OpenAI, purpose: str, **kwargs):
+    """
+    client.chat.completions.create behind the circuit breaker and the
+    request deadline, with timing and token/cost accounting.
+    """
+    model = kwargs.get("model")
+
+    deadline = g.get("chat_deadline")
+    timeout = current_app.config["CHATBOT_LLM_TIMEOUT"]
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise UpstreamUnavailable("request deadline exceeded")
+
+    slots = llm_slots()
+    if not slots.acquire(timeout=min(timeout, 1.0)):
+        raise UpstreamUnavailable("too many concurrent LLM calls")
+
+    try:
+        if not llm_breaker.allow():
+            raise UpstreamUnavailable("circuit open")
+
+        with current_trace().span("llm", model=model, purpose=purpose) as span:
+            try:
+                response = client.chat.completions.create(timeout=timeout, **kwargs)
+            except Exception as exc:
+                if not is_upstream_failure(exc):
+                    llm_breaker.record_success()
+                    raise
+                llm_breaker.record_failure()
+                span["error"] = type(exc).__name__
+                raise UpstreamUnavailable(str(exc)) from exc
+            llm_breaker.record_success()
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            prompt = getattr(usage, "prompt_tokens", 0) or 0
+            completion = getattr(usage, "completion_tokens", 0) or 0
+            span.update(prompt_tokens=prompt, completion_tokens=completion)
+
+            chatbot_metrics.observe("llm_prompt_tokens", prompt, model=model)
+            chatbot_metrics.observe("llm_completion_tokens", completion, model=model)
+            chatbot_metrics.inc("llm_prompt_tokens_total", prompt, model=model)
+            chatbot_metrics.inc("llm_completion_tokens_total", completion, model=model)
+
+            price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+            cost = (prompt * price_in + completion * price_out) / 1_000_000
+            span["cost_usd"] = round(cost, 6)
+            chatbot_metrics.inc("llm_cost_usd_total", cost, model=model)
+    finally:
+        slots.release()
+
+    return response
+
+
 # ============================================================
 #                        GPT AGENT CALL
 # ============================================================
 
-def call_gpt_agent(client: OpenAI, user_query: str):
+def call_gpt_agent(client: OpenAI, user_query: str, history=None):
+    """First completion for ``user_query``; returns ``(response, tools offered)``."""
     messages = [
         {
             "role": "system",
@@ -821,38 +1636,61 @@ def call_gpt_agent(client: OpenAI, user_query: str):
                 "vendors, and customers. Never guess data."
             ),
         },
+        *(history or []),
         {"role": "user", "content": user_query},
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4.1",
+    with current_trace().span("router") as span:
+        tools = select_tools(user_query)
+        span["tools"] = len(tools)
+
+    response = create_completion(
+        client,
+        "agent",
+        model=current_app.config["CHATBOT_MODEL"],
         messages=messages,
-        tools=TOOLS,
+        tools=tools,
         tool_choice="auto",
     )
-    return response
+    return response, tools
 
 
 # ============================================================
-#             SAFE JSON (DECIMAL → FLOAT CONVERSION)
+#          JSON ENCODING (DECIMAL / DATE IN ONE PASS)
 # ============================================================
 
-def safe_json(data):
-    """Convert Decimals and other non-serializable objects to safe JSON."""
-    if isinstance(data, Decimal):
-        return float(data)
-    if isinstance(data, dict):
-        return {k: safe_json(v) for k, v in data.items()}
-    if isinstance(data, list):
-        return [safe_json(i) for i in data]
-    return data
+def json_default(obj):
+    """json.dumps hook: only called for values json can't encode natively."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def to_json(data) -> str:
+    return json.dumps(data, default=json_default)
 
 
 # ============================================================
 #           HANDLE TOOL CALLS (OFFICIAL OPENAI FORMAT)
 # ============================================================
 
-def handle_gpt_response(client: OpenAI, response):
+FOLLOW_UP_PROMPT = "Format the result cleanly and clearly for the user."
+PAGING_PROMPT = (
+    " If the user needs more rows than the result holds, call the same tool "
+    "again with its next_cursor instead of answering."
+)
+
+
+def handle_gpt_response(client: OpenAI, response, conversation=None, tool_log=None,
+                        tools=None, user_query=None, rounds=0):
+    """
+    Run the response's tool calls and return the formatted reply. While
+    ``tools`` are given, the formatting call may call them again (e.g. the
+    next page of a list tool via next_cursor), up to
+    CHATBOT_MAX_TOOL_ROUNDS rounds per question.
+    """
     msg = response.choices[0].message
 
     # If no tool call → return direct text
@@ -866,31 +1704,200 @@ def handle_gpt_response(client: OpenAI, response):
         args = json.loads(tool_call.function.arguments or "{}")
 
         # Execute local Python tool
-        result = execute_tool(name, args)
-        result = safe_json(result)
+        with current_trace().span("tool", tool=name) as span:
+            result = execute_tool(name, args, conversation)
+            span["rows"] = result_row_count(result)
+        chatbot_metrics.observe("tool_rows", span["rows"], tool=name)
+
+        with current_trace().span("serialize", tool=name) as span:
+            content = to_json(result)
+            span["bytes"] = len(content)
+
+        if tool_log is not None and name != "recall_tool_result":
+            tool_log.append((name, result))
 
         # Build the correct tool message chain
+        can_page = bool(tools) and rounds < current_app.config["CHATBOT_MAX_TOOL_ROUNDS"]
         follow_messages = [
             {
                 "role": "system",
-                "content": "Format the result cleanly and clearly for the user."
+                "content": FOLLOW_UP_PROMPT + (PAGING_PROMPT if can_page else "")
             },
+            *([{"role": "user", "content": user_query}] if user_query else []),
             msg,  # original assistant message with tool_calls
             {
                 "role": "tool",
                 "tool_call_id": tool_call.id,
-                "content": json.dumps(result)
+                "content": content
             }
         ]
+        paging = {"tools": tools, "tool_choice": "auto"} if can_page else {}
+
+        try:
+            follow = create_completion(
+                client,
+                "format",
+                model=current_app.config["CHATBOT_MODEL"],
+                messages=follow_messages,
+                **paging
+            )
+        except UpstreamUnavailable:
+            # Data is already in hand; format it locally
+            final_reply = DEGRADED_NOTICE + render_tool_result(name, result)
+            continue
+
+        if getattr(follow.choices[0].message, "tool_calls", None):
+            # Another page (or tool) within the same question
+            final_reply = handle_gpt_response(
+                client, follow, conversation, tool_log, tools, user_query, rounds + 1
+            )
+        else:
+            final_reply = follow.choices[0].message.content
 
-        follow = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=follow_messages
-        )
+    return final_reply
 
-        final_reply = follow.choices[0].message.content
 
-    return final_reply
+# ============================================================
+#          DEGRADED MODE (LOCAL ANSWERS WHEN LLM IS DOWN)
+# ============================================================
+
+DEGRADED_NOTICE = (
+    "(The AI assistant is temporarily unavailable, so this answer comes "
+    "straight from the database.)\n"
+)
+
+
+def _top_items_args(match, q):
+    if "price" in q:
+        metric = "price"
+    elif re.search(r"quantit|qty", q):
+        metric = "quantity"
+    else:
+        metric = "value"
+    return {"metric": metric, "limit": int(match.group(1) or 5)}
+
+
+# (pattern, tool, args builder) — first match wins
+DEGRADED_RULES = [
+    (re.compile(r"\btop\s*(\d+)?\b.*\b(items?|products?|stock|inventory)"),
+     "get_top_inventory_items", _top_items_args),
+    (re.compile(r"\b(average|avg)\b.*salar.*\b(department|dept)"),
+     "get_avg_salary_by_department", None),
+    (re.compile(r"\b(highest|top|most)\b.*\b(salar|paid|earn)"), "get_highest_salary", None),
+    (re.compile(r"\b(lowest|least)\b.*\b(salar|paid|earn)"), "get_lowest_salary", None),
+    (re.compile(r"how many employees|employee count|headcount"), "get_employee_count", None),
+    (re.compile(r"how many vendors|vendor count"), "get_vendor_count", None),
+    (re.compile(r"how many customers|customer count"), "get_customer_count", None),
+]
+
+# Fallback per tool group, in priority order
+DEGRADED_GROUP_TOOLS = [
+    ("salary", "get_salary_summary"),
+    ("inventory", "get_inventory_totals"),
+    ("employee", "get_employee_summary"),
+    ("vendor", "get_vendor_summary"),
+    ("customer", "get_customer_summary"),
+]
+
+
+def pick_degraded_tool(user_query: str):
+    q = (user_query or "").lower()
+    for pattern, tool, build_args in DEGRADED_RULES:
+        match = pattern.search(q)
+        if match:
+            return tool, (build_args(match, q) if build_args else {})
+
+    groups = classify_tool_groups(q)
+    for group, tool in DEGRADED_GROUP_TOOLS:
+        if group in groups:
+            return tool, {}
+    return None, {}
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def render_tool_result(name, result) -> str:
+    title = name.replace("get_", "", 1).replace("_", " ").capitalize()
+    if isinstance(result, dict) and "error" in result:
+        return f"{title}: {result['error']}"
+
+    def render(value, indent=""):
+        lines = []
+        if isinstance(value, list):
+            for row in value:
+                if isinstance(row, dict):
+                    lines.append(indent + "- " + ", ".join(
+                        f"{k}: {_fmt(v)}" for k, v in row.items()
+                    ))
+                else:
+                    lines.append(f"{indent}- {_fmt(row)}")
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                label = k.replace("_", " ").capitalize()
+                if isinstance(v, (list, dict)):
+                    lines.append(f"{indent}{label}:")
+                    lines.extend(render(v, indent + "  "))
+                else:
+                    lines.append(f"{indent}{label}: {_fmt(v)}")
+        else:
+            lines.append(indent + _fmt(value))
+        return lines
+
+    return "\n".join([title] + render(result))
+
+
+def degraded_answer(user_query: str):
+    """Return ``(reply, tool_results)`` using local tools only."""
+    chatbot_metrics.inc("degraded_responses")
+    tool, args = pick_degraded_tool(user_query)
+    if tool is None:
+        return DEGRADED_NOTICE + (
+            "Try asking about inventory totals, top items, salaries, "
+            "employees, vendors or customers."
+        ), []
+
+    with current_trace().span("tool", tool=tool) as span:
+        result = execute_tool(tool, args)
+        span["rows"] = result_row_count(result)
+    return DEGRADED_NOTICE + render_tool_result(tool, result), [(tool, result)]
+
+
+# ============================================================
+#          REQUEST COALESCING (IDENTICAL CONCURRENT QUERIES)
+# ============================================================
+
+CHATBOT_TABLES = ("inventory", "employees", "vendors", "customers")
+
+# Concurrent identical questions wait on one in-flight GPT round trip.
+# Followers give up and compute on their own after the timeout.
+chat_flight = SingleFlight(timeout=60)
+
+
+def normalize_query(q: str) -> str:
+    q = " ".join((q or "").lower().split())
+    return q.rstrip("?!. ")
+
+
+def coalesce_key(user_query: str, conversation=None):
+    # Data version in the key: a write between requests means a fresh answer.
+    # Questions with prior history depend on it, so they only share per revision.
+    history_key = None
+    if conversation is not None and conversation.turns:
+        history_key = (conversation.id, conversation.revision)
+    return (normalize_query(user_query), get_version(*CHATBOT_TABLES), history_key)
+
+
+def answer_query(client: OpenAI, user_query: str, conversation=None):
+    """Return ``(reply, tool_results)`` for one question."""
+    tool_log = []
+    history = conversation.context_messages() if conversation is not None else None
+    response, tools = call_gpt_agent(client, user_query, history)
+    reply = handle_gpt_response(client, response, conversation, tool_log, tools, user_query)
+    return reply, tool_log
 
 
 # ============================================================
@@ -900,14 +1907,33 @@ def handle_gpt_response(client: OpenAI, response):
 @chatbot_bp.route("/api/chatbot", methods=["POST"])
 @limiter.limit("10 per minute")
 def chatbot():
+    g.chat_trace = RequestTrace(chatbot_metrics, "chatbot_request")
+    g.chat_deadline = time.monotonic() + current_app.config["CHATBOT_REQUEST_DEADLINE"]
+    try:
+        return _chatbot()
+    finally:
+        g.chat_trace.finish()
+
+
+@chatbot_bp.route("/api/chatbot/metrics")
+@login_required
+def chatbot_metrics_view():
+    # Operational internals: only for the operators named in config
+    if current_user.username not in current_app.config["CHATBOT_METRICS_USERS"]:
+        abort(404)
+    return jsonify({**chatbot_metrics.snapshot(), "llm_circuit": llm_breaker.snapshot()})
+
+
+def _chatbot():
     data = request.get_json() or {}
     user_query = (data.get("query") or "").strip()
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = get_client()
+    conversation = current_conversation()
 
     # Follow-up like: "total value", "their value", etc.
     if is_followup_query(user_query):
+        g.chat_trace.tags["path"] = "followup"
         result = tool_calculate_total_value_for_last_items()
-        result = safe_json(result)
 
         if "breakdown" in result:
             lines = []
@@ -918,11 +1944,32 @@ def chatbot():
             lines.append(f"\nTotal value = ₹{result['total_value']:,.2f}")
             reply = "\n".join(lines)
         else:
-            reply = json.dumps(result, indent=2)
+            reply = json.dumps(result, indent=2, default=json_default)
+        with conversation.lock:
+            conversation.record_turn(
+                user_query, reply, [("calculate_total_value_for_last_items", result)]
+            )
         return jsonify({"reply": reply})
 
-    # Main tool-calling path
-    response = call_gpt_agent(client, user_query)
-    reply = handle_gpt_response(client, response)
+    # Main tool-calling path (shared by identical in-flight queries).
+    # The lock keeps one session's turns in order.
+    ran = []
+
+    def compute():
+        ran.append(True)
+        return answer_query(client, user_query, conversation)
+
+    with conversation.lock:
+        try:
+            reply, tool_results = chat_flight.do(
+                coalesce_key(user_query, conversation), compute
+            )
+            g.chat_trace.tags["path"] = "agent" if ran else "coalesced"
+            if not ran:
+                chatbot_metrics.inc("coalesced_requests")
+        except UpstreamUnavailable as exc:
+            g.chat_trace.tags.update(path="degraded", reason=str(exc)[:200])
+            reply, tool_results = degraded_answer(user_query)
+        conversation.record_turn(user_query, reply, tool_results)
 
     return jsonify({"reply": reply})
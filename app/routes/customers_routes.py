@@ -1,15 +1,31 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort
 from flask_login import login_required
+from sqlalchemy.orm.exc import StaleDataError
 from app.models.customers import Customers
 from app import db
+from app.services import search_index, rollups, columnar, archive
+from app.services.conditional import conditional
 
 customers_bp = Blueprint('customers', __name__)
 
 @customers_bp.route('/customers')
 @login_required
+@conditional('customers', 'customers_archive')
 def customers():
-    all_customers = Customers.query.all()
-    return render_template('customers.html', customers=all_customers)
+    q = request.args.get('q', '').strip()
+    include_archived = archive.include_archived(request.args)
+    if q:
+        all_customers = search_index.search_models('customers', q, db.session)
+    else:
+        all_customers = Customers.query.all()
+    archived_page, more_archived = archive.page_of(request.args), False
+    if include_archived:
+        archived, more_archived = archive.rows(db.session, Customers, 'customer_name', q, page=archived_page)
+        all_customers += archived
+    return render_template(
+        'customers.html', customers=all_customers, q=q, include_archived=include_archived,
+        archived_page=archived_page, more_archived=more_archived,
+    )
 
 
 @customers_bp.route('/customers/add', methods=['GET', 'POST'])
@@ -35,11 +51,19 @@ def edit_customer(id):
     customer = Customers.query.get_or_404(id)
 
     if request.method == 'POST':
+        # Someone saved since this form was loaded
+        if request.form.get('version_id', type=int) not in (None, customer.version_id):
+            return render_template('edit_customer.html', customer=customer, conflict=True), 409
+
         customer.customer_name = request.form.get("customer_name")
         customer.phone = request.form.get("phone")
         customer.address = request.form.get("address")
         customer.status = request.form.get("status")
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return render_template('edit_customer.html', customer=customer, conflict=True), 409
         return redirect(url_for('customers.customers'))
 
     return render_template('edit_customer.html', customer=customer)
@@ -48,26 +72,41 @@ def edit_customer(id):
 @customers_bp.route('/customers/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_customer(id):
+    # Soft delete: the row moves to customers_archive and can be restored
     customer = Customers.query.get_or_404(id)
-    db.session.delete(customer)
-    db.session.commit()
+    archive.archive(db.session, customer)
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        abort(409)
     return redirect(url_for('customers.customers'))
 
 
+@customers_bp.route('/customers/restore/<int:id>', methods=['POST'])
+@login_required
+def restore_customer(id):
+    try:
+        archive.restore(db.session, Customers, id) or abort(404)
+    except archive.RestoreConflict:
+        abort(409)
+    db.session.commit()
+    return redirect(url_for('customers.customers', include_archived=1))
+
+
 @customers_bp.route('/customers/analytics')
 @login_required
+@conditional('customers', 'customers_archive')
 def customers_analytics():
+    include_archived = archive.include_archived(request.args)
     total = Customers.query.count()
 
     active = Customers.query.filter_by(status="Active").count()
     inactive = Customers.query.filter_by(status="Inactive").count()
-
-    city_data = Customers.query.with_entities(
-        Customers.address, db.func.count()
-    ).group_by(Customers.address).all()
-
-    city_labels = [c[0] for c in city_data]
-    city_counts = [c[1] for c in city_data]
+    if include_archived:
+        total += archive.count(db.session, Customers)
+        active += archive.count(db.session, Customers, status="Active")
+        inactive += archive.count(db.session, Customers, status="Inactive")
 
     latest_customers = Customers.query.order_by(Customers.id.desc()).limit(10).all()
 
@@ -76,9 +115,68 @@ def customers_analytics():
         total=total,
         active=active,
         inactive=inactive,
-        city_labels=city_labels,
-        city_counts=city_counts,
-        month_labels=[],
-        month_counts=[],
-        latest_customers=latest_customers
+        latest_customers=latest_customers,
+        include_archived=include_archived,
     )
+
+
+def _status_chart(include_archived):
+    counts = columnar.run('customers', db.session, lambda cust: (
+        cust.count(cust.where(casefold=True, status='Active')),
+        cust.count(cust.where(casefold=True, status='Inactive')),
+    ))
+    if counts:
+        active, inactive = counts
+    else:
+        active = Customers.query.filter_by(status="Active").count()
+        inactive = Customers.query.filter_by(status="Inactive").count()
+    if include_archived:
+        active += archive.count(db.session, Customers, status="Active")
+        inactive += archive.count(db.session, Customers, status="Inactive")
+    return {'labels': ['Active', 'Inactive'], 'series': [active, inactive]}
+
+
+def _city_chart(include_archived):
+    city_data = columnar.run('customers', db.session, lambda cust: cust.group_count('city'))
+    if city_data is None:
+        city_data = Customers.query.with_entities(
+            Customers.city, db.func.count()
+        ).group_by(Customers.city).order_by(db.func.count().desc()).all()
+    if include_archived:
+        city_data = archive.merge_counts(city_data, archive.group_count(db.session, Customers, 'city'))
+    return {'labels': [c[0] or 'Unknown' for c in city_data], 'series': [c[1] for c in city_data]}
+
+
+def _region_chart(include_archived):
+    region_data = columnar.run('customers', db.session, lambda cust: cust.group_count('region'))
+    if region_data is None:
+        region_data = Customers.query.with_entities(
+            Customers.region, db.func.count()
+        ).group_by(Customers.region).order_by(db.func.count().desc()).all()
+    if include_archived:
+        region_data = archive.merge_counts(region_data, archive.group_count(db.session, Customers, 'region'))
+    return {'labels': [r[0] or 'Unknown' for r in region_data], 'series': [r[1] for r in region_data]}
+
+
+def _monthly_chart(include_archived):
+    if include_archived:
+        return rollups.series(db.session, 'customers_created', 'customers_created_archived')
+    return rollups.series(db.session, 'customers_created')
+
+
+CUSTOMER_CHARTS = {
+    'status': _status_chart,
+    'cities': _city_chart,
+    'regions': _region_chart,
+    'monthly': _monthly_chart,
+}
+
+
+@customers_bp.route('/customers/analytics/charts/<name>')
+@login_required
+@conditional('customers', 'customers_archive')
+def customers_chart(name):
+    chart = CUSTOMER_CHARTS.get(name)
+    if chart is None:
+        abort(404)
+    return jsonify(chart(archive.include_archived(request.args)))
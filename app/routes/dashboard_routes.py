@@ -1,35 +1,73 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, jsonify, abort
 from flask_login import login_required
 from app.models.employees import Employees
 from app.models.customers import Customers
 from app.models.vendors import Vendors
 from app.models.inventory import Inventory
 from app import db
+from app.services import columnar, stock_valuation
+from app.services.conditional import conditional
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
 @dashboard_bp.route('/dashboard')
 @login_required
+@conditional('employees', 'vendors', 'customers', 'inventory')
 def dashboard():
     emp_count = Employees.query.count()
     vendor_count = Vendors.query.count()
     customer_count = Customers.query.count()
     inventory_count = Inventory.query.count()
 
-    total_stock_value = db.session.query(
-        db.func.sum(Inventory.quantity * Inventory.price)
-    ).scalar() or 0
-
-    active_customers = Customers.query.filter_by(status="Active").count()
-    inactive_customers = Customers.query.filter_by(status="Inactive").count()
-
     return render_template(
         'dashboard.html',
         emp_count=emp_count,
         vendor_count=vendor_count,
         customer_count=customer_count,
-        inventory_count=inventory_count,
-        total_stock_value=total_stock_value,
-        active_customers=active_customers,
-        inactive_customers=inactive_customers
+        inventory_count=inventory_count
     )
+
+
+def _customers_chart():
+    counts = columnar.run('customers', db.session, lambda cust: (
+        cust.count(cust.where(casefold=True, status='Active')),
+        cust.count(cust.where(casefold=True, status='Inactive')),
+    ))
+    if counts:
+        active_customers, inactive_customers = counts
+    else:
+        active_customers = Customers.query.filter_by(status="Active").count()
+        inactive_customers = Customers.query.filter_by(status="Inactive").count()
+    return {'labels': ['Active Customers', 'Inactive Customers'],
+            'series': [active_customers, inactive_customers]}
+
+
+def _stock_value_chart():
+    valued = stock_valuation.totals(db.session)
+    if valued is not None:
+        return {'labels': ['Total Stock Value'], 'series': [round(valued[1], 2)]}
+
+    total_stock_value = columnar.run('inventory', db.session, lambda inv: (
+        inv.stats(columnar.stock_values(inv))['sum']
+    ))
+    if total_stock_value is None:
+        total_stock_value = db.session.query(
+            db.func.sum(Inventory.quantity * Inventory.price)
+        ).scalar() or 0
+    return {'labels': ['Total Stock Value'], 'series': [int(total_stock_value)]}
+
+
+# chart name -> (tables it reads, series builder)
+DASHBOARD_CHARTS = {
+    'customers': (('customers',), _customers_chart),
+    'stock-value': (('inventory',), _stock_value_chart),
+}
+
+
+@dashboard_bp.route('/dashboard/charts/<name>')
+@login_required
+def dashboard_chart(name):
+    if name not in DASHBOARD_CHARTS:
+        abort(404)
+    tables, chart = DASHBOARD_CHARTS[name]
+    return conditional(*tables)(lambda: jsonify(chart()))()
@@ -1,16 +1,85 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort
 from flask_login import login_required
+from sqlalchemy import or_
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
 from app.models.employees import Employees
 from app import db
+from app.services import search_index, rollups, columnar, archive
+from app.services.search_index import like_pattern, LIKE_ESCAPE
+from app.services.facets import faceted_search, page_args
+from app.services.conditional import conditional
 
 employees_bp = Blueprint('employees', __name__)
 
 @employees_bp.route('/employees')
 @login_required
+@conditional('employees', 'employees_archive')
 def employees():
-    all_employees = Employees.query.all()
-    return render_template('employees.html', employees=all_employees)
+    q = request.args.get('q', '').strip()
+    include_archived = archive.include_archived(request.args)
+    if q:
+        all_employees = search_index.search_models('employees', q, db.session)
+    else:
+        all_employees = Employees.query.all()
+    archived_page, more_archived = archive.page_of(request.args), False
+    if include_archived:
+        archived, more_archived = archive.rows(db.session, Employees, 'employee_name', q, page=archived_page)
+        all_employees += archived
+    return render_template(
+        'employees.html', employees=all_employees, q=q, include_archived=include_archived,
+        archived_page=archived_page, more_archived=more_archived,
+    )
+
+
+@employees_bp.route('/employees/search')
+@login_required
+def search_employees():
+    q = request.args.get('q', '').strip()
+    hot_ids = search_index.search_ids('employees', q, db.session, limit=1000) if q else None
+    if archive.include_archived(request.args):
+        # Live and archived rows together; the name index only covers live ones
+        rows = archive.combined(
+            Employees, 'id', 'employee_name', 'department', 'status', 'joining_date', 'salary',
+        )
+        query = db.session.query(rows)
+        if q:
+            query = query.filter(or_(
+                ~rows.c.archived & rows.c.id.in_(hot_ids),
+                rows.c.archived & db.func.lower(rows.c.employee_name).like(like_pattern(q), escape=LIKE_ESCAPE),
+            ))
+        cols, extra = rows.c, (rows.c.archived,)
+    else:
+        query = db.session.query(Employees)
+        if q:
+            query = query.filter(Employees.id.in_(hot_ids))
+        cols, extra = Employees, ()
+
+    facets = {'department': cols.department, 'status': cols.status}
+    selected = {k: request.args[k] for k in facets if request.args.get(k)}
+    page, per_page = page_args(request.args)
+
+    return jsonify(faceted_search(
+        query,
+        facets,
+        selected,
+        page_columns=(
+            cols.id, cols.employee_name, cols.department,
+            cols.status, cols.joining_date, cols.salary, *extra,
+        ),
+        order_by=(cols.employee_name, cols.id),
+        serialize=lambda e: {
+            'id': e.id,
+            'employee_name': e.employee_name,
+            'department': e.department,
+            'status': e.status,
+            'joining_date': e.joining_date.isoformat(),
+            'salary': e.salary,
+            'archived': bool(getattr(e, 'archived', False)),
+        },
+        page=page,
+        per_page=per_page,
+    ))
 
 
 @employees_bp.route('/employees/add', methods=['GET', 'POST'])
@@ -40,6 +109,10 @@ def edit_employee(id):
     employee = Employees.query.get_or_404(id)
 
     if request.method == 'POST':
+        # Someone saved since this form was loaded
+        if request.form.get('version_id', type=int) not in (None, employee.version_id):
+            return render_template('edit_employee.html', employee=employee, conflict=True), 409
+
         employee.employee_name = request.form.get("employee_name")
         employee.status = request.form.get("status")
         employee.department = request.form.get("department")
@@ -49,7 +122,11 @@ def edit_employee(id):
             "%Y-%m-%d"
         ).date()
 
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return render_template('edit_employee.html', employee=employee, conflict=True), 409
         return redirect(url_for('employees.employees'))
 
     return render_template('edit_employee.html', employee=employee)
@@ -58,34 +135,48 @@ def edit_employee(id):
 @employees_bp.route('/employees/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_employee(id):
+    # Soft delete: the row moves to employees_archive and can be restored
     emp = Employees.query.get_or_404(id)
-    db.session.delete(emp)
-    db.session.commit()
+    archive.archive(db.session, emp)
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        abort(409)
     return redirect(url_for('employees.employees'))
 
 
-@employees_bp.route('/employees/analytics')
+@employees_bp.route('/employees/restore/<int:id>', methods=['POST'])
 @login_required
-def employees_analytics():
-    total = Employees.query.count()
-
-    dept_data = Employees.query.with_entities(
-        Employees.department, db.func.count()
-    ).group_by(Employees.department).all()
-
-    dept_labels = [d[0] for d in dept_data]
-    dept_counts = [d[1] for d in dept_data]
-
-    active = Employees.query.filter_by(status="Active").count()
-    inactive = Employees.query.filter_by(status="Inactive").count()
+def restore_employee(id):
+    try:
+        archive.restore(db.session, Employees, id) or abort(404)
+    except archive.RestoreConflict:
+        abort(409)
+    db.session.commit()
+    return redirect(url_for('employees.employees', include_archived=1))
 
-    month_data = db.session.query(
-        db.func.month(Employees.joining_date),
-        db.func.count()
-    ).group_by(db.func.month(Employees.joining_date)).all()
 
-    month_labels = [f"Month {m[0]}" for m in month_data]
-    month_counts = [m[1] for m in month_data]
+@employees_bp.route('/employees/analytics')
+@login_required
+@conditional('employees', 'employees_archive')
+def employees_analytics():
+    include_archived = archive.include_archived(request.args)
+    counts = columnar.run('employees', db.session, lambda emp: (
+        emp.count(),
+        emp.count(emp.where(casefold=True, status='Active')),
+        emp.count(emp.where(casefold=True, status='Inactive')),
+    ))
+    if counts:
+        total, active, inactive = counts
+    else:
+        total = Employees.query.count()
+        active = Employees.query.filter_by(status="Active").count()
+        inactive = Employees.query.filter_by(status="Inactive").count()
+    if include_archived:
+        total += archive.count(db.session, Employees)
+        active += archive.count(db.session, Employees, status="Active")
+        inactive += archive.count(db.session, Employees, status="Inactive")
 
     latest = Employees.query.order_by(Employees.id.desc()).limit(10).all()
 
@@ -94,9 +185,39 @@ def employees_analytics():
         total=total,
         active=active,
         inactive=inactive,
-        dept_labels=dept_labels,
-        dept_counts=dept_counts,
-        month_labels=month_labels,
-        month_counts=month_counts,
-        latest=latest
+        latest=latest,
+        include_archived=include_archived,
     )
+
+
+def _department_chart(include_archived):
+    dept_data = columnar.run('employees', db.session, lambda emp: emp.group_count('department'))
+    if dept_data is None:
+        dept_data = Employees.query.with_entities(
+            Employees.department, db.func.count()
+        ).group_by(Employees.department).all()
+    if include_archived:
+        dept_data = archive.merge_counts(dept_data, archive.group_count(db.session, Employees, 'department'))
+    return {'labels': [d[0] for d in dept_data], 'series': [d[1] for d in dept_data]}
+
+
+def _monthly_chart(include_archived):
+    if include_archived:
+        return rollups.series(db.session, 'employees_hired', 'employees_hired_archived')
+    return rollups.series(db.session, 'employees_hired')
+
+
+EMPLOYEE_CHARTS = {
+    'departments': _department_chart,
+    'monthly': _monthly_chart,
+}
+
+
+@employees_bp.route('/employees/analytics/charts/<name>')
+@login_required
+@conditional('employees', 'employees_archive')
+def employees_chart(name):
+    chart = EMPLOYEE_CHARTS.get(name)
+    if chart is None:
+        abort(404)
+    return jsonify(chart(archive.include_archived(request.args)))
@@ -1,17 +1,275 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort
 from flask_login import login_required
+from sqlalchemy.orm.exc import StaleDataError
 from app.models.inventory import Inventory
+from app.models.mixins import utcnow
+from app.models.stock import StockMovements
 from app import db
+from app.services import search_index, rollups, stock_ledger, stock_alerts, stock_valuation, columnar
+from app.services.facets import faceted_search, page_args
+from app.services.conditional import conditional
 
 inventory_bp = Blueprint('inventory', __name__)
 
+# Stock band facet: out / low (at or below the item's reorder level) / medium / high
+STOCK_BAND = db.case(
+    (Inventory.quantity <= 0, 'out'),
+    (Inventory.quantity <= db.func.coalesce(Inventory.reorder_level, stock_alerts.DEFAULT_REORDER_LEVEL), 'low'),
+    (Inventory.quantity < 100, 'medium'),
+    else_='high',
+)
+
 @inventory_bp.route('/inventory')
 @login_required
+@conditional('inventory')
 def inventory():
     all_inventory = Inventory.query.all()
     return render_template('inventory.html', inventory=all_inventory)
 
 
+@inventory_bp.route('/inventory/search')
+@login_required
+def search_inventory():
+    query = db.session.query(Inventory)
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(Inventory.id.in_(search_index.search_ids('inventory', q, db.session, limit=1000)))
+
+    facets = {'unit': Inventory.unit, 'stock_band': STOCK_BAND}
+    selected = {k: request.args[k] for k in facets if request.args.get(k)}
+    page, per_page = page_args(request.args)
+
+    return jsonify(faceted_search(
+        query,
+        facets,
+        selected,
+        page_columns=(
+            Inventory.id, Inventory.item_name, Inventory.quantity,
+            Inventory.price, Inventory.unit, STOCK_BAND.label('stock_band'),
+        ),
+        order_by=(Inventory.item_name, Inventory.id),
+        serialize=lambda i: {
+            'id': i.id,
+            'item_name': i.item_name,
+            'quantity': i.quantity,
+            'price': i.price,
+            'unit': i.unit,
+            'stock_band': i.stock_band,
+        },
+        page=page,
+        per_page=per_page,
+    ))
+
+
+@inventory_bp.route('/inventory/movements')
+@login_required
+@conditional('inventory')
+def stock_movements():
+    """Ledger entries, newest first (keyset-paged with ``before_id``), with per-kind totals."""
+    try:
+        start = stock_ledger.parse_instant(request.args.get('start'))
+        end = stock_ledger.parse_instant(request.args.get('end'))
+        item_id = request.args.get('item_id', type=int)
+        before_id = request.args.get('before_id', type=int)
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO dates'}), 400
+    kind = request.args.get('kind')
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+
+    query = db.session.query(StockMovements)
+    if item_id is not None:
+        query = query.filter(StockMovements.item_id == item_id)
+    if kind:
+        query = query.filter(StockMovements.kind == kind)
+    if start:
+        query = query.filter(StockMovements.created_at >= start)
+    if end:
+        query = query.filter(StockMovements.created_at <= end)
+
+    totals = query.with_entities(
+        StockMovements.kind, db.func.count(), db.func.sum(StockMovements.quantity_delta)
+    ).group_by(StockMovements.kind).all()
+
+    page = query
+    if before_id is not None:
+        page = page.filter(StockMovements.id < before_id)
+    rows = page.order_by(StockMovements.id.desc()).limit(limit).all()
+
+    return jsonify({
+        'items': [{
+            'id': m.id,
+            'item_id': m.item_id,
+            'kind': m.kind,
+            'quantity_delta': m.quantity_delta,
+            'unit_price': m.unit_price,
+            'note': m.note,
+            'created_at': m.created_at.isoformat(),
+        } for m in rows],
+        'totals': {k: {'movements': n, 'quantity': int(q or 0)} for k, n, q in totals},
+        'next_before_id': rows[-1].id if len(rows) == limit else None,
+    })
+
+
+@inventory_bp.route('/inventory/stock-value')
+@login_required
+@conditional('inventory')
+def stock_value():
+    """Stock quantity and value as of ``as_of`` (default: now), from the nearest snapshot plus later movements."""
+    try:
+        as_of = stock_ledger.parse_instant(request.args.get('as_of'), default=utcnow())
+    except ValueError:
+        return jsonify({'error': 'as_of must be an ISO date'}), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 0), 1000)
+
+    stock, snapshot = stock_ledger.stock_as_of(db.session, as_of)
+    lines = sorted(
+        ((item_id, quantity, price, quantity * (price or 0))
+         for item_id, (quantity, price) in stock.items() if quantity),
+        key=lambda line: -line[3],
+    )
+    names = dict(
+        db.session.query(Inventory.id, Inventory.item_name)
+        .filter(Inventory.id.in_([line[0] for line in lines[:limit]]))
+    ) if limit else {}
+
+    return jsonify({
+        'as_of': as_of.isoformat(),
+        'snapshot': snapshot.isoformat() if snapshot else None,
+        'item_count': len(lines),
+        'total_quantity': sum(line[1] for line in lines),
+        'total_value': sum(line[3] for line in lines),
+        'items': [{
+            'item_id': item_id,
+            'item_name': names.get(item_id),
+            'quantity': quantity,
+            'unit_price': price,
+            'value': value,
+        } for item_id, quantity, price, value in lines[:limit]],
+    })
+
+
+@inventory_bp.route('/inventory/valuation')
+@login_required
+@conditional('inventory')
+def valuation():
+    """Stock at moving weighted-average cost: running totals plus the highest-value items."""
+    totals = stock_valuation.totals(db.session)
+    if totals is None:
+        return jsonify({'error': 'valuation not initialised; run `flask erp rebuild-stock-valuation`'}), 503
+    limit = min(max(request.args.get('limit', 50, type=int), 0), 1000)
+
+    quantity, value = totals
+    return jsonify({
+        'total_quantity': quantity,
+        'total_value': value,
+        'items': [{
+            'item_id': item_id,
+            'item_name': item_name,
+            'quantity': item_quantity,
+            'value': round(item_value, 2),
+            'average_cost': round(item_value / item_quantity, 4),
+        } for item_id, item_name, item_quantity, item_value in stock_valuation.top_items(db.session, limit)],
+    })
+
+
+@inventory_bp.route('/inventory/<int:id>/valuation')
+@login_required
+@conditional('inventory')
+def item_valuation(id):
+    found = stock_valuation.item_valuation(db.session, id)
+    if found is None:
+        abort(404)
+    return jsonify({'item_id': id, **found})
+
+
+@inventory_bp.route('/inventory/<int:id>/adjust', methods=['POST'])
+@login_required
+def adjust_stock(id):
+    """Receive or issue stock: ``{"delta": 5, "kind": "receipt", "unit_cost": 12, "note": "..."}``."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        delta = int(data.get('delta'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'delta must be an integer'}), 400
+    if delta == 0:
+        return jsonify({'error': 'delta must not be zero'}), 400
+
+    kind = data.get('kind') or ('receipt' if delta > 0 else 'issue')
+    if kind not in ('receipt', 'issue', 'adjustment') \
+            or (kind == 'receipt' and delta < 0) or (kind == 'issue' and delta > 0):
+        return jsonify({'error': 'kind must be receipt (delta > 0), issue (delta < 0) or adjustment'}), 400
+
+    unit_cost = data.get('unit_cost')
+    if unit_cost not in (None, ''):
+        try:
+            unit_cost = int(unit_cost)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'unit_cost must be an integer'}), 400
+        if unit_cost < 0 or delta < 0:
+            return jsonify({'error': 'unit_cost applies to receipts and must not be negative'}), 400
+    else:
+        unit_cost = None
+
+    try:
+        result = stock_ledger.apply_delta(db.session, id, delta, kind, data.get('note'), unit_cost=unit_cost)
+    except stock_ledger.InsufficientStock:
+        db.session.rollback()
+        return jsonify({'error': 'insufficient stock'}), 409
+    if result is None:
+        abort(404)
+    db.session.commit()
+
+    quantity, version_id = result
+    return jsonify({'id': id, 'quantity': quantity, 'version_id': version_id, 'kind': kind, 'delta': delta})
+
+
+@inventory_bp.route('/inventory/low-stock')
+@login_required
+@conditional('inventory')
+def low_stock():
+    """Items at or below their reorder level, read from the maintained alert set."""
+    level = request.args.get('level')
+    if level not in (None, 'low', 'out'):
+        return jsonify({'error': 'level must be low or out'}), 400
+    limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+
+    return jsonify({
+        'counts': stock_alerts.counts(db.session),
+        'items': [{
+            'item_id': a.item_id,
+            'item_name': a.item_name,
+            'level': a.level,
+            'quantity': a.quantity,
+            'reorder_level': a.reorder_level,
+            'shortfall': a.reorder_level - a.quantity,
+            'since': a.raised_at.isoformat(),
+        } for a in stock_alerts.low_stock(db.session, level=level, limit=limit)],
+    })
+
+
+@inventory_bp.route('/inventory/alerts')
+@login_required
+@conditional('inventory')
+def stock_alert_feed():
+    """Alert transitions after ``since_id``, oldest first; poll with the returned ``last_id``."""
+    since_id = request.args.get('since_id', 0, type=int)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    events = stock_alerts.feed(db.session, since_id=since_id, limit=limit)
+
+    return jsonify({
+        'events': [{
+            'id': e.id,
+            'item_id': e.item_id,
+            'event': e.event,
+            'level': e.level,
+            'quantity': e.quantity,
+            'reorder_level': e.reorder_level,
+            'created_at': e.created_at.isoformat(),
+        } for e in events],
+        'last_id': events[-1].id if events else since_id,
+    })
+
+
 @inventory_bp.route('/inventory/add', methods=['GET', 'POST'])
 @login_required
 def add_inventory():
@@ -20,7 +278,8 @@ def add_inventory():
             item_name=request.form.get("item_name"),
             quantity=request.form.get("quantity"),
             price=request.form.get("price"),
-            unit=request.form.get("unit")
+            unit=request.form.get("unit"),
+            reorder_level=request.form.get("reorder_level") or None
         )
         db.session.add(item)
         db.session.commit()
@@ -35,11 +294,20 @@ def edit_inventory(id):
     item = Inventory.query.get_or_404(id)
 
     if request.method == 'POST':
+        # Someone saved since this form was loaded
+        if request.form.get('version_id', type=int) not in (None, item.version_id):
+            return render_template('edit_inventory.html', item=item, conflict=True), 409
+
         item.item_name = request.form.get("item_name")
         item.quantity = request.form.get("quantity")
         item.price = request.form.get("price")
         item.unit = request.form.get("unit")
-        db.session.commit()
+        item.reorder_level = request.form.get("reorder_level") or None
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return render_template('edit_inventory.html', item=item, conflict=True), 409
         return redirect(url_for('inventory.inventory'))
 
     return render_template('edit_inventory.html', item=item)
@@ -56,37 +324,71 @@ def delete_inventory(id):
 
 @inventory_bp.route('/inventory/analytics')
 @login_required
+@conditional('inventory')
 def inventory_analytics():
+    valued = stock_valuation.totals(db.session)
+    if valued is not None:
+        # Weighted-average cost, maintained per movement
+        total_items = Inventory.query.count()
+        total_value = valued[1]
+    else:
+        totals = columnar.run('inventory', db.session, lambda inv: (
+            inv.count(), int(inv.stats(columnar.stock_values(inv))['sum'])
+        ))
+        if totals:
+            total_items, total_value = totals
+        else:
+            total_items, total_value = db.session.query(
+                db.func.count(Inventory.id),
+                db.func.sum(Inventory.quantity * Inventory.price),
+            ).one()
+
+    return render_template(
+        'inventory_analytics.html',
+        total_items=total_items,
+        total_value=total_value or 0,
+        out_of_stock=stock_alerts.counts(db.session)['out']
+    )
+
+
+def _low_stock_chart():
+    low_stock = stock_alerts.low_stock(db.session)
+    return {'labels': [i.item_name for i in low_stock], 'series': [i.quantity for i in low_stock]}
+
+
+def _top_value_chart():
+    top = columnar.run('inventory', db.session, lambda inv: columnar.top_labelled(
+        inv, db.session, columnar.stock_values(inv), 10
+    ))
+    if top is None:
+        value = Inventory.quantity * Inventory.price
+        top = db.session.query(Inventory.item_name, value).order_by(value.desc()).limit(10).all()
+    return {'labels': [t[0] for t in top], 'series': [t[1] for t in top]}
+
+
+def _stock_status_chart():
     total_items = Inventory.query.count()
+    out_of_stock = stock_alerts.counts(db.session)['out']
+    return {'labels': ['Out of Stock', 'In Stock'], 'series': [out_of_stock, total_items - out_of_stock]}
 
-    total_value = db.session.query(
-        db.func.sum(Inventory.quantity * Inventory.price)
-    ).scalar() or 0
 
-    low_stock = Inventory.query.filter(Inventory.quantity < 20).all()
-    low_labels = [i.item_name for i in low_stock]
-    low_values = [i.quantity for i in low_stock]
+def _monthly_chart():
+    return rollups.series(db.session, 'inventory_created')
 
-    top = Inventory.query.order_by(
-        (Inventory.quantity * Inventory.price).desc()
-    ).limit(10).all()
 
-    top_labels = [i.item_name for i in top]
-    top_values = [(i.quantity * i.price) for i in top]
+INVENTORY_CHARTS = {
+    'low-stock': _low_stock_chart,
+    'top-value': _top_value_chart,
+    'stock-status': _stock_status_chart,
+    'monthly': _monthly_chart,
+}
 
-    out_of_stock = Inventory.query.filter(Inventory.quantity == 0).count()
-    in_stock = total_items - out_of_stock
 
-    return render_template(
-        'inventory_analytics.html',
-        total_items=total_items,
-        total_value=total_value,
-        low_labels=low_labels,
-        low_values=low_values,
-        top_labels=top_labels,
-        top_values=top_values,
-        out_of_stock=out_of_stock,
-        in_stock=in_stock,
-        month_labels=[],
-        month_counts=[]
-    )
+@inventory_bp.route('/inventory/analytics/charts/<name>')
+@login_required
+@conditional('inventory')
+def inventory_chart(name):
+    chart = INVENTORY_CHARTS.get(name)
+    if chart is None:
+        abort(404)
+    return jsonify(chart())
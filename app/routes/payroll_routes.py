@@ -0,0 +1,125 @@
+from flask import Blueprint, request, jsonify, abort, current_app
+from flask_login import login_required
+from sqlalchemy.exc import IntegrityError
+from app.models.mixins import utcnow
+from app.models.payroll import PayrollRuns, PayrollLines, PayrollDepartmentTotals
+from app import db
+from app.services import payroll, lookups
+from app.services.facets import page_args
+from app.services.conditional import conditional
+
+payroll_bp = Blueprint('payroll', __name__)
+
+
+def _amounts(row):
+    return {a: getattr(row, a) for a in payroll.AMOUNTS}
+
+
+def _run_json(run):
+    return {
+        'id': run.id,
+        'period': run.period,
+        'salary_basis': run.salary_basis,
+        'employee_count': run.employee_count,
+        **_amounts(run),
+        'duration_ms': run.duration_ms,
+        'created_at': run.created_at.isoformat(),
+    }
+
+
+def _line_json(line):
+    return {
+        'employee_id': line.employee_id,
+        'employee_name': line.employee_name,
+        'department': line.department,
+        'days_paid': line.days_paid,
+        **_amounts(line),
+    }
+
+
+@payroll_bp.route('/payroll/runs', methods=['POST'])
+@login_required
+def create_payroll_run():
+    """Run payroll for a month: ``{"period": "2025-09", "replace": false}``."""
+    data = request.get_json(silent=True) or request.form
+    period = data.get('period') or utcnow().strftime('%Y-%m')
+    replace = str(data.get('replace', '')).lower() in ('1', 'true', 'yes')
+    try:
+        payroll.parse_period(period)
+    except ValueError:
+        return jsonify({'error': 'period must be YYYY-MM'}), 400
+
+    basis = current_app.config.get('PAYROLL_SALARY_BASIS', 'annual')
+    try:
+        run = payroll.run_payroll(db.session, period, salary_basis=basis, replace=replace)
+        db.session.commit()
+    except (payroll.PayrollExists, IntegrityError):
+        db.session.rollback()
+        return jsonify({'error': f'payroll for {period} already exists (pass replace=true to redo it)'}), 409
+    return jsonify(_run_json(run)), 201
+
+
+@payroll_bp.route('/payroll/runs')
+@login_required
+@conditional('payroll_runs')
+def payroll_runs():
+    runs = PayrollRuns.query.order_by(PayrollRuns.period.desc()).all()
+    return jsonify({'runs': [_run_json(r) for r in runs]})
+
+
+@payroll_bp.route('/payroll/runs/<int:run_id>')
+@login_required
+@conditional('payroll_runs')
+def payroll_run(run_id):
+    """Run totals and its stored per-department totals."""
+    run = db.session.get(PayrollRuns, run_id) or abort(404)
+    departments = (
+        PayrollDepartmentTotals.query
+        .filter_by(run_id=run_id)
+        .order_by(PayrollDepartmentTotals.department)
+        .all()
+    )
+    return jsonify({
+        **_run_json(run),
+        'departments': [{
+            'department': d.department,
+            'employee_count': d.employee_count,
+            **_amounts(d),
+        } for d in departments],
+    })
+
+
+@payroll_bp.route('/payroll/runs/<int:run_id>/lines')
+@login_required
+@conditional('payroll_runs')
+def payroll_run_lines(run_id):
+    """One page of a run's employee lines, optionally for one department."""
+    db.session.get(PayrollRuns, run_id) or abort(404)
+    page, per_page = page_args(request.args, max_per_page=500)
+
+    query = PayrollLines.query.filter_by(run_id=run_id)
+    department = request.args.get('department')
+    if department:
+        # Lines keep the department's lookup name (as Employees reads it), so
+        # "eng" / "ENG " match the same lines as the other department filters
+        query = query.filter_by(department=lookups.display('department', department))
+    lines = (
+        query.order_by(PayrollLines.employee_id)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+        .all()
+    )
+    return jsonify({
+        'page': page,
+        'per_page': per_page,
+        'items': [_line_json(line) for line in lines],
+    })
+
+
+@payroll_bp.route('/payroll/runs/<int:run_id>/employees/<int:employee_id>')
+@login_required
+@conditional('payroll_runs')
+def payslip(run_id, employee_id):
+    line = db.session.get(PayrollLines, (run_id, employee_id)) or abort(404)
+    run = db.session.get(PayrollRuns, run_id)
+    return jsonify({'period': run.period, **_line_json(line)})
@@ -1,15 +1,57 @@
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort
 from flask_login import login_required
+from sqlalchemy.orm.exc import StaleDataError
 from app.models.vendors import Vendors
 from app import db
+from app.services import search_index, rollups, columnar
+from app.services.facets import faceted_search, page_args
+from app.services.conditional import conditional
 
 vendors_bp = Blueprint('vendors', __name__)
 
 @vendors_bp.route('/vendors')
 @login_required
+@conditional('vendors')
 def vendors():
-    all_vendors = Vendors.query.all()
-    return render_template('vendors.html', vendors=all_vendors)
+    q = request.args.get('q', '').strip()
+    if q:
+        all_vendors = search_index.search_models('vendors', q, db.session)
+    else:
+        all_vendors = Vendors.query.all()
+    return render_template('vendors.html', vendors=all_vendors, q=q)
+
+
+@vendors_bp.route('/vendors/search')
+@login_required
+def search_vendors():
+    query = db.session.query(Vendors)
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(Vendors.id.in_(search_index.search_ids('vendors', q, db.session, limit=1000)))
+
+    facets = {'category': Vendors.category}
+    selected = {k: request.args[k] for k in facets if request.args.get(k)}
+    page, per_page = page_args(request.args)
+
+    return jsonify(faceted_search(
+        query,
+        facets,
+        selected,
+        page_columns=(
+            Vendors.id, Vendors.vendor_name, Vendors.contact_person,
+            Vendors.phone, Vendors.category,
+        ),
+        order_by=(Vendors.vendor_name, Vendors.id),
+        serialize=lambda v: {
+            'id': v.id,
+            'vendor_name': v.vendor_name,
+            'contact_person': v.contact_person,
+            'phone': v.phone,
+            'category': v.category,
+        },
+        page=page,
+        per_page=per_page,
+    ))
 
 
 @vendors_bp.route('/vendors/add', methods=['GET', 'POST'])
@@ -35,11 +77,19 @@ def edit_vendor(id):
     vendor = Vendors.query.get_or_404(id)
 
     if request.method == 'POST':
+        # Someone saved since this form was loaded
+        if request.form.get('version_id', type=int) not in (None, vendor.version_id):
+            return render_template('edit_vendor.html', vendor=vendor, conflict=True), 409
+
         vendor.vendor_name = request.form.get("name")
         vendor.contact_person = request.form.get("contact_person")
         vendor.phone = request.form.get("phone")
         vendor.category = request.form.get("category")
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return render_template('edit_vendor.html', vendor=vendor, conflict=True), 409
         return redirect(url_for('vendors.vendors'))
 
     return render_template('edit_vendor.html', vendor=vendor)
@@ -56,32 +106,57 @@ def delete_vendor(id):
 
 @vendors_bp.route('/vendors/analytics')
 @login_required
+@conditional('vendors')
 def vendors_analytics():
     total_vendors = Vendors.query.count()
 
-    cat_data = Vendors.query.with_entities(
-        Vendors.category, db.func.count()
-    ).group_by(Vendors.category).all()
-
-    cat_labels = [c[0] for c in cat_data]
-    cat_counts = [c[1] for c in cat_data]
-
     missing_phone = Vendors.query.filter(
         (Vendors.phone == None) | (Vendors.phone == "")
     ).count()
 
-    with_phone = total_vendors - missing_phone
-
     latest = Vendors.query.order_by(Vendors.id.desc()).limit(10).all()
 
     return render_template(
         'vendors_analytics.html',
         total_vendors=total_vendors,
-        cat_labels=cat_labels,
-        cat_counts=cat_counts,
         missing_phone=missing_phone,
-        with_phone=with_phone,
-        latest=latest,
-        month_labels=[],
-        month_counts=[]
+        latest=latest
     )
+
+
+def _category_chart():
+    cat_data = columnar.run('vendors', db.session, lambda ven: ven.group_count('category'))
+    if cat_data is None:
+        cat_data = Vendors.query.with_entities(
+            Vendors.category, db.func.count()
+        ).group_by(Vendors.category).all()
+    return {'labels': [c[0] for c in cat_data], 'series': [c[1] for c in cat_data]}
+
+
+def _phone_chart():
+    total_vendors = Vendors.query.count()
+    missing_phone = Vendors.query.filter(
+        (Vendors.phone == None) | (Vendors.phone == "")
+    ).count()
+    return {'labels': ['Missing Phone', 'With Phone'], 'series': [missing_phone, total_vendors - missing_phone]}
+
+
+def _monthly_chart():
+    return rollups.series(db.session, 'vendors_created')
+
+
+VENDOR_CHARTS = {
+    'categories': _category_chart,
+    'phone': _phone_chart,
+    'monthly': _monthly_chart,
+}
+
+
+@vendors_bp.route('/vendors/analytics/charts/<name>')
+@login_required
+@conditional('vendors')
+def vendors_chart(name):
+    chart = VENDOR_CHARTS.get(name)
+    if chart is None:
+        abort(404)
+    return jsonify(chart())
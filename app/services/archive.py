@@ -0,0 +1,178 @@
+"""
+Hot/cold split for customers and employees.
+
+Customers marked Inactive and employees who are no longer Active move out
+of the live tables into customers_archive / employees_archive. The archive
+rows keep the same ids and columns, plus archived_at and archive_reason.
+Everything that reads the live tables therefore only touches the working
+set: list pages, counts, name search, chatbot tools, payroll and the
+columnar snapshots. List and analytics pages read the archive as well
+when asked (``?include_archived=1``). Monthly rollups count archived rows
+under their own ``*_archived`` metrics, added in on the same opt-in.
+
+Rows move through the ORM: the archive row is added and the live row
+deleted in one flush. Every write-time hook (search index, rollups,
+columnar snapshots, table versions) sees an ordinary delete or insert.
+- The delete_* routes archive the row (reason "deleted") instead of
+  deleting it.
+- ``flask erp archive-inactive`` moves rows that have been inactive and
+  untouched for ARCHIVE_AFTER_DAYS (reason "inactive").
+- ``restore()`` moves a row back under its original id.
+"""
+from collections import Counter
+
+from sqlalchemy import Integer, func, literal, or_, select, type_coerce, union_all, inspect as sa_inspect
+
+from app.models.mixins import utcnow
+from app.services import lookups
+from app.services.search_index import like_pattern, LIKE_ESCAPE
+
+DELETED = "deleted"
+INACTIVE = "inactive"
+PAGE_SIZE = 100             # archived rows shown per list page
+
+
+class RestoreConflict(Exception):
+    """A live row already has the archived row's id."""
+
+
+class UnknownStatus(Exception):
+    """A status the archive rule depends on has no lookup code yet."""
+
+
+_archives = {}      # live model -> archive model
+_inactive = {}      # live model -> (status value, True: rows with it are inactive / False: rows without)
+
+
+def register(model, archive_model, status, inactive_when_equal):
+    _archives[model] = archive_model
+    _inactive[model] = (status, inactive_when_equal)
+
+
+def _inactive_rule(model):
+    """Criterion for rows no longer in use, on the status lookup code.
+
+    Raises UnknownStatus when the status has no code: "!= Active" would
+    otherwise match every row.
+    """
+    status, when_equal = _inactive[model]
+    column = model.status.property.columns[0]
+    status_code = lookups.code(column.type.kind, status)
+    if status_code == lookups.UNKNOWN:
+        raise UnknownStatus(f"{model.__tablename__}: no lookup code for status {status!r}")
+    coded = type_coerce(model.status, Integer)
+    return coded == status_code if when_equal else coded != status_code
+
+
+def include_archived(args):
+    """The ``include_archived`` opt-in from a query string."""
+    return str(args.get("include_archived", "")).lower() in ("1", "true", "yes", "on")
+
+
+def page_of(args):
+    """The ``archived_page`` number from a query string (1 if missing or bad)."""
+    try:
+        return max(1, int(args.get("archived_page", 1)))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _copy(obj, target):
+    """Column values of ``obj`` that ``target`` also has."""
+    keys = {prop.key for prop in sa_inspect(obj).mapper.column_attrs}
+    return {
+        prop.key: getattr(obj, prop.key)
+        for prop in sa_inspect(target).column_attrs
+        if prop.key in keys
+    }
+
+
+# ---------------- moving rows ----------------
+
+def archive(session, obj, reason=DELETED):
+    """Move live ``obj`` to its archive table; the caller commits."""
+    archive_model = _archives[type(obj)]
+    row = archive_model(**_copy(obj, archive_model), archived_at=utcnow(), archive_reason=reason)
+    session.delete(obj)
+    session.add(row)
+    return row
+
+
+def restore(session, model, row_id):
+    """Move an archived row back to ``model``; None if it isn't archived."""
+    row = session.get(_archives[model], row_id)
+    if row is None:
+        return None
+    if session.get(model, row_id) is not None:
+        raise RestoreConflict(row_id)
+    obj = model(**_copy(row, model))
+    # Restored rows count as touched, so the next archive run leaves them
+    obj.updated_at = utcnow()
+    session.delete(row)
+    session.add(obj)
+    return obj
+
+
+def stale_ids(session, model, cutoff, limit):
+    """Ids of live rows that are inactive and untouched since ``cutoff``
+    (raises UnknownStatus if the rule's status can't be resolved)."""
+    return [
+        row_id for row_id, in session.query(model.id)
+        .filter(_inactive_rule(model), or_(model.updated_at < cutoff, model.updated_at.is_(None)))
+        .order_by(model.id)
+        .limit(limit)
+    ]
+
+
+# ---------------- reading the archive ----------------
+
+def rows(session, model, name_column, name_contains=None, page=1, per_page=PAGE_SIZE):
+    """One page of archived rows, most recently archived first, and whether
+    there are more: ``(rows, has_more)``."""
+    archive_model = _archives[model]
+    query = session.query(archive_model)
+    if name_contains:
+        column = getattr(archive_model, name_column)
+        query = query.filter(func.lower(column).like(like_pattern(name_contains), escape=LIKE_ESCAPE))
+    found = (
+        query.order_by(archive_model.archived_at.desc(), archive_model.id)
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    return found[:per_page], len(found) > per_page
+
+
+def count(session, model, **filters):
+    return session.query(func.count()).select_from(_archives[model]).filter_by(**filters).scalar()
+
+
+def group_count(session, model, attr):
+    column = getattr(_archives[model], attr)
+    return session.query(column, func.count()).group_by(column).all()
+
+
+def merge_counts(*groups):
+    """Add up ``[(value, count)]`` lists, largest first."""
+    total = Counter()
+    for group in groups:
+        for value, n in group:
+            total[value] += int(n)
+    return total.most_common()
+
+
+def combined(model, *attrs):
+    """Live and archived rows as one subquery: ``attrs`` plus ``archived``."""
+    archive_model = _archives[model]
+    live = select(*[getattr(model, a).label(a) for a in attrs], literal(False).label("archived"))
+    cold = select(*[getattr(archive_model, a).label(a) for a in attrs], literal(True).label("archived"))
+    return union_all(live, cold).subquery()
+
+
+def init_app(db):
+    from app.models.customers import Customers
+    from app.models.employees import Employees
+    from app.models.archive import CustomersArchive, EmployeesArchive
+
+    register(Customers, CustomersArchive, "Inactive", inactive_when_equal=True)
+    register(Employees, EmployeesArchive, "Active", inactive_when_equal=False)
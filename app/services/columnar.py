@@ -0,0 +1,487 @@
+"""
+Columnar in-memory analytics snapshot (opt-in: ANALYTICS_ENGINE=columnar).
+
+Each registered table is held as NumPy arrays, one per column, aligned on
+a sorted array of row ids: numbers as float64 (NaN for NULL), dates as
+datetime64[D] (NaT), and low-cardinality strings (department, status,
+category, unit, ...) dictionary-encoded as int32 codes into a short
+category list (-1 for NULL). Group-bys are a bincount or one sort over
+the codes, percentiles and top-N a single partition of one column, so
+they cost microseconds to milliseconds rather than a table scan each.
+
+A snapshot is built lazily by one projected query and then patched from
+ORM commits made in this process (rows keyed by id; version_id decides
+between racing commits). Every read compares the snapshot with the
+shared table_versions counter. If another process, or a bulk statement
+flagged with data_version.mark_changed, wrote since, the table is
+rebuilt, at most once per ``refresh_seconds``; until then ``read()``
+yields None and callers answer from SQL. Answers are never staler than
+the database, so they are safe behind @conditional's ETags.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, select
+
+from app.services import data_version, lookups
+
+_PENDING_KEY = "columnar_pending"
+_BULK_KEY = "columnar_bulk"
+_NAT = np.datetime64("NaT", "D")
+_SCAN_GROUPS = 32
+
+
+def _number(value):
+    return np.nan if value in (None, "") else float(value)
+
+
+def _day(value):
+    return _NAT if value in (None, "") else np.datetime64(value, "D")
+
+
+class ColumnarTable:
+    def __init__(self, model, numeric=(), categorical=(), dates=(), label=None, refresh_seconds=5):
+        from sqlalchemy import Integer
+        from app.models.lookups import Lookup
+        self.model = model
+        self.name = model.__tablename__
+        self.numeric = tuple(numeric)
+        self.categorical = tuple(categorical)
+        self.dates = tuple(dates)
+        self.label = label
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+
+        self.ids = None            # sorted int64 row ids
+        self.columns = {}          # name -> array (int32 codes for categorical columns)
+        self.categories = {}       # name -> [value], indexed by code
+        self._codes = {}           # name -> {value: code}
+        self._integers = {         # numeric columns decoded back to int
+            name for name in self.numeric
+            if isinstance(getattr(model, name).property.columns[0].type, Integer)
+        }
+        self._lookup_kinds = {     # categorical Lookup columns -> lookup kind
+            name: column.type.kind for name in self.categorical
+            for column in [getattr(model, name).property.columns[0]]
+            if isinstance(column.type, Lookup)
+        }
+        self._row_versions = None  # version_id per row
+        self._version = None       # table_versions.version the arrays reflect
+        self._built_at = None
+
+    @property
+    def column_names(self):
+        return (*self.numeric, *self.categorical, *self.dates)
+
+    # ---------------- maintenance ----------------
+
+    def rebuild(self, session):
+        # Version first: a write landing in between makes it look older
+        # than the rows, which only costs an extra rebuild
+        version = data_version.shared_versions(session, self.name)[self.name][0]
+        model = self.model
+        rows = session.execute(
+            select(model.id, model.version_id, *[getattr(model, n) for n in self.column_names])
+            .order_by(model.id)
+        ).all()
+        values = list(zip(*rows)) if rows else [()] * (len(self.column_names) + 2)
+
+        columns, categories, codes = {}, {}, {}
+        for name, column in zip(self.column_names, values[2:]):
+            if name in self.numeric:
+                columns[name] = np.array(column, dtype=np.float64)
+            elif name in self.dates:
+                columns[name] = np.array(column, dtype="datetime64[D]")
+            else:
+                encoded, uniques = pd.factorize(np.array(column, dtype=object))
+                columns[name] = encoded.astype(np.int32)
+                categories[name] = list(uniques)
+                codes[name] = {value: code for code, value in enumerate(uniques)}
+
+        with self._lock:
+            self.ids = np.array(values[0], dtype=np.int64)
+            self._row_versions = np.array(values[1], dtype=np.int64)
+            self.columns, self.categories, self._codes = columns, categories, codes
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def current(self, session):
+        """True if the arrays match the database, rebuilding them when allowed."""
+        shared = data_version.shared_versions(session, self.name)[self.name][0]
+        with self._build_lock:
+            with self._lock:
+                if self.ids is not None and self._version == shared:
+                    return True
+                due = (
+                    self._built_at is None
+                    or time.monotonic() - self._built_at >= self.refresh_seconds
+                )
+            if not due:
+                return False
+            self.rebuild(session)
+            return True
+
+    def values_of(self, obj):
+        """Row values as a rebuild would read them: Lookup columns by their
+        stored name, so "ENG " lands in the same category as "Eng"."""
+        values = []
+        for name in self.column_names:
+            value = getattr(obj, name)
+            kind = self._lookup_kinds.get(name)
+            values.append(value if kind is None or value is None else lookups.display(kind, value))
+        return tuple(values)
+
+    def _encode(self, name, value):
+        if name in self.numeric:
+            return _number(value)
+        if name in self.dates:
+            return _day(value)
+        if value is None:
+            return -1
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.categories[name])
+            self.categories[name].append(value)
+        return code
+
+    def _take(self, index):
+        self.ids = self.ids[index]
+        self._row_versions = self._row_versions[index]
+        for name in self.column_names:
+            self.columns[name] = self.columns[name][index]
+
+    def apply(self, upserts, deletes, bulk=False):
+        """
+        Patch one committed transaction in. ``upserts`` is
+        ``{id: (version_id, values)}``, ``deletes`` a set of ids. ``bulk``
+        means the transaction also wrote rows the ORM didn't see, so the
+        snapshot can no longer vouch for itself.
+        """
+        with self._lock:
+            if self.ids is None:
+                return
+            if deletes:
+                self._take(~np.isin(self.ids, np.fromiter(deletes, dtype=np.int64)))
+
+            added = []
+            if upserts:
+                ids = np.fromiter(upserts, dtype=np.int64, count=len(upserts))
+                pos = np.searchsorted(self.ids, ids)
+                found = pos < len(self.ids)
+                found[found] = self.ids[pos[found]] == ids[found]
+                for row_id, at, exists in zip(ids.tolist(), pos.tolist(), found.tolist()):
+                    version_id, values = upserts[row_id]
+                    if not exists:
+                        added.append((row_id, version_id, values))
+                    elif version_id >= self._row_versions[at]:
+                        self._row_versions[at] = version_id
+                        for name, value in zip(self.column_names, values):
+                            self.columns[name][at] = self._encode(name, value)
+
+            if added:
+                added.sort()
+                tail_ids = np.array([row_id for row_id, _, _ in added], dtype=np.int64)
+                in_order = not len(self.ids) or tail_ids[0] > self.ids[-1]
+                self.ids = np.concatenate([self.ids, tail_ids])
+                self._row_versions = np.concatenate([
+                    self._row_versions, np.array([v for _, v, _ in added], dtype=np.int64)
+                ])
+                for i, name in enumerate(self.column_names):
+                    column = self.columns[name]
+                    tail = np.array([self._encode(name, values[i]) for _, _, values in added],
+                                    dtype=column.dtype)
+                    self.columns[name] = np.concatenate([column, tail])
+                if not in_order:
+                    self._take(np.argsort(self.ids, kind="stable"))
+
+            if bulk or self._version is None:
+                self._version = None
+            else:
+                self._version += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    # ---------------- querying (inside read()) ----------------
+
+    def __len__(self):
+        return len(self.ids)
+
+    def where(self, casefold=False, **conditions):
+        """Boolean row mask; each condition is a value or a list of values
+        of a categorical column (matched case-insensitively with casefold)."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        for name, wanted in conditions.items():
+            if isinstance(wanted, str) or wanted is None:
+                wanted = [wanted]
+            if casefold:
+                wanted = {w.lower() if isinstance(w, str) else w for w in wanted}
+            codes = [
+                code for code, value in enumerate(self.categories[name])
+                if (value.lower() if casefold and isinstance(value, str) else value) in wanted
+            ]
+            if None in wanted:
+                codes.append(-1)
+            mask &= np.isin(self.columns[name], codes)
+        return mask
+
+    def _values(self, column, mask=None):
+        values = self.columns[column] if isinstance(column, str) else column
+        if values.dtype.kind == "M":        # dates compare as day numbers
+            keep = ~np.isnat(values)
+            values = values.view(np.int64)
+        else:
+            keep = ~np.isnan(values)
+        if mask is not None:
+            keep &= mask
+        return values[keep], keep
+
+    def count(self, mask=None):
+        return len(self.ids) if mask is None else int(np.count_nonzero(mask))
+
+    def stats(self, column, mask=None):
+        """``{count, sum, mean, min, max}`` over non-NULL values (None when empty)."""
+        values, _ = self._values(column, mask)
+        if not len(values):
+            return {"count": 0, "sum": 0.0, "mean": None, "min": None, "max": None}
+        return {
+            "count": len(values),
+            "sum": float(values.sum()),
+            "mean": float(values.mean()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+        }
+
+    def group_count(self, by, mask=None):
+        """``[(value, count)]``, largest first; NULL counts as its own group."""
+        codes = self.columns[by] if mask is None else self.columns[by][mask]
+        counts = np.bincount(codes + 1, minlength=len(self.categories[by]) + 1)
+        labels = [None, *self.categories[by]]
+        nonzero = np.flatnonzero(counts)
+        order = nonzero[np.argsort(-counts[nonzero], kind="stable")]
+        return [(labels[i], int(counts[i])) for i in order]
+
+    def _groups(self, codes):
+        """``[(code, indexes into codes)]`` in code order, indexes ascending."""
+        present = np.flatnonzero(np.bincount(codes + 1)) - 1 if len(codes) else []
+        if len(present) <= _SCAN_GROUPS:
+            # Few groups: one vectorised pass each beats sorting the column
+            return [(int(c), np.flatnonzero(codes == c)) for c in present]
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        return [(int(codes[idx[0]]), idx) for idx in np.split(order, bounds)]
+
+    def group_stats(self, by, column, mask=None):
+        """``[(value, {count, sum, mean, min, max})]`` per group of ``by``,
+        over the groups' non-NULL ``column`` values, in category order."""
+        values, keep = self._values(column, mask)
+        labels = [None, *self.categories[by]]
+        found = []
+        for code, idx in self._groups(self.columns[by][keep]):
+            group = values[idx]
+            total = float(group.sum())
+            found.append((labels[code + 1], {
+                "count": len(group), "sum": total, "mean": total / len(group),
+                "min": float(group.min()), "max": float(group.max()),
+            }))
+        return found
+
+    def extreme_per_group(self, by, column, largest=True, mask=None):
+        """``[(value, position)]``: each group's row with the largest (or
+        smallest) ``column``, lowest id on ties."""
+        values, keep = self._values(column, mask)
+        positions = np.flatnonzero(keep)
+        labels = [None, *self.categories[by]]
+        pick = np.argmax if largest else np.argmin     # first hit = lowest id
+        return [
+            (labels[code + 1], int(positions[idx[pick(values[idx])]]))
+            for code, idx in self._groups(self.columns[by][keep])
+        ]
+
+    def top_n(self, column, n, largest=True, mask=None):
+        """Positions of the ``n`` rows with the largest (or smallest) values
+        of ``column`` (a column name or an array aligned with the rows)."""
+        values, keep = self._values(column, mask)
+        positions = np.flatnonzero(keep)
+        n = min(int(n), len(values))
+        if n <= 0:
+            return []
+        key = -values if largest else values
+        if n < len(values):
+            # Every row tied with the n-th value, so the lowest ids win ties
+            part = np.flatnonzero(key <= np.partition(key, n - 1)[n - 1])
+        else:
+            part = np.arange(len(values))
+        part = part[np.lexsort((self.ids[positions[part]], key[part]))][:n]
+        return positions[part].tolist()
+
+    def percentiles(self, column, qs, mask=None):
+        """Linear-interpolated percentiles (``qs`` in 0..1); None when empty."""
+        values, _ = self._values(column, mask)
+        if not len(values):
+            return None
+        return [float(p) for p in np.percentile(values, [q * 100 for q in qs])]
+
+    def histogram(self, column, bins=10, mask=None):
+        """``(edges, counts)`` over non-NULL values."""
+        values, _ = self._values(column, mask)
+        counts, edges = np.histogram(values, bins=bins)
+        return edges.tolist(), counts.tolist()
+
+    def row(self, position, *columns):
+        """Decoded ``{"id", column: value}`` for one position."""
+        found = {"id": int(self.ids[position])}
+        for name in columns:
+            value = self.columns[name][position]
+            if name in self.numeric:
+                if np.isnan(value):
+                    found[name] = None
+                else:
+                    found[name] = int(value) if name in self._integers else float(value)
+            elif name in self.dates:
+                found[name] = value.astype(object)
+            else:
+                found[name] = None if value < 0 else self.categories[name][value]
+        return found
+
+    def labels(self, session, positions):
+        """The label column (e.g. employee_name) for ``positions``, in order;
+        fetched by primary key since names are not kept in memory."""
+        ids = [int(self.ids[p]) for p in positions]
+        if not ids:
+            return []
+        model = self.model
+        column = getattr(model, self.label)
+        found = dict(session.execute(select(model.id, column).where(model.id.in_(ids))).all())
+        return [found.get(i) for i in ids]
+
+    def to_frame(self):
+        """A pandas DataFrame copy indexed by id (categoricals stay encoded)."""
+        data = {}
+        for name in self.column_names:
+            if name in self.categorical:
+                data[name] = pd.Categorical.from_codes(self.columns[name].copy(),
+                                                       list(self.categories[name]))
+            else:
+                data[name] = self.columns[name].copy()
+        return pd.DataFrame(data, index=pd.Index(self.ids.copy(), name="id"))
+
+
+# ---------------- shared query helpers ----------------
+
+def stock_values(inv):
+    """Per-item stock value (quantity * price) of an inventory snapshot."""
+    return inv.columns["quantity"] * inv.columns["price"]
+
+
+def top_labelled(table, session, values, n):
+    """``[(label, value)]`` for the ``n`` largest ``values`` (a column name
+    or array); values of an integer column come back as int."""
+    as_int = isinstance(values, str) and values in table._integers
+    if isinstance(values, str):
+        values = table.columns[values]
+    top = table.top_n(values, n)
+    found = values[top].tolist()
+    return list(zip(table.labels(session, top), [int(v) for v in found] if as_int else found))
+
+
+_tables = {}
+
+
+def register(model, **spec):
+    _tables[model.__tablename__] = ColumnarTable(model, **spec)
+
+
+def enabled():
+    return bool(_tables)
+
+
+@contextmanager
+def read(name, session):
+    """
+    Yield the table with its arrays held still, or None when the engine is
+    off or the snapshot is behind the database (the caller uses SQL).
+    """
+    table = _tables.get(name)
+    if table is None or not table.current(session):
+        yield None
+        return
+    with table._lock:
+        yield table
+
+
+def run(name, session, fn):
+    """``fn(table)`` against a current snapshot, or None (use SQL instead)."""
+    with read(name, session) as table:
+        return None if table is None else fn(table)
+
+
+# ---------------- ORM hooks ----------------
+
+def _table_for(obj):
+    return _tables.get(getattr(obj, "__tablename__", None))
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for obj in (*session.new, *session.dirty):
+        table = _table_for(obj)
+        if table is not None and isinstance(obj, table.model):
+            upserts, _ = pending.setdefault(table.name, ({}, set()))
+            upserts[obj.id] = (obj.version_id, table.values_of(obj))
+    for obj in session.deleted:
+        table = _table_for(obj)
+        if table is not None and isinstance(obj, table.model):
+            upserts, deletes = pending.setdefault(table.name, ({}, set()))
+            upserts.pop(obj.id, None)
+            deletes.add(obj.id)
+
+
+def _before_commit(session):
+    bulk = data_version.bulk_changes(session) & set(_tables)
+    if bulk:
+        session.info.setdefault(_BULK_KEY, set()).update(bulk)
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None) or {}
+    bulk = session.info.pop(_BULK_KEY, None) or set()
+    for name, (upserts, deletes) in pending.items():
+        _tables[name].apply(upserts, deletes, bulk=name in bulk)
+    for name in bulk - set(pending):
+        _tables[name].invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_BULK_KEY, None)
+
+
+def init_app(app, db):
+    if app.config.get("ANALYTICS_ENGINE", "sql") != "columnar":
+        return
+    from app.models.employees import Employees
+    from app.models.vendors import Vendors
+    from app.models.customers import Customers
+    from app.models.inventory import Inventory
+
+    refresh = app.config.get("ANALYTICS_REFRESH_SECONDS", 5)
+    register(Employees, numeric=("salary",), categorical=("department", "status"),
+             dates=("joining_date",), label="employee_name", refresh_seconds=refresh)
+    register(Inventory, numeric=("quantity", "price", "reorder_level"), categorical=("unit",),
+             label="item_name", refresh_seconds=refresh)
+    register(Vendors, categorical=("category",), label="vendor_name", refresh_seconds=refresh)
+    register(Customers, categorical=("status", "city", "region"), label="customer_name",
+             refresh_seconds=refresh)
+
+    if not event.contains(db.session, "after_flush", _after_flush):
+        event.listen(db.session, "after_flush", _after_flush)
+        event.listen(db.session, "before_commit", _before_commit)
+        event.listen(db.session, "after_commit", _after_commit)
+        event.listen(db.session, "after_rollback", _after_rollback)
@@ -0,0 +1,95 @@
+"""
+Conditional GET for read-only pages.
+
+``@conditional("employees")`` derives an ETag from the shared per-table
+versions (see data_version.shared_versions), the URL and the user, and
+answers a matching If-None-Match / If-Modified-Since with 304 before the
+view runs, i.e. before any of its queries or template rendering. The
+version lookup itself is one primary-key read of table_versions.
+
+The ETag is the validator that counts. Last-Modified has one-second
+resolution, so it is only sent (and If-Modified-Since only honoured) once
+the second of the last write has passed: a second write within that same
+second could otherwise hide behind a 304.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+from app import db
+from app.services.data_version import shared_versions
+
+_code_salt = None
+
+
+def _salt():
+    """Changes whenever the app's code or templates do, so a deploy
+    invalidates old validators. Same value in every worker on a host."""
+    global _code_salt
+    if _code_salt is None:
+        digest = hashlib.sha1()
+        root = current_app.root_path
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+            for name in sorted(filenames):
+                if name.endswith((".py", ".html")):
+                    st = os.stat(os.path.join(dirpath, name))
+                    digest.update(f"{dirpath}/{name}:{st.st_size}:{st.st_mtime_ns};".encode())
+        _code_salt = digest.hexdigest()[:12]
+    return _code_salt
+
+
+def conditional(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Flashed messages make the page differ from the data alone
+            if "_flashes" in session:
+                return view(*args, **kwargs)
+
+            versions = shared_versions(db.session, *tables)
+            stamps = [updated_at for _, updated_at in versions.values() if updated_at]
+            last_modified = max(stamps) if stamps else None
+
+            key = "|".join((
+                _salt(),
+                request.full_path,
+                str(current_user.get_id()),
+                ",".join(f"{t}:{v}" for t, (v, _) in versions.items()),
+            ))
+            etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+
+            if last_modified is not None:
+                now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+                if last_modified.replace(microsecond=0) >= now:
+                    last_modified = None        # its second isn't over yet
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(
+                    since and last_modified
+                    and last_modified.replace(microsecond=0) <= since.replace(tzinfo=None)
+                )
+
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            # Per-user pages: browsers may keep them but must revalidate
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
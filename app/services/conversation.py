@@ -0,0 +1,133 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+def _tokens(text) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(text or "") // 4 + 1
+
+
+def _clip(text, limit):
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+class Conversation:
+    """
+    Bounded multi-turn chat history for one session.
+
+    Recent turns are kept verbatim up to ``token_budget``; older turns are
+    folded into a rolling plain-text summary capped at ``summary_max_chars``.
+    Tool results are kept out of the prompt and stored under short refs
+    (``r1``, ``r2`` ...) that the model can recall on demand.
+    """
+
+    def __init__(self, token_budget=1500, summary_max_chars=1200, max_tool_refs=20):
+        self.id = uuid.uuid4().hex
+        self.token_budget = token_budget
+        self.summary_max_chars = summary_max_chars
+        self.max_tool_refs = max_tool_refs
+        self.summary = ""
+        self.turns = []                     # [{"role", "content"}]
+        self.tool_results = OrderedDict()   # ref -> {"tool", "result"}
+        self.revision = 0
+        self.last_used = time.monotonic()
+        self._next_ref = 1
+        self.lock = threading.Lock()
+
+    # ---------------- recording ----------------
+
+    def store_tool_result(self, tool_name, result):
+        ref = f"r{self._next_ref}"
+        self._next_ref += 1
+        self.tool_results[ref] = {"tool": tool_name, "result": result}
+        while len(self.tool_results) > self.max_tool_refs:
+            self.tool_results.popitem(last=False)
+        return ref
+
+    def record_turn(self, user_query, reply, tool_results=()):
+        refs = []
+        for tool_name, result in tool_results:
+            ref = self.store_tool_result(tool_name, result)
+            refs.append(f"{ref}={tool_name}")
+
+        answer = reply or ""
+        if refs:
+            answer += f"\n[tool results: {', '.join(refs)}]"
+
+        self.turns.append({"role": "user", "content": user_query})
+        self.turns.append({"role": "assistant", "content": answer})
+        self.revision += 1
+        self._compact()
+
+    def recall(self, ref):
+        entry = self.tool_results.get(ref)
+        if entry is None:
+            return {"error": f"Unknown or expired tool result ref '{ref}'"}
+        return entry
+
+    # ---------------- prompt building ----------------
+
+    def context_messages(self):
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": "Summary of earlier conversation:\n" + self.summary,
+            })
+        messages.extend(self.turns)
+        return messages
+
+    def _used_tokens(self):
+        return _tokens(self.summary) + sum(_tokens(t["content"]) for t in self.turns)
+
+    def _compact(self):
+        # Fold the oldest user/assistant pair into the summary until in budget
+        while len(self.turns) > 2 and self._used_tokens() > self.token_budget:
+            user, assistant = self.turns[0], self.turns[1]
+            del self.turns[:2]
+            line = f"- Q: {_clip(user['content'], 120)} A: {_clip(assistant['content'], 200)}"
+            self.summary = self._trim_summary((self.summary + "\n" + line).strip())
+
+    def _trim_summary(self, summary):
+        # Drop the oldest summary lines first
+        lines = summary.split("\n")
+        while len(lines) > 1 and len("\n".join(lines)) > self.summary_max_chars:
+            lines.pop(0)
+        return "\n".join(lines)[-self.summary_max_chars:]
+
+
+class ConversationStore:
+    """In-process LRU of conversations with an idle timeout."""
+
+    def __init__(self, max_sessions=1000, idle_ttl=3600, **conversation_opts):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.conversation_opts = conversation_opts
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get_or_create(self, conversation_id=None):
+        now = time.monotonic()
+        with self._lock:
+            conv = self._items.get(conversation_id) if conversation_id else None
+            if conv is not None and now - conv.last_used > self.idle_ttl:
+                del self._items[conversation_id]
+                conv = None
+
+            if conv is None:
+                conv = Conversation(**self.conversation_opts)
+                self._items[conv.id] = conv
+            else:
+                self._items.move_to_end(conv.id)
+
+            conv.last_used = now
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+            return conv
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,118 @@
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+log = logging.getLogger(__name__)
+
+# Per-table change counters, bumped after every commit that touched the table.
+# Used as a cheap "has anything changed?" key by caches and coalescing.
+_lock = threading.Lock()
+_versions = defaultdict(int)
+
+# The same changes are also counted in the table_versions table, so every
+# worker process sees one shared version (used for HTTP validators, where a
+# per-process counter would be unsafe). The counters are bumped in their own
+# short transaction right after the writing one commits: writers never hold
+# a table_versions row lock while doing their own work. A reader between
+# the two commits merely sees new data under the old version once more.
+_table = None
+
+_PENDING_KEY = "data_version_changed_tables"
+_BULK_KEY = "data_version_bulk_tables"
+
+
+def get_version(*tables):
+    with _lock:
+        return tuple(_versions[t] for t in tables)
+
+
+def bump(*tables):
+    with _lock:
+        for t in tables:
+            _versions[t] += 1
+
+
+def shared_versions(session, *tables):
+    """``{table: (version, updated_at)}`` from table_versions; (0, None) if never written."""
+    rows = session.execute(
+        select(_table.c.table_name, _table.c.version, _table.c.updated_at)
+        .where(_table.c.table_name.in_(tables))
+    ).all()
+    found = {name: (version, updated_at) for name, version, updated_at in rows}
+    return {t: found.get(t, (0, None)) for t in tables}
+
+
+def _bump_shared(conn, tables):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for name in tables:
+        updated = conn.execute(
+            _table.update()
+            .where(_table.c.table_name == name)
+            .values(version=_table.c.version + 1, updated_at=now)
+        )
+        if updated.rowcount == 0:
+            conn.execute(_table.insert().values(table_name=name, version=1, updated_at=now))
+
+
+def _persist(bind, tables):
+    todo = sorted(set(tables) - {_table.name})   # fixed order: no lock-order deadlocks
+    if not todo:
+        return
+    try:
+        try:
+            with bind.begin() as conn:
+                _bump_shared(conn, todo)
+        except IntegrityError:
+            # Another process inserted a table's first row at the same time
+            with bind.begin() as conn:
+                _bump_shared(conn, todo)
+    except SQLAlchemyError:
+        # The data is already committed; failing the request would not undo it
+        log.exception("could not bump table_versions for %s", ", ".join(todo))
+
+
+def mark_changed(session, *tables):
+    """Record table changes the ORM cannot see (bulk UPDATE / Core statements)."""
+    session.info.setdefault(_PENDING_KEY, set()).update(tables)
+    session.info.setdefault(_BULK_KEY, set()).update(tables)
+
+
+def bulk_changes(session):
+    """Tables flagged via mark_changed() in the current transaction."""
+    return set(session.info.get(_BULK_KEY, ()))
+
+
+def _after_flush(session, flush_context):
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            changed.add(table)
+
+
+def _after_commit(session):
+    session.info.pop(_BULK_KEY, None)
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        _persist(session.get_bind(), changed)
+        bump(*changed)
+
+
+def _after_rollback(session):
+    session.info.pop(_BULK_KEY, None)
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_app(db):
+    global _table
+    from app.models.table_versions import TableVersions
+    _table = TableVersions.__table__
+
+    if event.contains(db.session, "after_flush", _after_flush):
+        return
+    event.listen(db.session, "after_flush", _after_flush)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_rollback", _after_rollback)
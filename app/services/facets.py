@@ -0,0 +1,86 @@
+from sqlalchemy import func
+
+
+def _same(cell_value, selected_value):
+    # Lookup-coded facets (app/services/lookups.py) match selections
+    # regardless of case and spacing; counts have to agree with them
+    if isinstance(cell_value, str) and isinstance(selected_value, str):
+        return " ".join(cell_value.split()).lower() == " ".join(selected_value.split()).lower()
+    return cell_value == selected_value
+
+
+def _matches(cell, selected, skip=None):
+    return all(_same(cell[name], value) for name, value in selected.items() if name != skip)
+
+
+def faceted_search(query, facets, selected, page_columns, order_by, serialize,
+                   page=1, per_page=25):
+    """
+    One page of matches plus facet counts from a single grouped query.
+
+    ``query`` carries the non-facet filters (search text etc.). It is grouped
+    by every facet expression at once; each facet's counts are then summed
+    from that cross-tab honouring the *other* facets' selections, so a user
+    can see alternatives for a facet they've already narrowed. The page
+    itself is a second, LIMITed query with all selections applied.
+    """
+    names = list(facets)
+    exprs = [facets[n] for n in names]
+
+    cross = (
+        query.with_entities(*[e.label(n) for n, e in zip(names, exprs)], func.count())
+        .group_by(*exprs)
+        .all()
+    )
+
+    counts = {n: {} for n in names}
+    total = 0
+    for row in cross:
+        cell = {n: row[i] for i, n in enumerate(names)}
+        n_rows = row[-1]
+        if _matches(cell, selected):
+            total += n_rows
+        for name in names:
+            if _matches(cell, selected, skip=name):
+                key = cell[name]
+                counts[name][key] = counts[name].get(key, 0) + n_rows
+
+    page_query = query
+    for name, value in selected.items():
+        page_query = page_query.filter(facets[name] == value)
+
+    rows = (
+        page_query.with_entities(*page_columns)
+        .order_by(*order_by)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+        .all()
+    )
+
+    return {
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "items": [serialize(r) for r in rows],
+        "selected": selected,
+        "facets": {
+            name: [
+                {"value": value, "count": c}
+                for value, c in sorted(values.items(), key=lambda kv: (-kv[1], str(kv[0])))
+            ]
+            for name, values in counts.items()
+        },
+    }
+
+
+def page_args(args, max_per_page=100):
+    """Parse ``page`` / ``per_page`` query-string values defensively."""
+    try:
+        page = max(1, int(args.get("page", 1)))
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        per_page = min(max(1, int(args.get("per_page", 25))), max_per_page)
+    except (TypeError, ValueError):
+        per_page = 25
+    return page, per_page
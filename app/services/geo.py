@@ -0,0 +1,111 @@
+"""
+City / region extraction from free-text customer addresses.
+
+Addresses are parsed once, when they are written, into Customers.city and
+Customers.region (both short and indexed), so geography analytics group
+by a compact key and spelling variants ("Bombay", "mumbai ") land in one
+bucket.
+"""
+import re
+from sqlalchemy import event, inspect as sa_inspect
+
+_POSTCODE = re.compile(r"\b\d{5,6}\b|\b\d{3}\s\d{3}\b")
+_SPACES = re.compile(r"\s+")
+_COUNTRIES = {"india", "in", "bharat"}
+
+# Alias -> canonical city
+CITY_ALIASES = {
+    "bombay": "Mumbai", "mumbai": "Mumbai", "navi mumbai": "Navi Mumbai", "thane": "Thane",
+    "poona": "Pune", "pune": "Pune", "nagpur": "Nagpur", "nashik": "Nashik",
+    "delhi": "Delhi", "new delhi": "Delhi", "noida": "Noida",
+    "gurgaon": "Gurugram", "gurugram": "Gurugram", "faridabad": "Faridabad",
+    "bangalore": "Bengaluru", "bengaluru": "Bengaluru", "mysore": "Mysuru", "mysuru": "Mysuru",
+    "madras": "Chennai", "chennai": "Chennai", "coimbatore": "Coimbatore",
+    "calcutta": "Kolkata", "kolkata": "Kolkata",
+    "hyderabad": "Hyderabad", "secunderabad": "Secunderabad",
+    "ahmedabad": "Ahmedabad", "surat": "Surat", "vadodara": "Vadodara", "baroda": "Vadodara",
+    "jaipur": "Jaipur", "lucknow": "Lucknow", "kanpur": "Kanpur",
+    "chandigarh": "Chandigarh", "indore": "Indore", "bhopal": "Bhopal",
+    "kochi": "Kochi", "cochin": "Kochi", "trivandrum": "Thiruvananthapuram",
+    "thiruvananthapuram": "Thiruvananthapuram", "goa": "Goa", "panaji": "Panaji",
+    "patna": "Patna", "bhubaneswar": "Bhubaneswar", "guwahati": "Guwahati",
+    "visakhapatnam": "Visakhapatnam", "vizag": "Visakhapatnam",
+}
+
+CITY_REGIONS = {
+    "Mumbai": "Maharashtra", "Navi Mumbai": "Maharashtra", "Thane": "Maharashtra",
+    "Pune": "Maharashtra", "Nagpur": "Maharashtra", "Nashik": "Maharashtra",
+    "Delhi": "Delhi", "Noida": "Uttar Pradesh", "Lucknow": "Uttar Pradesh", "Kanpur": "Uttar Pradesh",
+    "Gurugram": "Haryana", "Faridabad": "Haryana",
+    "Bengaluru": "Karnataka", "Mysuru": "Karnataka",
+    "Chennai": "Tamil Nadu", "Coimbatore": "Tamil Nadu",
+    "Kolkata": "West Bengal",
+    "Hyderabad": "Telangana", "Secunderabad": "Telangana",
+    "Ahmedabad": "Gujarat", "Surat": "Gujarat", "Vadodara": "Gujarat",
+    "Jaipur": "Rajasthan", "Chandigarh": "Chandigarh",
+    "Indore": "Madhya Pradesh", "Bhopal": "Madhya Pradesh",
+    "Kochi": "Kerala", "Thiruvananthapuram": "Kerala",
+    "Goa": "Goa", "Panaji": "Goa", "Patna": "Bihar", "Bhubaneswar": "Odisha",
+    "Guwahati": "Assam", "Visakhapatnam": "Andhra Pradesh",
+}
+
+# Lower-cased region name -> canonical
+REGIONS = {r.lower(): r for r in set(CITY_REGIONS.values())}
+REGIONS.update({"maharastra": "Maharashtra", "karnatka": "Karnataka", "tn": "Tamil Nadu",
+                "up": "Uttar Pradesh", "mp": "Madhya Pradesh", "wb": "West Bengal"})
+
+
+def _segments(address):
+    text = _POSTCODE.sub(" ", address or "")
+    parts = []
+    for part in re.split(r"[,\n;/|]+", text):
+        part = _SPACES.sub(" ", part).strip(" .-").lower()
+        if part and part not in _COUNTRIES:
+            parts.append(part)
+    return parts
+
+
+def parse_city(address):
+    """``(city, region)`` from a free-text address; either may be None."""
+    parts = _segments(address)
+    if not parts:
+        return None, None
+
+    # Known city anywhere, preferring the end (the street usually comes first)
+    for part in reversed(parts):
+        city = CITY_ALIASES.get(part)
+        if city is None:
+            # "12 main st pune" -> trailing word(s)
+            words = part.split()
+            city = CITY_ALIASES.get(" ".join(words[-2:])) or CITY_ALIASES.get(words[-1])
+        if city:
+            return city, CITY_REGIONS.get(city)
+
+    # Unknown city: "..., <city>, <region>" or "..., <city>"
+    region = REGIONS.get(parts[-1])
+    if region:
+        parts = parts[:-1]
+    if not parts or any(ch.isdigit() for ch in parts[-1]):
+        return None, region
+    return parts[-1].title()[:100], region
+
+
+# ---------------- write-time hook ----------------
+
+_customers = None
+
+
+def _before_flush(session, flush_context, instances):
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, _customers):
+            if obj in session.new or sa_inspect(obj).attrs.address.history.has_changes():
+                obj.city, obj.region = parse_city(obj.address)
+
+
+def init_app(db):
+    global _customers
+    from app.models.customers import Customers
+
+    _customers = Customers
+    if not event.contains(db.session, "before_flush", _before_flush):
+        event.listen(db.session, "before_flush", _before_flush)
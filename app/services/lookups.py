@@ -0,0 +1,220 @@
+"""
+Small-integer codes for low-cardinality strings.
+
+Employees.department / status, Customers.status, Vendors.category and
+Inventory.unit are stored as SMALLINT foreign keys into ``lookups``
+(kind, key, name) instead of a VARCHAR per row. The Lookup column type
+(app/models/lookups.py) translates at the SQL boundary, so model code
+still reads and assigns strings, and ``Employees.status == "active"``
+compiles to an integer comparison on the indexed code column. Lookup
+keys are case- and whitespace-insensitive: "active", "Active " and
+"ACTIVE" are one code, displayed as first written.
+
+The kind -> key -> id map of committed codes is cached per process and
+loaded on first use. New values are created (or found) by a before_flush
+hook in the writing transaction. Until that transaction commits, only the
+thread running it can bind the new code; after the commit it joins the
+shared cache. A cache miss looks the one code up directly, on the
+session's own connection, which picks up codes that other processes
+created; a value with no code is remembered as missing for MISS_SECONDS.
+"""
+import threading
+import time
+from contextlib import nullcontext
+
+from sqlalchemy import event, select, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+
+UNKNOWN = -1                # bind value for a name with no code: matches nothing
+MISS_SECONDS = 5.0          # how long a value with no code stays unknown before re-checking
+_MAX_MISSES = 1000
+
+_lock = threading.Lock()
+_codes = {}                 # (kind, key) -> id, committed codes only
+_names = {}                 # id -> name
+_misses = {}                # (kind, key) or id -> time.monotonic() the miss expires
+_loaded = False
+
+# Codes created by this thread's open transaction. Only that transaction may
+# bind them; they join the shared cache after it commits.
+_local = threading.local()
+
+_db = None
+_table = None
+
+
+def key_of(value):
+    return " ".join(str(value).split()).lower()
+
+
+def _uncommitted():
+    pending = getattr(_local, "pending", None)
+    if pending is None:
+        pending = _local.pending = {}
+    return pending
+
+
+def _remember(rows):
+    with _lock:
+        for lookup_id, kind, key, name in rows:
+            _codes[kind, key] = lookup_id
+            _names[lookup_id] = name
+            _misses.pop((kind, key), None)
+            _misses.pop(lookup_id, None)
+
+
+def _connection():
+    # The session's own connection: a lookup while binding or reading a
+    # statement must not check a second one out of the pool
+    return _db.session.connection()
+
+
+def _load_all():
+    global _loaded
+    _remember(_connection().execute(
+        select(_table.c.id, _table.c.kind, _table.c.key, _table.c.name)
+    ).all())
+    _loaded = True
+
+
+def _fetch(miss_key, *where):
+    """Look one code up in the database (created by another process, or
+    missing); None, and no query, while ``miss_key`` is a recent miss."""
+    now = time.monotonic()
+    if _misses.get(miss_key, 0) > now:
+        return None
+    row = _connection().execute(
+        select(_table.c.id, _table.c.kind, _table.c.key, _table.c.name).where(*where)
+    ).first()
+    if row is not None:
+        _remember([row])
+        return row
+    with _lock:
+        if len(_misses) >= _MAX_MISSES:
+            for stale in [k for k, expires in _misses.items() if expires <= now]:
+                del _misses[stale]
+        if len(_misses) < _MAX_MISSES:
+            _misses[miss_key] = now + MISS_SECONDS
+    return None
+
+
+def code(kind, value):
+    """The id for ``value`` of ``kind`` (UNKNOWN if it has none)."""
+    key = key_of(value)
+    found = _codes.get((kind, key))
+    if found is None:
+        pending = _uncommitted().get((kind, key))
+        if pending is not None:
+            return pending[0]
+        if not _loaded:
+            _load_all()
+            found = _codes.get((kind, key))
+        if found is None:
+            row = _fetch((kind, key), _table.c.kind == kind, _table.c.key == key)
+            found = UNKNOWN if row is None else row.id
+    return found
+
+
+def name(lookup_id):
+    found = _names.get(lookup_id)
+    if found is None:
+        for pending_id, pending_name in _uncommitted().values():
+            if pending_id == lookup_id:
+                return pending_name
+        row = _fetch(lookup_id, _table.c.id == lookup_id)
+        found = None if row is None else row.name
+    return found
+
+
+def display(kind, value):
+    """``value`` as reads return it: its code's name ("ENG " -> "Eng"), or
+    ``value`` itself if it has no code."""
+    found = code(kind, value)
+    return value if found == UNKNOWN else name(found)
+
+
+def ensure(conn, kind, value):
+    """Get or create the code for ``value`` inside ``conn``'s transaction.
+
+    A new code is visible to this thread at once and to everyone else once
+    the session commits (see _after_commit).
+    """
+    key = key_of(value)
+    found = _codes.get((kind, key))
+    if found is not None:
+        return found
+    pending = _uncommitted()
+    if (kind, key) in pending:
+        return pending[kind, key][0]
+    lookup = select(_table.c.id, _table.c.name).where(_table.c.kind == kind, _table.c.key == key)
+    row = conn.execute(lookup).first()
+    if row is None:
+        display = " ".join(str(value).split())[:100]
+        # pysqlite would turn an outermost SAVEPOINT's RELEASE into a COMMIT;
+        # SQLite only aborts the failed statement anyway
+        savepoint = nullcontext() if conn.dialect.name == "sqlite" else conn.begin_nested()
+        try:
+            with savepoint:
+                inserted = conn.execute(_table.insert().values(kind=kind, key=key, name=display))
+            row = (inserted.inserted_primary_key[0], display)
+        except IntegrityError:
+            # Someone else created it first; a locking read sees their row
+            row = conn.execute(lookup.with_for_update()).one()
+    pending[kind, key] = (row[0], row[1])
+    return row[0]
+
+
+def sort_key(column):
+    """ORDER BY expression that sorts a Lookup column by name rather than code."""
+    return select(_table.c.name).where(_table.c.id == column).scalar_subquery()
+
+
+# ---------------- write-time hook ----------------
+
+def _lookup_columns(mapper):
+    from app.models.lookups import Lookup
+    return [
+        (prop.key, prop.columns[0].type.kind)
+        for prop in mapper.column_attrs
+        if isinstance(prop.columns[0].type, Lookup)
+    ]
+
+
+def _before_flush(session, flush_context, instances):
+    conn = None
+    for obj in (*session.new, *session.dirty):
+        state = sa_inspect(obj)
+        for attr, kind in _lookup_columns(state.mapper):
+            value = getattr(obj, attr)
+            if value is None or (kind, key_of(value)) in _codes:
+                continue
+            if obj not in session.new and not state.attrs[attr].history.has_changes():
+                continue
+            if conn is None:
+                conn = session.connection()
+            ensure(conn, kind, value)
+
+
+def _after_commit(session):
+    pending = _uncommitted()
+    if pending:
+        _remember([(lookup_id, kind, key, name) for (kind, key), (lookup_id, name) in pending.items()])
+        pending.clear()
+
+
+def _after_rollback(session):
+    # Codes created in the rolled-back transaction no longer exist
+    _uncommitted().clear()
+
+
+def init_app(db):
+    global _db, _table
+    from app.models.lookups import Lookups
+
+    _db = db
+    _table = Lookups.__table__
+
+    if not event.contains(db.session, "before_flush", _before_flush):
+        event.listen(db.session, "before_flush", _before_flush)
+        event.listen(db.session, "after_commit", _after_commit)
+        event.listen(db.session, "after_rollback", _after_rollback)
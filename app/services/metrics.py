@@ -0,0 +1,137 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds shared by latency (ms), token and row-count histograms
+DEFAULT_BUCKETS = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+    10000, 30000, 60000, 120000,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are reported as bucket upper bounds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last slot = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = p * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe labelled histograms and counters, plus recent traces."""
+
+    def __init__(self, recent_traces=50):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.recent = deque(maxlen=recent_traces)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_trace(self, trace_summary):
+        with self._lock:
+            self.recent.append(trace_summary)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = [
+                {"name": n, "labels": dict(l), **h.snapshot()}
+                for (n, l), h in sorted(self._histograms.items())
+            ]
+            counters = [
+                {"name": n, "labels": dict(l), "value": round(v, 6)}
+                for (n, l), v in sorted(self._counters.items())
+            ]
+            recent = list(self.recent)
+        return {"histograms": histograms, "counters": counters, "recent": recent}
+
+
+class RequestTrace:
+    """
+    Spans for one request. Each span is timed in milliseconds, observed into
+    ``<kind>_ms`` on the registry, and kept for the per-request summary.
+    """
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.spans = []
+        self.tags = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, kind, **labels):
+        attrs = {}
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            self.registry.observe(f"{kind}_ms", ms, **labels)
+            self.spans.append({"kind": kind, "ms": round(ms, 3), **labels, **attrs})
+
+    def finish(self):
+        ms = (time.perf_counter() - self._start) * 1000
+        self.registry.observe(f"{self.name}_ms", ms)
+        summary = {"name": self.name, "ms": round(ms, 3), **self.tags, "spans": self.spans}
+        self.registry.add_trace(summary)
+        return summary
+
+
+class NullTrace:
+    """Stand-in used when no request trace is active."""
+
+    @contextmanager
+    def span(self, kind, **labels):
+        yield {}
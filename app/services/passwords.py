@@ -0,0 +1,96 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """The hashing pool is saturated; the caller should back off."""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_method_prefixes = {}
+
+
+def _get_pool():
+    """Lazily start the bounded hashing pool (None when disabled)."""
+    global _executor, _slots
+    workers = current_app.config["PASSWORD_HASH_WORKERS"]
+    if workers <= 0:
+        return None, None
+
+    with _lock:
+        if _executor is None:
+            # forkserver/spawn: never fork a multi-threaded web worker
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        if _slots is None:
+            # Cap queued jobs so a login burst can't build an unbounded backlog
+            _slots = threading.BoundedSemaphore(workers * current_app.config["PASSWORD_HASH_QUEUE_FACTOR"])
+        return _executor, _slots
+
+
+def _discard_pool(executor):
+    """Drop a broken pool (a worker died); the next call starts a new one."""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    executor, slots = _get_pool()
+    if executor is None:
+        return fn(*args)
+
+    timeout = current_app.config["PASSWORD_HASH_TIMEOUT"]
+    if not slots.acquire(timeout=timeout):
+        raise HashingBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _discard_pool(executor)
+        raise HashingBusy()
+    # The slot is held until the job finishes (or is cancelled), not just
+    # until this caller stops waiting: a timed-out job still occupies the pool
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeout:
+        raise HashingBusy()
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        raise HashingBusy()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config["PASSWORD_HASH_METHOD"])
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def _method_prefix(method):
+    # Werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"); learn the
+    # stored form of the configured method once by hashing a dummy value.
+    prefix = _method_prefixes.get(method)
+    if prefix is None:
+        prefix = generate_password_hash("", method).split("$", 1)[0]
+        _method_prefixes[method] = prefix
+    return prefix
+
+
+def needs_rehash(pwhash):
+    """True when ``pwhash`` was made with a different method or cost."""
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+    return pwhash.split("$", 1)[0] != _method_prefix(method)
@@ -0,0 +1,207 @@
+"""
+SQLite-backed storage for Flask-Limiter.
+
+All worker processes on a host share one small SQLite file (WAL mode), so
+"10 per minute" means 10 per minute per client, not 10 per worker. Each
+counter is one row ``(key, count, expires_at)``; a hit is a single UPSERT,
+and expired rows are reset in place and swept in bulk every few thousand
+writes, so the table stays bounded by the number of active clients.
+
+Importing this module registers the ``sqlite://`` scheme with ``limits``:
+
+    RATELIMIT_STORAGE_URI = "sqlite:////var/tmp/erp-ratelimit.sqlite"
+"""
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from urllib.parse import urlparse
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+SWEEP_EVERY = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key        TEXT PRIMARY KEY,
+    count      INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Expired rows restart from ``amount`` with a fresh expiry
+_INCR = """
+INSERT INTO rate_limits (key, count, expires_at) VALUES (:key, :amount, :expires_at)
+ON CONFLICT(key) DO UPDATE SET
+    count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END,
+    expires_at = CASE WHEN expires_at <= :now THEN :expires_at ELSE expires_at END
+RETURNING count
+"""
+
+# elastic_expiry (limits 4.x): every hit also pushes the expiry out
+_INCR_ELASTIC = """
+INSERT INTO rate_limits (key, count, expires_at) VALUES (:key, :amount, :expires_at)
+ON CONFLICT(key) DO UPDATE SET
+    count = CASE WHEN expires_at <= :now THEN :amount ELSE count + :amount END,
+    expires_at = :expires_at
+RETURNING count
+"""
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Fixed-window and sliding-window-counter storage in a shared SQLite file."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        parsed = urlparse(uri or "sqlite://")
+        self.path = parsed.path or ":memory:"
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.timeout = float(options.get("timeout", 5))
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        with self._connect():
+            pass
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    # ---------------- connections ----------------
+
+    def _connect(self):
+        """This thread's connection (sqlite3 connections aren't thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Counters are disposable: don't fsync on every hit
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(_SCHEMA)
+            self._local.conn = conn
+        return _Transaction(conn)
+
+    def _maybe_sweep(self, conn, now):
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % SWEEP_EVERY == 0
+        if due:
+            conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+
+    # ---------------- fixed window ----------------
+
+    def _incr(self, conn, key, expiry, amount, now, elastic_expiry=False):
+        count = conn.execute(_INCR_ELASTIC if elastic_expiry else _INCR, {
+            "key": key, "amount": amount, "now": now, "expires_at": now + expiry,
+        }).fetchone()[0]
+        self._maybe_sweep(conn, now)
+        return count
+
+    def _get(self, conn, key, now):
+        row = conn.execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        # Signature of limits 4.x (the pinned version), which passes
+        # elastic_expiry; limits 5 passes only amount, by keyword
+        with self._connect() as conn:
+            return self._incr(conn, key, expiry, amount, time.time(), elastic_expiry)
+
+    def get(self, key):
+        with self._connect() as conn:
+            return self._get(conn, key, time.time())
+
+    def get_expiry(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        return row[0] if row else now
+
+    def clear(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def reset(self):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM rate_limits").rowcount
+
+    def check(self):
+        try:
+            with self._connect() as conn:
+                conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    # ---------------- sliding window counter ----------------
+
+    def _window(self, conn, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(conn, previous_key, now)
+        current_count = self._get(conn, current_key, now)
+        if previous_count == 0:
+            previous_ttl = 0.0
+        else:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, (previous_count, previous_ttl, current_count, current_ttl)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        # Read-check-increment inside one write transaction, so concurrent
+        # workers can't both take the last slot.
+        with self._connect() as conn:
+            conn.begin_immediate()
+            current_key, (previous_count, previous_ttl, current_count, _) = \
+                self._window(conn, key, expiry, now)
+            weighted = previous_count * previous_ttl / expiry + current_count
+            if floor(weighted) + amount > limit:
+                return False
+            self._incr(conn, current_key, 2 * expiry, amount, now)
+            return True
+
+    def get_sliding_window(self, key, expiry):
+        with self._connect() as conn:
+            return self._window(conn, key, expiry, time.time())[1]
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rate_limits WHERE key IN (?, ?)", (previous_key, current_key))
+
+
+class _Transaction:
+    """Autocommit by default; ``begin_immediate()`` opens a write transaction
+    that is committed (or rolled back on error) when the block exits."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.active = False
+
+    def begin_immediate(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.active = True
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.active:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            self.active = False
+        return False
@@ -0,0 +1,191 @@
+"""
+Month-bucketed row counts, kept in monthly_rollups.
+
+Each metric counts the rows of one model by the calendar month of one of
+its date columns (employees by joining_date, everything else by
+created_at). Archived customers and employees are counted under their
+own ``*_archived`` metrics, so moving a row to the archive (an ORM delete
+plus insert) shifts it between the two without losing history. Inserts, deletes and date changes are collected per
+transaction and applied to the affected buckets in one short transaction
+right after it commits, so writers never wait on the current month's row
+lock, and charts read a few hundred rows instead of scanning the table.
+A reader between the two commits sees the month one row behind.
+``rebuild()`` recomputes a metric from scratch (used by
+``flask erp backfill-rollups``).
+"""
+import logging
+from collections import Counter
+from sqlalchemy import event, func, extract, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+log = logging.getLogger(__name__)
+
+_PENDING_KEY = "rollups_pending"
+
+# metric -> (model, date attribute)
+_metrics = {}
+_table = None
+
+
+def register(metric, model, attr):
+    _metrics[metric] = (model, attr)
+
+
+def metric_names():
+    return sorted(_metrics)
+
+
+def period_of(value):
+    return None if value is None else f"{value.year:04d}-{value.month:02d}"
+
+
+def _next_period(period):
+    year, month = int(period[:4]), int(period[5:])
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}"
+
+
+def series(session, *metrics, start=None, end=None):
+    """Labels and counts (summed over ``metrics``) for every month from
+    ``start`` to ``end`` (inclusive, "YYYY-MM"; default: first to last
+    non-empty month), gaps filled with 0."""
+    query = session.query(_table.c.period, func.sum(_table.c.count)).filter(
+        _table.c.metric.in_(metrics), _table.c.count != 0
+    ).group_by(_table.c.period)
+    if start:
+        query = query.filter(_table.c.period >= start)
+    if end:
+        query = query.filter(_table.c.period <= end)
+    counts = {period: int(n) for period, n in query.all() if n}
+    if not counts:
+        return {"labels": [], "series": []}
+
+    labels = []
+    period, last = start or min(counts), end or max(counts)
+    while period <= last:
+        labels.append(period)
+        period = _next_period(period)
+    return {"labels": labels, "series": [counts.get(p, 0) for p in labels]}
+
+
+def rebuild(session, metric):
+    """Recount ``metric`` from its source table; returns the number of buckets."""
+    model, attr = _metrics[metric]
+    column = getattr(model, attr)
+    year, month = extract("year", column), extract("month", column)
+    rows = (
+        session.query(year, month, func.count())
+        .filter(column.isnot(None))
+        .group_by(year, month)
+        .all()
+    )
+    # The recount already includes this transaction's flushed changes
+    pending = session.info.get(_PENDING_KEY)
+    if pending:
+        for key in [k for k in pending if k[0] == metric]:
+            del pending[key]
+    session.execute(_table.delete().where(_table.c.metric == metric))
+    if rows:
+        session.execute(_table.insert(), [
+            {"metric": metric, "period": f"{int(y):04d}-{int(m):02d}", "count": n}
+            for y, m, n in rows
+        ])
+    return len(rows)
+
+
+# ---------------- write-side maintenance ----------------
+
+def _apply(conn, deltas):
+    for (metric, period), delta in deltas:
+        updated = conn.execute(
+            _table.update()
+            .where(_table.c.metric == metric, _table.c.period == period)
+            .values(count=_table.c.count + delta)
+        )
+        if updated.rowcount == 0:
+            conn.execute(_table.insert().values(metric=metric, period=period, count=delta))
+
+
+def _persist(bind, deltas):
+    todo = sorted((key, delta) for key, delta in deltas.items() if delta)   # fixed lock order
+    if not todo:
+        return
+    try:
+        try:
+            with bind.begin() as conn:
+                _apply(conn, todo)
+        except IntegrityError:
+            # Another process inserted the month's first row at the same time
+            with bind.begin() as conn:
+                _apply(conn, todo)
+    except SQLAlchemyError:
+        # The rows are already committed; `flask erp backfill-rollups` recounts
+        log.exception("could not update monthly_rollups for %s",
+                      ", ".join(sorted({metric for (metric, _), _ in todo})))
+
+
+def _before_flush(session, flush_context, instances):
+    # Deleted rows: read their bucket now, while an expired attribute can
+    # still be loaded
+    deltas = session.info.setdefault(_PENDING_KEY, Counter())
+    for metric, (model, attr) in _metrics.items():
+        for obj in session.deleted:
+            if isinstance(obj, model):
+                period = period_of(getattr(obj, attr))
+                if period:
+                    deltas[metric, period] -= 1
+
+
+def _after_flush(session, flush_context):
+    # New rows: after the flush, so column defaults (created_at) are set
+    deltas = session.info.setdefault(_PENDING_KEY, Counter())
+    for metric, (model, attr) in _metrics.items():
+        for obj in session.new:
+            if isinstance(obj, model):
+                period = period_of(getattr(obj, attr))
+                if period:
+                    deltas[metric, period] += 1
+        for obj in session.dirty:
+            if isinstance(obj, model):
+                history = sa_inspect(obj).attrs[attr].history
+                for old in history.deleted:
+                    if period_of(old):
+                        deltas[metric, period_of(old)] -= 1
+                for new in history.added:
+                    if period_of(new):
+                        deltas[metric, period_of(new)] += 1
+
+
+def _after_commit(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        _persist(session.get_bind(), deltas)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_app(db):
+    global _table
+    from app.models.monthly_rollups import MonthlyRollups
+    from app.models.employees import Employees
+    from app.models.customers import Customers
+    from app.models.vendors import Vendors
+    from app.models.inventory import Inventory
+    from app.models.archive import CustomersArchive, EmployeesArchive
+
+    _table = MonthlyRollups.__table__
+    register("employees_hired", Employees, "joining_date")
+    register("employees_created", Employees, "created_at")
+    register("customers_created", Customers, "created_at")
+    register("vendors_created", Vendors, "created_at")
+    register("inventory_created", Inventory, "created_at")
+    register("employees_hired_archived", EmployeesArchive, "joining_date")
+    register("customers_created_archived", CustomersArchive, "created_at")
+
+    if not event.contains(db.session, "after_flush", _after_flush):
+        event.listen(db.session, "before_flush", _before_flush)
+        event.listen(db.session, "after_flush", _after_flush)
+        event.listen(db.session, "after_commit", _after_commit)
+        event.listen(db.session, "after_rollback", _after_rollback)
@@ -0,0 +1,222 @@
+"""
+In-process trigram index for fuzzy name search.
+
+Each registered table keeps ``trigram -> {row id}`` postings built from one
+name column. A search only touches rows sharing a trigram with the query
+(no full scan), ranks them by trigram similarity (as pg_trgm does) with a
+bonus for plain substring hits, so typos still find the right row.
+
+Indexes are built lazily on first use, kept current from ORM commits in
+this process, and rebuilt after ``refresh_seconds`` to pick up writes made
+by other worker processes.
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from sqlalchemy import event
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_PENDING_KEY = "search_index_pending"
+LIKE_ESCAPE = "\\"
+
+
+def normalize(text) -> str:
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def like_pattern(text: str) -> str:
+    """Lower-cased substring pattern for ``.like(..., escape=LIKE_ESCAPE)``;
+    ``%`` and ``_`` in ``text`` match literally."""
+    text = text.lower()
+    for char in (LIKE_ESCAPE, "%", "_"):
+        text = text.replace(char, LIKE_ESCAPE + char)
+    return f"%{text}%"
+
+
+def trigrams(text) -> set:
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    def __init__(self, model, column, refresh_seconds=300):
+        self.model = model
+        self.column = column
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._postings = defaultdict(set)
+        self._docs = {}          # id -> (normalized name, trigram set)
+        self._built_at = None
+
+    # ---------------- maintenance ----------------
+
+    def _add(self, row_id, name):
+        norm = normalize(name)
+        grams = trigrams(norm)
+        self._docs[row_id] = (norm, grams)
+        for g in grams:
+            self._postings[g].add(row_id)
+
+    def _remove(self, row_id):
+        doc = self._docs.pop(row_id, None)
+        if doc is None:
+            return
+        for g in doc[1]:
+            ids = self._postings.get(g)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self._postings[g]
+
+    def rebuild(self, session):
+        col = getattr(self.model, self.column)
+        rows = session.query(self.model.id, col).all()
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._docs = {}
+            for row_id, name in rows:
+                if name:
+                    self._add(row_id, name)
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self, session):
+        with self._lock:
+            stale = (
+                self._built_at is None
+                or time.monotonic() - self._built_at > self.refresh_seconds
+            )
+        if stale:
+            self.rebuild(session)
+
+    def upsert(self, row_id, name):
+        with self._lock:
+            if self._built_at is None:
+                return          # not built yet; the first build will see it
+            self._remove(row_id)
+            if name:
+                self._add(row_id, name)
+
+    def delete(self, row_id):
+        with self._lock:
+            self._remove(row_id)
+
+    # ---------------- querying ----------------
+
+    def search(self, query, limit=20, min_score=0.25):
+        """Return ``[(id, score)]`` best first."""
+        q_norm = normalize(query)
+        q_grams = trigrams(q_norm)
+        if not q_grams:
+            return []
+
+        with self._lock:
+            shared = defaultdict(int)
+            for g in q_grams:
+                for row_id in self._postings.get(g, ()):
+                    shared[row_id] += 1
+
+            scored = []
+            for row_id, n in shared.items():
+                norm, grams = self._docs[row_id]
+                # Jaccard similarity, plus a bonus for substring hits; scaled to 0..1
+                score = n / (len(q_grams) + len(grams) - n)
+                if q_norm in norm:
+                    score += 0.5
+                score /= 1.5
+                if score >= min_score:
+                    scored.append((row_id, round(score, 4), norm))
+
+        scored.sort(key=lambda r: (-r[1], r[2]))
+        return [(row_id, score) for row_id, score, _ in scored[:limit]]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+
+_indexes = {}
+
+
+def register(name, model, column, refresh_seconds=300):
+    _indexes[name] = TrigramIndex(model, column, refresh_seconds)
+
+
+def get_index(name) -> TrigramIndex:
+    return _indexes[name]
+
+
+def search(name, query, session, limit=20, min_score=0.25):
+    index = _indexes[name]
+    index.ensure_fresh(session)
+    return index.search(query, limit=limit, min_score=min_score)
+
+
+def search_ids(name, query, session, limit=200):
+    return [row_id for row_id, _ in search(name, query, session, limit=limit)]
+
+
+def search_models(name, query, session, limit=200):
+    """Matching model instances, best match first."""
+    ids = search_ids(name, query, session, limit=limit)
+    if not ids:
+        return []
+    model = _indexes[name].model
+    found = {obj.id: obj for obj in session.query(model).filter(model.id.in_(ids))}
+    return [found[i] for i in ids if i in found]
+
+
+# ---------------- ORM hooks ----------------
+
+def _index_for(obj):
+    for index in _indexes.values():
+        if isinstance(obj, index.model):
+            return index
+    return None
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in (*session.new, *session.dirty):
+        index = _index_for(obj)
+        if index is not None:
+            pending.append((index, obj.id, getattr(obj, index.column)))
+    for obj in session.deleted:
+        index = _index_for(obj)
+        if index is not None:
+            pending.append((index, obj.id, None))
+
+
+def _after_commit(session):
+    for index, row_id, name in session.info.pop(_PENDING_KEY, ()):
+        if name is None:
+            index.delete(row_id)
+        else:
+            index.upsert(row_id, name)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_app(app, db):
+    from app.models.employees import Employees
+    from app.models.vendors import Vendors
+    from app.models.customers import Customers
+    from app.models.inventory import Inventory
+
+    refresh = app.config.get("SEARCH_INDEX_REFRESH_SECONDS", 300)
+    register("employees", Employees, "employee_name", refresh)
+    register("vendors", Vendors, "vendor_name", refresh)
+    register("customers", Customers, "customer_name", refresh)
+    register("inventory", Inventory, "item_name", refresh)
+
+    if not event.contains(db.session, "after_flush", _after_flush):
+        event.listen(db.session, "after_flush", _after_flush)
+        event.listen(db.session, "after_commit", _after_commit)
+        event.listen(db.session, "after_rollback", _after_rollback)
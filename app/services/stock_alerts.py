@@ -0,0 +1,179 @@
+"""
+Low-stock alerts, maintained incrementally.
+
+An item is ``low`` at or below its reorder level (Inventory.reorder_level, or
+DEFAULT_REORDER_LEVEL) and ``out`` at zero. Whenever a write changes an
+item's quantity or reorder level, the old and new levels are compared: a
+crossing upserts or deletes its stock_alerts row and appends a
+stock_alert_events entry, in the same transaction. Low-stock views read
+the small stock_alerts set instead of scanning the catalogue.
+"""
+from sqlalchemy import event, func, inspect as sa_inspect
+
+from app.models.mixins import utcnow
+
+DEFAULT_REORDER_LEVEL = 20
+
+_PENDING_KEY = "stock_alerts_pending"
+_SEVERITY = {None: 0, "low": 1, "out": 2}
+
+_inventory = None
+_alerts = None
+_events = None
+
+
+def reorder_level_of(value):
+    return DEFAULT_REORDER_LEVEL if value in (None, "") else int(value)
+
+
+def level_for(quantity, reorder_level):
+    quantity = 0 if quantity in (None, "") else int(quantity)
+    if quantity <= 0:
+        return "out"
+    if quantity <= reorder_level_of(reorder_level):
+        return "low"
+    return None
+
+
+# ---------------- write side ----------------
+
+def evaluate(conn, item_id, old, new):
+    """
+    Apply one item's change to the alert set. ``old`` / ``new`` are
+    ``(quantity, reorder_level)`` pairs; ``old`` is None for a new item and
+    ``new`` is None for a deleted one. Needs no reads.
+    """
+    before = level_for(*old) if old else None
+    after = level_for(*new) if new else None
+    now = utcnow()
+
+    if after is None:
+        if before is not None:
+            conn.execute(_alerts.delete().where(_alerts.c.item_id == item_id))
+            _log(conn, item_id, "cleared", None, new or old, now)
+        return
+
+    quantity, reorder_level = int(new[0] or 0), reorder_level_of(new[1])
+    values = {"level": after, "quantity": quantity, "reorder_level": reorder_level, "updated_at": now}
+    if before is None:
+        updated = conn.execute(_alerts.update().where(_alerts.c.item_id == item_id).values(**values))
+        if updated.rowcount == 0:
+            conn.execute(_alerts.insert().values(item_id=item_id, raised_at=now, **values))
+        _log(conn, item_id, "raised", after, new, now)
+    elif before != after or old != new:
+        conn.execute(_alerts.update().where(_alerts.c.item_id == item_id).values(**values))
+        if before != after:
+            change = "escalated" if _SEVERITY[after] > _SEVERITY[before] else "eased"
+            _log(conn, item_id, change, after, new, now)
+
+
+def _log(conn, item_id, change, level, state, now):
+    conn.execute(_events.insert().values(
+        item_id=item_id, event=change, level=level,
+        quantity=int(state[0] or 0), reorder_level=reorder_level_of(state[1]), created_at=now,
+    ))
+
+
+def _old_value(history):
+    return (history.deleted or history.unchanged or [None])[0]
+
+
+def _before_flush(session, flush_context, instances):
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.deleted:
+        if isinstance(obj, _inventory):
+            pending.append((obj.id, (obj.quantity, obj.reorder_level), None))
+
+
+def _after_flush(session, flush_context):
+    changes = session.info.pop(_PENDING_KEY, None) or []
+    for obj in session.new:
+        if isinstance(obj, _inventory):
+            changes.append((obj.id, None, (obj.quantity, obj.reorder_level)))
+    for obj in session.dirty:
+        if isinstance(obj, _inventory):
+            attrs = sa_inspect(obj).attrs
+            quantity, reorder_level = attrs.quantity.history, attrs.reorder_level.history
+            if quantity.has_changes() or reorder_level.has_changes():
+                old = (_old_value(quantity), _old_value(reorder_level))
+                changes.append((obj.id, old, (obj.quantity, obj.reorder_level)))
+    if changes:
+        conn = session.connection()
+        for item_id, old, new in changes:
+            evaluate(conn, item_id, old, new)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def rebuild(session):
+    """Recompute the alert set from the catalogue (one scan); returns its size."""
+    session.execute(_alerts.delete())
+    now = utcnow()
+    rows = []
+    for item_id, quantity, reorder_level in session.query(
+        _inventory.id, _inventory.quantity, _inventory.reorder_level
+    ):
+        level = level_for(quantity, reorder_level)
+        if level:
+            rows.append({
+                "item_id": item_id, "level": level, "quantity": quantity or 0,
+                "reorder_level": reorder_level_of(reorder_level),
+                "raised_at": now, "updated_at": now,
+            })
+    if rows:
+        session.execute(_alerts.insert(), rows)
+    return len(rows)
+
+
+# ---------------- read side ----------------
+
+def counts(session):
+    """``{"low": n, "out": n}``"""
+    found = dict(session.query(_alerts.c.level, func.count()).group_by(_alerts.c.level).all())
+    return {"low": found.get("low", 0), "out": found.get("out", 0)}
+
+
+def low_stock(session, level=None, limit=None):
+    """Alerted items, out-of-stock first, then by how far below their level."""
+    query = session.query(
+        _alerts.c.item_id, _inventory.item_name, _alerts.c.level, _alerts.c.quantity,
+        _alerts.c.reorder_level, _alerts.c.raised_at,
+    ).join(_inventory, _inventory.id == _alerts.c.item_id)
+    if level:
+        query = query.filter(_alerts.c.level == level)
+    query = query.order_by(
+        (_alerts.c.level == "out").desc(),
+        (_alerts.c.quantity - _alerts.c.reorder_level),
+        _alerts.c.item_id,
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def feed(session, since_id=0, limit=100):
+    """Alert transitions after ``since_id``, oldest first (for polling)."""
+    return (
+        session.query(_events)
+        .filter(_events.c.id > since_id)
+        .order_by(_events.c.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def init_app(db):
+    global _inventory, _alerts, _events
+    from app.models.inventory import Inventory
+    from app.models.stock import StockAlerts, StockAlertEvents
+
+    _inventory = Inventory
+    _alerts = StockAlerts.__table__
+    _events = StockAlertEvents.__table__
+
+    if not event.contains(db.session, "after_flush", _after_flush):
+        event.listen(db.session, "before_flush", _before_flush)
+        event.listen(db.session, "after_flush", _after_flush)
+        event.listen(db.session, "after_rollback", _after_rollback)
@@ -0,0 +1,234 @@
+"""
+Append-only stock movement ledger with periodic snapshots.
+
+Every change to an inventory item's quantity or price appends a
+stock_movements row (in the same transaction), labelled ``opening`` for
+new items, ``adjustment`` for plain edits and ``revaluation`` for price
+only changes, unless the writer labels it with ``tag()`` (``receipt`` /
+``issue``).
+
+``flask erp snapshot-stock`` periodically writes every item's quantity
+and price as of one instant into stock_snapshots. Point-in-time questions
+then start from the nearest snapshot at or before the requested time and
+replay only the movements since, so their cost depends on the snapshot
+interval, not on the size of the ledger.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect as sa_inspect
+
+from app.models.mixins import utcnow
+from app.services import data_version, stock_alerts, stock_valuation
+
+_PENDING_KEY = "stock_ledger_pending"
+_TAG_ATTR = "_stock_movement"
+
+
+class InsufficientStock(Exception):
+    """The change would take the item's quantity below zero."""
+
+
+_inventory = None
+_movements = None
+_snapshots = None
+
+
+def tag(item, kind, note=None):
+    """Label the movement the next flush records for ``item``."""
+    setattr(item, _TAG_ATTR, (kind, note))
+
+
+def _int(value):
+    return None if value in (None, "") else int(value)
+
+
+def parse_instant(value, default=None):
+    """ISO date or datetime; a bare date means the end of that day."""
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value)
+    if len(value) == 10:
+        parsed += timedelta(days=1, microseconds=-1)
+    return parsed.replace(tzinfo=None)
+
+
+# ---------------- write side ----------------
+
+def _movement(obj, kind, delta, note=None):
+    kind, note = getattr(obj, _TAG_ATTR, None) or (kind, note)
+    return {
+        "item_id": obj.id,
+        "kind": kind,
+        "quantity_delta": delta,
+        "unit_price": _int(obj.price),
+        "note": note,
+    }
+
+
+def _before_flush(session, flush_context, instances):
+    # Deleted items: read their stock now, before the row is gone
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    for obj in session.deleted:
+        if isinstance(obj, _inventory):
+            quantity = _int(obj.quantity) or 0
+            if quantity:
+                pending.append(_movement(obj, "adjustment", -quantity, "item deleted"))
+
+
+def _after_flush(session, flush_context):
+    rows = session.info.pop(_PENDING_KEY, None) or []
+    for obj in session.new:
+        if isinstance(obj, _inventory):
+            rows.append(_movement(obj, "opening", _int(obj.quantity) or 0))
+
+    for obj in session.dirty:
+        if not isinstance(obj, _inventory):
+            continue
+        attrs = sa_inspect(obj).attrs
+        quantity, price = attrs.quantity.history, attrs.price.history
+        old_quantity = _int((quantity.deleted or quantity.unchanged or [None])[0]) or 0
+        delta = (_int(obj.quantity) or 0) - old_quantity
+        old_price = _int((price.deleted or price.unchanged or [None])[0])
+        if delta:
+            rows.append(_movement(obj, "adjustment", delta))
+        elif old_price != _int(obj.price):
+            rows.append(_movement(obj, "revaluation", 0))
+
+    for obj in (*session.new, *session.dirty):
+        obj.__dict__.pop(_TAG_ATTR, None)
+
+    if rows:
+        now = utcnow()
+        for row in rows:
+            row["created_at"] = now
+        conn = session.connection()
+        conn.execute(_movements.insert(), rows)
+        stock_valuation.record(conn, rows)
+
+
+def apply_delta(session, item_id, delta, kind, note=None, unit_cost=None):
+    """
+    Atomically add ``delta`` to an item's quantity and record the movement.
+
+    A single conditional UPDATE (``quantity = quantity + :delta`` guarded by
+    ``quantity + :delta >= 0``) instead of read-modify-write, so concurrent
+    callers never lose each other's changes and only hold the row lock for
+    the statement's own transaction. ``unit_cost`` prices a receipt for
+    valuation (default: the item's price). Returns ``(quantity,
+    version_id)``, or None if the item doesn't exist; raises
+    InsufficientStock. The caller commits.
+    """
+    inv = _inventory
+    new_quantity = func.coalesce(inv.quantity, 0) + delta
+    updated = (
+        session.query(inv)
+        .filter(inv.id == item_id, new_quantity >= 0)
+        .update({
+            inv.quantity: new_quantity,
+            inv.version_id: inv.version_id + 1,   # bulk UPDATEs skip version_id_col
+            inv.updated_at: utcnow(),
+        }, synchronize_session=False)
+    )
+    if not updated:
+        if session.query(inv.id).filter(inv.id == item_id).first() is None:
+            return None
+        raise InsufficientStock()
+
+    # Our UPDATE holds the row lock, so this reads our own result
+    quantity, price, reorder_level, version_id = (
+        session.query(inv.quantity, inv.price, inv.reorder_level, inv.version_id)
+        .filter(inv.id == item_id).one()
+    )
+    movement = {
+        "item_id": item_id, "kind": kind, "quantity_delta": delta,
+        "unit_price": price if unit_cost is None else unit_cost, "note": note, "created_at": utcnow(),
+    }
+    conn = session.connection()
+    conn.execute(_movements.insert().values(**movement))
+    stock_valuation.record(conn, [movement])
+    stock_alerts.evaluate(conn, item_id, (quantity - delta, reorder_level), (quantity, reorder_level))
+    data_version.mark_changed(session, inv.__tablename__)
+    return quantity, version_id
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ---------------- read side ----------------
+
+def latest_snapshot(session, as_of):
+    return session.query(func.max(_snapshots.c.as_of)).filter(_snapshots.c.as_of <= as_of).scalar()
+
+
+def stock_as_of(session, as_of, item_ids=None):
+    """``{item_id: (quantity, unit_price)}`` at ``as_of``, plus the snapshot used."""
+    base = latest_snapshot(session, as_of)
+    state = {}
+    if base is not None:
+        snap = session.query(
+            _snapshots.c.item_id, _snapshots.c.quantity, _snapshots.c.unit_price
+        ).filter(_snapshots.c.as_of == base)
+        if item_ids is not None:
+            snap = snap.filter(_snapshots.c.item_id.in_(item_ids))
+        state = {item_id: [quantity, price] for item_id, quantity, price in snap}
+
+    tail = session.query(
+        _movements.c.item_id, _movements.c.quantity_delta, _movements.c.unit_price
+    ).filter(_movements.c.created_at <= as_of)
+    if base is not None:
+        tail = tail.filter(_movements.c.created_at > base)
+    if item_ids is not None:
+        tail = tail.filter(_movements.c.item_id.in_(item_ids))
+
+    for item_id, delta, price in tail.order_by(_movements.c.created_at, _movements.c.id):
+        entry = state.setdefault(item_id, [0, None])
+        entry[0] += delta
+        if price is not None:
+            entry[1] = price
+    return {item_id: tuple(entry) for item_id, entry in state.items()}, base
+
+
+def take_snapshot(session, as_of):
+    """Write every item's stock as of ``as_of``; returns the number of rows."""
+    stock, _ = stock_as_of(session, as_of)
+    session.execute(_snapshots.delete().where(_snapshots.c.as_of == as_of))
+    rows = [
+        {"as_of": as_of, "item_id": item_id, "quantity": quantity, "unit_price": price}
+        for item_id, (quantity, price) in stock.items()
+        if quantity                     # missing from a snapshot means zero
+    ]
+    if rows:
+        session.execute(_snapshots.insert(), rows)
+    return len(rows)
+
+
+def open_ledger(session):
+    """Opening movements for items that predate the ledger."""
+    has_movement = session.query(_movements.c.id).filter(
+        _movements.c.item_id == _inventory.id
+    ).exists()
+    items = session.query(_inventory.id, _inventory.quantity, _inventory.price).filter(~has_movement).all()
+    now = utcnow()
+    rows = [
+        {"item_id": item_id, "kind": "opening", "quantity_delta": quantity or 0,
+         "unit_price": price, "note": "ledger opened", "created_at": now}
+        for item_id, quantity, price in items
+    ]
+    if rows:
+        session.execute(_movements.insert(), rows)
+    return len(rows)
+
+
+def init_app(db):
+    global _inventory, _movements, _snapshots
+    from app.models.inventory import Inventory
+    from app.models.stock import StockMovements, StockSnapshots
+
+    _inventory = Inventory
+    _movements = StockMovements.__table__
+    _snapshots = StockSnapshots.__table__
+
+    if not event.contains(db.session, "after_flush", _after_flush):
+        event.listen(db.session, "before_flush", _before_flush)
+        event.listen(db.session, "after_flush", _after_flush)
+        event.listen(db.session, "after_rollback", _after_rollback)
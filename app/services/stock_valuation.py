@@ -0,0 +1,203 @@
+"""
+Inventory valuation at moving weighted-average cost.
+
+Every stock movement the ledger records (see stock_ledger) updates the
+item's stock_valuations row in the same transaction:
+- Receipts, openings and positive adjustments add their quantity at the
+  movement's unit price. The average cost becomes
+  ``(value + qty * price) / (quantity + qty)``.
+- Issues, negative adjustments and deletions take stock out at the
+  current average, which leaves the average unchanged.
+- A price-only change (revaluation) does not touch the value of stock
+  already on hand; only later receipts use the new price.
+
+Writers touch only the rows of the items they move. The grand total is
+split over STRIPES stock_valuation_totals rows (item_id % STRIPES) that
+each movement adjusts in the same transaction and readers add up, so
+concurrent adjustments of different items rarely wait on each other and
+a total costs STRIPES rows rather than a scan.
+
+A database created with an empty inventory starts out valued (the
+stripes are inserted, stamped, when the table is created). Stock that
+predates the ledger has to be valued once with
+``flask erp rebuild-stock-valuation``, which replays the ledger.
+"""
+from collections import defaultdict
+from sqlalchemy import event, func, select, inspect as sa_inspect
+
+from app.models.mixins import utcnow
+
+STRIPES = 16
+
+_inventory = None
+_movements = None
+_values = None
+_totals = None
+
+
+def _change(quantity, value, delta, unit_price):
+    """Value added (or removed, negative) by moving ``delta`` units."""
+    if delta > 0:
+        if unit_price is None:
+            unit_price = value / quantity if quantity > 0 else 0
+        return round(delta * unit_price, 4)
+    if delta < 0:
+        if quantity + delta <= 0:
+            return -value
+        return -round(value * -delta / quantity, 4)
+    return 0
+
+
+# ---------------- write side ----------------
+
+def record(conn, movements):
+    """
+    Apply stock_movements rows (as dicts, in ledger order) to the item
+    valuations. Each item row is read FOR UPDATE so concurrent writers of
+    the same item apply their changes one after another.
+    """
+    moved = [m for m in movements if m["quantity_delta"] or m["kind"] == "opening"]
+    if not moved:
+        return
+    now = utcnow()
+    stripes = defaultdict(lambda: [0, 0])
+    # Item order avoids lock-order deadlocks; the sort is stable, so each
+    # item's movements keep their order
+    for m in sorted(moved, key=lambda m: m["item_id"]):
+        item_id, delta = m["item_id"], m["quantity_delta"]
+        row = conn.execute(
+            select(_values.c.quantity, _values.c.value)
+            .where(_values.c.item_id == item_id)
+            .with_for_update()
+        ).first()
+        quantity, value = row or (0, 0)
+        change = _change(quantity, value, delta, m["unit_price"])
+        state = {"quantity": max(quantity + delta, 0), "value": round(value + change, 4), "updated_at": now}
+        if row is None:
+            conn.execute(_values.insert().values(item_id=item_id, **state))
+        else:
+            conn.execute(_values.update().where(_values.c.item_id == item_id).values(**state))
+        stripe = stripes[item_id % STRIPES]
+        stripe[0] += state["quantity"] - quantity
+        stripe[1] += state["value"] - value
+
+    # After every item row, in stripe order: again a fixed lock order
+    for stripe_id, (quantity, value) in sorted(stripes.items()):
+        if quantity or value:
+            conn.execute(
+                _totals.update().where(_totals.c.id == stripe_id).values(
+                    quantity=_totals.c.quantity + quantity,
+                    value=_totals.c.value + round(value, 4),
+                    updated_at=now,
+                )
+            )
+
+
+def rebuild(session):
+    """Replay the whole ledger into stock_valuations / totals; returns the item count.
+
+    Items without any movement are valued at quantity * current price.
+    """
+    state = defaultdict(lambda: [0, 0])
+    for item_id, delta, unit_price in session.query(
+        _movements.c.item_id, _movements.c.quantity_delta, _movements.c.unit_price
+    ).order_by(_movements.c.created_at, _movements.c.id).yield_per(10000):
+        entry = state[item_id]
+        entry[1] = round(entry[1] + _change(entry[0], entry[1], delta, unit_price), 4)
+        entry[0] = max(entry[0] + delta, 0)
+
+    items = session.query(_inventory.id, _inventory.quantity, _inventory.price).all()
+    now = utcnow()
+    rows = []
+    for item_id, quantity, price in items:
+        if item_id in state:
+            quantity, value = state[item_id]
+        else:
+            quantity = quantity or 0
+            value = quantity * (price or 0)
+        rows.append({"item_id": item_id, "quantity": quantity, "value": value, "updated_at": now})
+
+    stripes = defaultdict(lambda: [0, 0])
+    for r in rows:
+        stripe = stripes[r["item_id"] % STRIPES]
+        stripe[0] += r["quantity"]
+        stripe[1] += r["value"]
+
+    session.execute(_values.delete())
+    session.execute(_totals.delete())
+    if rows:
+        session.execute(_values.insert(), rows)
+    session.execute(_totals.insert(), _stripe_rows(stripes, now))
+    return len(rows)
+
+
+def _stripe_rows(stripes, now):
+    return [
+        {"id": i, "quantity": stripes[i][0], "value": round(stripes[i][1], 4),
+         "rebuilt_at": now, "updated_at": now}
+        for i in range(STRIPES)
+    ]
+
+
+def _stamp_new(target, connection, **kw):
+    # A fresh table is already current, unless there is stock that
+    # predates the ledger: then it waits for rebuild-stock-valuation
+    inventory = _inventory.__table__
+    if sa_inspect(connection).has_table(inventory.name):
+        if connection.execute(select(inventory.c.id).limit(1)).first() is not None:
+            return
+    connection.execute(_totals.insert(), _stripe_rows(defaultdict(lambda: [0, 0]), utcnow()))
+
+
+# ---------------- read side ----------------
+
+def totals(session):
+    """``(quantity, value)`` of all stock, or None until it has been valued."""
+    stamped, quantity, value = session.query(
+        func.count(_totals.c.rebuilt_at),
+        func.coalesce(func.sum(_totals.c.quantity), 0),
+        func.coalesce(func.sum(_totals.c.value), 0),
+    ).one()
+    if stamped < STRIPES:
+        return None
+    return int(quantity), round(float(value), 2)
+
+
+def item_valuation(session, item_id):
+    """``{quantity, value, average_cost}`` for one item, or None."""
+    row = session.query(_values.c.quantity, _values.c.value).filter(
+        _values.c.item_id == item_id
+    ).first()
+    if row is None:
+        return None
+    return {
+        "quantity": row.quantity,
+        "value": round(row.value, 2),
+        "average_cost": round(row.value / row.quantity, 4) if row.quantity else None,
+    }
+
+
+def top_items(session, limit=50):
+    """Highest-value items: ``[(item_id, item_name, quantity, value)]``."""
+    return (
+        session.query(_values.c.item_id, _inventory.item_name, _values.c.quantity, _values.c.value)
+        .join(_inventory, _inventory.id == _values.c.item_id)
+        .filter(_values.c.quantity > 0)
+        .order_by(_values.c.value.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def init_app(db):
+    global _inventory, _movements, _values, _totals
+    from app.models.inventory import Inventory
+    from app.models.stock import StockMovements, StockValuations, StockValuationTotals
+
+    _inventory = Inventory
+    _movements = StockMovements.__table__
+    _values = StockValuations.__table__
+    _totals = StockValuationTotals.__table__
+
+    if not event.contains(_totals, "after_create", _stamp_new):
+        event.listen(_totals, "after_create", _stamp_new)
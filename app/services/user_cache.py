@@ -0,0 +1,76 @@
+from flask_login import UserMixin
+from sqlalchemy import event
+from app.services.cache import TTLCache
+
+_PENDING_KEY = "user_cache_changed_ids"
+
+# user id -> SessionUser. Short TTL bounds staleness across worker processes.
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
+
+class SessionUser(UserMixin):
+    """
+    Detached, read-only snapshot of a user for ``current_user``.
+
+    Holds only the fields request handlers need (never the password hash),
+    so it can be shared between requests without a DB session.
+    """
+
+    __slots__ = ("id", "username", "email")
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+
+def load_user(user_id):
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    from app import db
+    from app.models.users import Users
+
+    row = (
+        db.session.query(Users.id, Users.username, Users.email)
+        .filter(Users.id == user_id)
+        .first()
+    )
+    if row is None:
+        return None
+
+    user = SessionUser(row.id, row.username, row.email)
+    user_cache.set(user_id, user)
+    return user
+
+
+def _after_flush(session, flush_context):
+    from app.models.users import Users
+
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, Users):
+            changed.add(obj.id)
+
+
+def _after_commit(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        user_cache.pop(user_id)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def init_app(db):
+    if event.contains(db.session, "after_flush", _after_flush):
+        return
+    event.listen(db.session, "after_flush", _after_flush)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_rollback", _after_rollback)
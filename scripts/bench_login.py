@@ -0,0 +1,115 @@
+"""
+Password hashing / login throughput benchmark.
+
+Hash mode (default) verifies a password from --threads threads, first
+inline on the request threads and then through a process pool, and prints
+verifications per second for each:
+
+    python scripts/bench_login.py --method scrypt:32768:8:1 --threads 16 --n 200
+
+HTTP mode drives POST /login on a running app (RATELIMIT_ENABLED=false)
+with an existing account and reports logins per second and latency:
+
+    python scripts/bench_login.py --url http://127.0.0.1:5000 \\
+        --username bench --password secret --threads 16 --n 200
+"""
+import argparse
+import multiprocessing
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_CSRF = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    f = int(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+
+def bench_hash(method, threads, n, workers):
+    pwhash = generate_password_hash("correct horse", method)
+
+    def timed(fn):
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            assert all(pool.map(lambda _: fn(), range(n)))
+        return n / (time.perf_counter() - t0)
+
+    inline = timed(lambda: check_password_hash(pwhash, "correct horse"))
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as procs:
+        procs.submit(check_password_hash, pwhash, "x").result()   # warm up
+        pooled = timed(
+            lambda: procs.submit(check_password_hash, pwhash, "correct horse").result()
+        )
+
+    print(f"method            {method}")
+    print(f"threads / workers {threads} / {workers}")
+    print(f"inline            {inline:8.1f} verify/s")
+    print(f"process pool      {pooled:8.1f} verify/s")
+
+
+def bench_http(url, username, password, threads, n):
+    import requests
+
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal failures
+        s = requests.Session()
+        page = s.get(f"{url}/login")
+        match = _CSRF.search(page.text)
+        data = {"username": username, "password": password}
+        if match:
+            data["csrf_token"] = match.group(1)
+        t0 = time.perf_counter()
+        resp = s.post(f"{url}/login", data=data, allow_redirects=False)
+        ms = (time.perf_counter() - t0) * 1000
+        ok = resp.status_code == 302 and "/login" not in resp.headers.get("Location", "")
+        with lock:
+            if ok:
+                latencies.append(ms)
+            else:
+                failures += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n)))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    print(f"logins ok / failed {len(latencies)} / {failures}")
+    print(f"throughput         {len(latencies) / elapsed:8.1f} logins/s (incl. GET /login)")
+    print(f"POST p50 / p95     {percentile(latencies, 0.5):.1f} / {percentile(latencies, 0.95):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--method", default="scrypt:32768:8:1")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=min(4, multiprocessing.cpu_count()))
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--url", help="Benchmark POST /login on a running app instead")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    if args.url:
+        bench_http(args.url.rstrip("/"), args.username, args.password, args.threads, args.n)
+    else:
+        bench_hash(args.method, args.threads, args.n, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Concurrent load driver for /api/chatbot.
+
+Sends queries (one per line from --queries, or a built-in mix) from
+--concurrency threads and reports throughput and latency percentiles.
+Pair with scripts/mock_llm_server.py for repeatable offline runs.
+
+Usage:
+    python scripts/chatbot_loadtest.py --url http://127.0.0.1:5000/api/chatbot \\
+        --requests 500 --concurrency 16
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_QUERIES = [
+    "What's our total stock value?",
+    "Show the top 5 items by value",
+    "List all inventory items",
+    "Who is the highest paid employee?",
+    "Give me a salary summary",
+    "How many employees do we have?",
+    "Vendor overview please",
+    "How many customers are active?",
+]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    f = int(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+
+def run(url, queries, total, concurrency, timeout):
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(i):
+        # One HTTP session (and chat history) per worker thread
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        query = queries[i % len(queries)]
+        t0 = time.perf_counter()
+        try:
+            resp = local.session.post(url, json={"query": query}, timeout=timeout)
+            outcome = None if resp.ok else f"HTTP {resp.status_code}"
+        except requests.RequestException as exc:
+            outcome = type(exc).__name__
+        ms = (time.perf_counter() - t0) * 1000
+        with lock:
+            if outcome:
+                errors[outcome] = errors.get(outcome, 0) + 1
+            else:
+                latencies.append(ms)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000/api/chatbot")
+    parser.add_argument("--queries", help="File with one query per line")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as fh:
+            queries = [line.strip() for line in fh if line.strip()]
+
+    result = run(args.url, queries, args.requests, args.concurrency, args.timeout)
+    width = max(len(k) for k in result)
+    for key, value in result.items():
+        print(f"{key.ljust(width)}  {value}")
+
+
+if __name__ == "__main__":
+    main()
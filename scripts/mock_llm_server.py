@@ -0,0 +1,248 @@
+"""
+Local OpenAI-compatible stand-in for load-testing /api/chatbot.
+
+Serves POST /v1/chat/completions with:
+  * scripted responses: regex rules on the last user message return a
+    tool call; a request ending in a tool message gets a text reply,
+  * configurable latency (fixed / uniform / lognormal),
+  * record mode: proxy to the real API and append each exchange to JSONL,
+  * replay mode: answer from a recorded JSONL file (scripted fallback).
+
+Usage:
+    python scripts/mock_llm_server.py --port 8100 --scenario scenario.json
+    python scripts/mock_llm_server.py --record sessions.jsonl
+    python scripts/mock_llm_server.py --replay sessions.jsonl --replay-latency
+
+Then run the app with:
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock \\
+    RATELIMIT_ENABLED=false python run.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, request, jsonify
+
+DEFAULT_SCENARIO = {
+    "latency_ms": {"dist": "lognormal", "median": 600, "p95": 2000},
+    "rules": [
+        {"match": r"stock value|inventory total|total stock", "tool": "get_inventory_totals"},
+        {"match": r"top .*items?", "tool": "get_top_inventory_items",
+         "arguments": {"metric": "value", "limit": 5}},
+        {"match": r"all (items|inventory)", "tool": "get_all_inventory_items",
+         "arguments": {"limit": 20}},
+        {"match": r"highest (paid|salary)", "tool": "get_highest_salary"},
+        {"match": r"salary (summary|stats)", "tool": "get_salary_summary"},
+        {"match": r"how many employees", "tool": "get_employee_count"},
+        {"match": r"employees? summary", "tool": "get_employee_summary"},
+        {"match": r"vendors?", "tool": "get_vendor_summary"},
+        {"match": r"customers?", "tool": "get_customer_summary"},
+    ],
+    "default_reply": "I can help with inventory, employees, vendors and customers.",
+}
+
+
+# ------------------------------------------------------------
+#                      LATENCY MODEL
+# ------------------------------------------------------------
+
+def make_latency(spec):
+    """Return a zero-argument function producing a delay in seconds."""
+    dist = (spec or {}).get("dist", "fixed")
+
+    if dist == "fixed":
+        ms = float(spec.get("ms", 0))
+        return lambda: ms / 1000
+
+    if dist == "uniform":
+        lo, hi = float(spec["min"]), float(spec["max"])
+        return lambda: random.uniform(lo, hi) / 1000
+
+    if dist == "lognormal":
+        # Parameterised by median and p95 (z = 1.645)
+        median, p95 = float(spec["median"]), float(spec["p95"])
+        mu = math.log(median)
+        sigma = math.log(p95 / median) / 1.645
+        return lambda: random.lognormvariate(mu, sigma) / 1000
+
+    raise ValueError(f"Unknown latency dist '{dist}'")
+
+
+# ------------------------------------------------------------
+#                   RESPONSE CONSTRUCTION
+# ------------------------------------------------------------
+
+def estimate_tokens(obj) -> int:
+    return len(json.dumps(obj, default=str)) // 4 + 1
+
+
+def completion(model, message, finish_reason, prompt_tokens):
+    completion_tokens = estimate_tokens(message)
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def scripted_response(scenario, body):
+    model = body.get("model", "mock")
+    messages = body.get("messages") or []
+    prompt_tokens = estimate_tokens(messages) + estimate_tokens(body.get("tools") or [])
+    offered = {t["function"]["name"] for t in body.get("tools") or []}
+
+    last = messages[-1] if messages else {}
+    if last.get("role") == "tool":
+        text = f"Here is what I found: {str(last.get('content'))[:300]}"
+        return completion(model, {"role": "assistant", "content": text}, "stop", prompt_tokens)
+
+    query = str(last.get("content") or "").lower()
+    for rule in scenario.get("rules", []):
+        if rule["tool"] in offered and re.search(rule["match"], query):
+            call = {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {
+                    "name": rule["tool"],
+                    "arguments": json.dumps(rule.get("arguments", {})),
+                },
+            }
+            message = {"role": "assistant", "content": None, "tool_calls": [call]}
+            return completion(model, message, "tool_calls", prompt_tokens)
+
+    message = {"role": "assistant", "content": scenario.get("default_reply", "OK")}
+    return completion(model, message, "stop", prompt_tokens)
+
+
+# ------------------------------------------------------------
+#                     RECORD / REPLAY
+# ------------------------------------------------------------
+
+def request_key(body) -> str:
+    """Stable hash of the parts of a request that determine the answer."""
+    canonical = {
+        "model": body.get("model"),
+        "messages": [
+            {k: m.get(k) for k in ("role", "content", "tool_call_id") if m.get(k) is not None}
+            for m in body.get("messages") or []
+        ],
+        "tools": sorted(t["function"]["name"] for t in body.get("tools") or []),
+    }
+    blob = json.dumps(canonical, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def load_recording(path):
+    recorded = {}
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                entry = json.loads(line)
+                recorded.setdefault(entry["key"], []).append(entry)
+    return recorded
+
+
+# ------------------------------------------------------------
+#                          SERVER
+# ------------------------------------------------------------
+
+def create_mock_app(scenario, record=None, replay=None, upstream=None,
+                    replay_latency=False, strict=False):
+    app = Flask(__name__)
+    latency = make_latency(scenario.get("latency_ms"))
+    recorded = load_recording(replay) if replay else {}
+    replay_pos = {}
+    lock = threading.Lock()
+
+    @app.post("/v1/chat/completions")
+    def chat_completions():
+        body = request.get_json(force=True)
+        key = request_key(body)
+
+        if record:
+            t0 = time.perf_counter()
+            upstream_resp = requests.post(
+                f"{upstream.rstrip('/')}/chat/completions",
+                json=body,
+                headers={"Authorization": request.headers.get("Authorization", "")},
+                timeout=120,
+            )
+            latency_ms = (time.perf_counter() - t0) * 1000
+            payload = upstream_resp.json()
+            if upstream_resp.ok:
+                entry = {"key": key, "request": body, "response": payload,
+                         "latency_ms": round(latency_ms, 1)}
+                with lock, open(record, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(entry) + "\n")
+            return jsonify(payload), upstream_resp.status_code
+
+        if key in recorded:
+            # Identical requests replay their recorded answers in order
+            with lock:
+                entries = recorded[key]
+                i = replay_pos.get(key, 0)
+                replay_pos[key] = (i + 1) % len(entries)
+            entry = entries[i]
+            time.sleep(entry["latency_ms"] / 1000 if replay_latency else latency())
+            return jsonify(entry["response"])
+
+        if strict and replay:
+            return jsonify({"error": {"message": "No recorded response", "key": key}}), 404
+
+        time.sleep(latency())
+        return jsonify(scripted_response(scenario, body))
+
+    @app.get("/v1/models")
+    def models():
+        return jsonify({"object": "list", "data": [{"id": "mock", "object": "model"}]})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--scenario", help="JSON file with latency_ms / rules / default_reply")
+    parser.add_argument("--record", help="Proxy to --upstream and append exchanges to this JSONL")
+    parser.add_argument("--upstream", default=os.getenv("OPENAI_UPSTREAM", "https://api.openai.com/v1"))
+    parser.add_argument("--replay", help="Answer from a recorded JSONL file")
+    parser.add_argument("--replay-latency", action="store_true",
+                        help="Sleep for the recorded upstream latency when replaying")
+    parser.add_argument("--strict", action="store_true",
+                        help="With --replay, 404 on unrecorded requests instead of scripting")
+    args = parser.parse_args()
+
+    scenario = dict(DEFAULT_SCENARIO)
+    if args.scenario:
+        with open(args.scenario, encoding="utf-8") as fh:
+            scenario.update(json.load(fh))
+
+    app = create_mock_app(
+        scenario,
+        record=args.record,
+        replay=args.replay,
+        upstream=args.upstream,
+        replay_latency=args.replay_latency,
+        strict=args.strict,
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()